@@ -7,10 +7,22 @@ const WS_URL = import.meta.env.VITE_PYTHON_WS_URL ||
     ? `ws://${window.location.host}/api/ws/stream` 
     : 'ws://localhost:5000/api/ws/stream');
 
+// Broadcast types the dashboard renders; VITE_WORKSPACE optionally limits
+// events to one workspace/user key
+const SUBSCRIBE_CHANNELS = ['analysis', 'analysis_delta', 'summary_delta', 'documentation', 'recommendations', 'quiz', 'error'];
+const WORKSPACE = import.meta.env.VITE_WORKSPACE || null;
+
 export interface WebSocketMessage {
-  type: 'connected' | 'received' | 'analysis' | 'documentation' | 'recommendations' | 'quiz' | 'error';
+  type: 'connected' | 'subscribed' | 'resumed' | 'resync' | 'received' | 'analysis' | 'analysis_delta' | 'summary_delta' | 'documentation' | 'recommendations' | 'quiz' | 'error';
+  seq?: number;
+  last_seq?: number | null;
+  stream_id?: string | null;
   data?: any;
   analysis?: any;
+  partial?: any;
+  delta?: string;
+  // Streamed deltas of a retried call: a higher attempt replaces earlier output
+  attempt?: number;
   suggestions?: any[];
   errors?: any[];
   weak_areas?: string[];
@@ -38,11 +50,18 @@ export function useWebSocket(): UseWebSocketReturn {
   const wsRef = useRef<WebSocket | null>(null);
   const reconnectTimeoutRef = useRef<NodeJS.Timeout | null>(null);
   const reconnectAttempts = useRef(0);
+  // Position in the backend's event stream, so a reconnect replays only what was missed
+  const lastSeqRef = useRef<number | null>(null);
+  const streamIdRef = useRef<string | null>(null);
 
   const connect = useCallback(() => {
     try {
       // Create WebSocket with longer timeout for initial connection
-      const ws = new WebSocket(WS_URL);
+      // Resume on the URL so the backend queues missed events before any live one
+      const resumeQuery = lastSeqRef.current !== null
+        ? `${WS_URL.includes('?') ? '&' : '?'}resume_from=${lastSeqRef.current}&stream_id=${encodeURIComponent(streamIdRef.current ?? '')}`
+        : '';
+      const ws = new WebSocket(WS_URL + resumeQuery);
       
       // Set a timeout for connection (30 seconds)
       const connectionTimeout = setTimeout(() => {
@@ -76,6 +95,25 @@ export function useWebSocket(): UseWebSocketReturn {
           
           const data = JSON.parse(messageText);
           console.log('📨 WebSocket message received:', data.type, data); // Debug log
+          // Subscribe once the backend greets us (the Node proxy drops earlier messages)
+          if (data.type === 'connected') {
+            // First connect, or a restarted backend whose numbering starts over
+            if (lastSeqRef.current === null || (data.stream_id ?? null) !== streamIdRef.current) {
+              streamIdRef.current = data.stream_id ?? null;
+              lastSeqRef.current = data.last_seq ?? 0;
+            }
+            ws.send(JSON.stringify({ type: 'subscribe', channels: SUBSCRIBE_CHANNELS, workspace: WORKSPACE }));
+          }
+          if (data.type === 'resync' || data.type === 'resumed') {
+            streamIdRef.current = data.stream_id ?? null;
+            lastSeqRef.current = data.last_seq ?? 0;
+          }
+          if (typeof data.seq === 'number') {
+            if (lastSeqRef.current !== null && data.seq <= lastSeqRef.current) {
+              return; // already seen (replayed twice)
+            }
+            lastSeqRef.current = data.seq;
+          }
           // Normalize message format
           const message: WebSocketMessage = {
             type: data.type || 'unknown',
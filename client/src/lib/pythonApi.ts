@@ -4,6 +4,8 @@
  */
 
 const PYTHON_API_BASE = import.meta.env.VITE_PYTHON_API_URL || '';
+// Same workspace the WebSocket subscription uses, so streamed summary deltas reach this dashboard
+const WORKSPACE = import.meta.env.VITE_WORKSPACE || '';
 
 export interface LearningSession {
   id: string;
@@ -89,7 +91,8 @@ export async function fetchRecommendations(): Promise<Recommendation[]> {
  * Fetch learning summary for a time period
  */
 export async function fetchSummary(period: 'daily' | 'weekly' | 'monthly' = 'weekly'): Promise<LearningSummary> {
-  const response = await fetch(`${PYTHON_API_BASE}/api/summary?period=${period}`);
+  const workspace = WORKSPACE ? `&workspace=${encodeURIComponent(WORKSPACE)}` : '';
+  const response = await fetch(`${PYTHON_API_BASE}/api/summary?period=${period}${workspace}`);
   if (!response.ok) {
     throw new Error('Failed to fetch summary');
   }
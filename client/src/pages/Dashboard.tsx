@@ -64,7 +64,8 @@ export default function Dashboard() {
   const showConnectionStatus = !healthLoading;
   
   useEffect(() => {
-    if (lastMessage?.type === 'analysis') {
+    // resync: events were missed while disconnected and can't be replayed
+    if (lastMessage?.type === 'analysis' || lastMessage?.type === 'resync') {
       queryClient.invalidateQueries({ queryKey: ['/api/python/insights'] });
       queryClient.invalidateQueries({ queryKey: ['/api/python/summary/stats'] });
     }
@@ -0,0 +1,18 @@
+"""
+Learning AI Agent file watcher client
+
+Importable as a package (vscode_watcher.py) or run from this folder
+(python watcher.py); the modules import each other either way.
+"""
+from .client import WatcherClient, print_backend_message
+from .config import load_config
+from .transport import ConnectionLost, Transport, WebSocketTransport
+
+__all__ = [
+    "WatcherClient",
+    "print_backend_message",
+    "load_config",
+    "ConnectionLost",
+    "Transport",
+    "WebSocketTransport"
+]
@@ -0,0 +1,460 @@
+"""
+File system watch backends shared by the file watchers
+
+watchdog's default Observer with recursive=True watches every directory under
+the root - node_modules/, build output, virtualenvs - which on a large
+monorepo exhausts the inotify watch limit (and watchdog then fails or falls
+back to slow polling), and gives no visibility into what it is doing.
+
+Backends deliver changed file paths to a callback on their own thread:
+
+- inotify (Linux): one watch per non-ignored directory, so ignored trees
+  are pruned at the directory level and cost no watches or events. Only
+  completed writes (close-after-write) and renames into place are reported,
+  not every write() of a save. The watch count is reported and checked
+  against the kernel limit; hitting it falls back to polling.
+- polling: for network file systems (NFS, SMB, sshfs, WSL drives) where
+  inotify never sees changes made by other machines. It walks the pruned
+  tree comparing (mtime, size), stats only files with watched extensions,
+  and backs off when a scan is slow.
+- native: watchdog's platform Observer (FSEvents on macOS,
+  ReadDirectoryChangesW on Windows), which is already recursive in the OS.
+"""
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import threading
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+# Imported as local_watcher.backends by vscode_watcher.py, as backends by watcher.py
+try:
+    from .ignore import IgnoreMatcher
+    from .stats import WatchStats
+except ImportError:
+    from ignore import IgnoreMatcher
+    from stats import WatchStats
+
+# Called with the absolute path of a changed file, on the backend's thread
+OnChange = Callable[[str], None]
+
+BACKENDS = ("auto", "inotify", "polling", "native")
+
+DEFAULT_POLL_INTERVAL = 2.0  # seconds
+
+# File systems where inotify misses changes made by other machines
+NETWORK_FILESYSTEMS = {
+    "nfs", "nfs4", "cifs", "smb3", "smbfs", "sshfs", "fuse.sshfs", "9p", "drvfs",
+    "afs", "ceph", "glusterfs", "fuse.glusterfs", "davfs", "fuse.rclone", "lustre"
+}
+
+
+class WatchLimitError(OSError):
+    """The inotify watch limit was reached while setting up watches"""
+
+
+def filesystem_type(path: str) -> Optional[str]:
+    """File system type of the mount holding a path (Linux only, else None)"""
+    path = os.path.realpath(path)
+    best, fs_type = "", None
+    try:
+        with open("/proc/mounts", "r") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount_point = fields[1].replace("\\040", " ")
+                prefix = mount_point.rstrip("/") + "/"
+                if (path == mount_point or path.startswith(prefix)) and len(mount_point) > len(best):
+                    best, fs_type = mount_point, fields[2]
+    except OSError:
+        return None
+    return fs_type
+
+
+def inotify_watch_limit() -> Optional[int]:
+    """The per-user inotify watch limit (fs.inotify.max_user_watches), if known"""
+    try:
+        with open("/proc/sys/fs/inotify/max_user_watches", "r") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+class InotifyBackend:
+    """Linux inotify with one watch per non-ignored directory"""
+
+    # inotify(7) event bits
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_DONT_FOLLOW = 0x02000000
+    IN_EXCL_UNLINK = 0x04000000
+    IN_ISDIR = 0x40000000
+
+    WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_DELETE_SELF
+                  | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK)
+
+    _EVENT = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+    def __init__(self, root: str, ignore: IgnoreMatcher, on_change: OnChange, stats: WatchStats):
+        import ctypes
+        import ctypes.util
+
+        self.root = os.path.abspath(root)
+        self.ignore = ignore
+        self.on_change = on_change
+        self.stats = stats
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._get_errno = ctypes.get_errno
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self._fd < 0:
+            raise OSError(self._get_errno(), "inotify_init1 failed")
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        self._paths: Dict[int, str] = {}  # watch descriptor -> directory
+        self._wds: Dict[str, int] = {}  # directory -> watch descriptor
+        self._limit_warned = False
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="inotify-watcher", daemon=True)
+
+    def _add_watch(self, directory: str) -> bool:
+        """Watch one directory; raises WatchLimitError when the limit is reached"""
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), self.WATCH_MASK)
+        if wd < 0:
+            err = self._get_errno()
+            if err == errno.ENOSPC:
+                raise WatchLimitError(err, "inotify watch limit reached", directory)
+            return False  # vanished, not a directory or no permission
+        self._paths[wd] = directory
+        self._wds[directory] = wd
+        self.stats.watches = len(self._wds)
+        return True
+
+    def _watch_tree(self, top: str, report_files: bool = False) -> Tuple[int, int]:
+        """
+        Watch a directory and its non-ignored subdirectories
+
+        Args:
+            top: Directory to add
+            report_files: Report files already inside (a directory created or
+                moved in may have been filled before its watch existed)
+
+        Returns:
+            (directories watched, directories skipped at the watch limit)
+        """
+        added = skipped = 0
+        for directory in self.ignore.walk_dirs(top):
+            if directory in self._wds:
+                continue
+            try:
+                if self._add_watch(directory):
+                    added += 1
+            except WatchLimitError:
+                if not self._thread.is_alive():
+                    raise  # still starting up - let the caller fall back to polling
+                skipped += 1
+        if skipped:
+            self.stats.drop(skipped)
+            if not self._limit_warned:
+                self._limit_warned = True
+                print(f"⚠️  inotify watch limit reached - {skipped} new director(ies) not watched. "
+                      f"Raise fs.inotify.max_user_watches or use the polling backend")
+        if report_files:
+            for file_path in self.ignore.walk(top):
+                self.stats.event()
+                self.on_change(file_path)
+        return added, skipped
+
+    def _unwatch_tree(self, top: str):
+        """Forget watches for a directory moved away (its watches now point elsewhere)"""
+        prefix = top.rstrip(os.sep) + os.sep
+        for directory in [d for d in self._wds if d == top or d.startswith(prefix)]:
+            wd = self._wds.pop(directory)
+            self._paths.pop(wd, None)
+            self._libc.inotify_rm_watch(self._fd, wd)
+        self.stats.watches = len(self._wds)
+
+    def start(self):
+        """Set up the watches and start the reader thread"""
+        started = time.monotonic()
+        try:
+            added, _ = self._watch_tree(self.root)
+        except WatchLimitError:
+            self._close()
+            raise
+        limit = inotify_watch_limit()
+        self.stats.backend = "inotify"
+        self.stats.watch_unit = "watches"
+        usage = f" of the {limit} limit" if limit else ""
+        print(f"👀 inotify: watching {added} director{'y' if added == 1 else 'ies'}{usage} "
+              f"(ignored trees pruned, {time.monotonic() - started:.2f}s)")
+        if limit and added > limit * 0.8:
+            print(f"⚠️  Over 80% of the inotify watch limit in use - consider raising fs.inotify.max_user_watches")
+        self._thread.start()
+
+    def stop(self):
+        """Stop the reader thread"""
+        self._stopping = True
+        try:
+            os.write(self._wakeup_w, b"x")
+        except OSError:
+            pass
+
+    def join(self, timeout: Optional[float] = None):
+        """Wait for the reader thread to exit"""
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+        self._close()
+
+    def _close(self):
+        for fd in (self._fd, self._wakeup_r, self._wakeup_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self._fd = self._wakeup_r = self._wakeup_w = -1
+
+    def _run(self):
+        """Read and dispatch events until stopped"""
+        while not self._stopping:
+            try:
+                readable, _, _ = select.select([self._fd, self._wakeup_r], [], [])
+            except (OSError, ValueError):
+                return
+            if self._wakeup_r in readable:
+                return
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            except OSError:
+                return
+            self._dispatch(data)
+
+    def _dispatch(self, data: bytes):
+        """Handle one read's worth of events"""
+        offset, size = 0, len(data)
+        while offset + self._EVENT.size <= size:
+            wd, mask, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            try:
+                self._handle(wd, mask, name)
+            except Exception as e:
+                # One bad event must not end the reader thread (and with it the watcher)
+                print(f"⚠️  Error handling file event for {name!r}: {e!r}")
+
+    def _handle(self, wd: int, mask: int, name: str):
+        """Handle one event"""
+        if mask & self.IN_Q_OVERFLOW:
+            # The kernel queue overflowed (event storm); the lost events are unknown
+            self.stats.drop()
+            return
+        directory = self._paths.get(wd)
+        if mask & self.IN_IGNORED:
+            if directory is not None and self._wds.get(directory) == wd:
+                del self._wds[directory]
+            self._paths.pop(wd, None)
+            self.stats.watches = len(self._wds)
+            return
+        if directory is None or not name:
+            return
+
+        path = os.path.join(directory, name)
+        self.stats.event()
+        if mask & self.IN_ISDIR:
+            if mask & self.IN_MOVED_FROM:
+                self._unwatch_tree(path)
+            elif mask & (self.IN_CREATE | self.IN_MOVED_TO) and not self.ignore.is_ignored(path, True):
+                self._watch_tree(path, report_files=True)
+            return
+        if mask & (self.IN_CLOSE_WRITE | self.IN_MOVED_TO):
+            if name == ".gitignore":
+                # Rules changed - directories it no longer excludes need watches
+                self.ignore.invalidate(path)
+                self._watch_tree(directory)
+            self.on_change(path)
+
+
+class PollingBackend:
+    """Periodic (mtime, size) comparison of the pruned tree"""
+
+    def __init__(
+        self,
+        root: str,
+        ignore: IgnoreMatcher,
+        on_change: OnChange,
+        stats: WatchStats,
+        extensions: Optional[Iterable[str]] = None,
+        interval: float = DEFAULT_POLL_INTERVAL
+    ):
+        """
+        Args:
+            extensions: Only files with these suffixes (and .gitignore files) are
+                stat'ed; None checks every file
+            interval: Seconds between scans (longer while scans are slow)
+        """
+        self.root = os.path.abspath(root)
+        self.ignore = ignore
+        self.on_change = on_change
+        self.stats = stats
+        self.extensions: Optional[Set[str]] = {e.lower() for e in extensions} if extensions else None
+        self.interval = max(0.1, interval)
+        self._snapshot: Dict[str, Tuple[int, int]] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="polling-watcher", daemon=True)
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        """Stat every watched file under the root"""
+        snapshot = {}
+        for entry in self.ignore.scan(self.root):
+            if entry.is_dir(follow_symlinks=False):
+                continue
+            if (self.extensions is not None and entry.name != ".gitignore"
+                    and os.path.splitext(entry.name)[1].lower() not in self.extensions):
+                continue
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            snapshot[entry.path] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def start(self):
+        """Take the baseline snapshot and start the polling thread"""
+        started = time.monotonic()
+        self._snapshot = self._scan()
+        self._scan_time = time.monotonic() - started
+        self.stats.backend = "polling"
+        self.stats.watch_unit = "files"
+        self.stats.watches = len(self._snapshot)
+        print(f"👀 Polling {len(self._snapshot)} files every {self.interval:g}s "
+              f"(scan took {self._scan_time:.2f}s)")
+        self._thread.start()
+
+    def _run(self):
+        # Wait at least twice the last scan, so a slow network share is not polled non-stop
+        while not self._stop.wait(max(self.interval, self._scan_time * 2)):
+            started = time.monotonic()
+            snapshot = self._scan()
+            self._scan_time = time.monotonic() - started
+            previous, self._snapshot = self._snapshot, snapshot
+            self.stats.watches = len(snapshot)
+            for path, signature in snapshot.items():
+                if previous.get(path) != signature:
+                    self.stats.event()
+                    try:
+                        if os.path.basename(path) == ".gitignore":
+                            self.ignore.invalidate(path)
+                        self.on_change(path)
+                    except Exception as e:
+                        print(f"⚠️  Error handling file event for {path}: {e!r}")
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout: Optional[float] = None):
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+
+class NativeBackend:
+    """watchdog's platform Observer, recursive in the OS (macOS, Windows)"""
+
+    def __init__(self, root: str, on_change: OnChange, stats: WatchStats):
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+
+        class _Forward(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory or event.event_type not in ("created", "modified", "moved"):
+                    return
+                stats.event()
+                on_change(getattr(event, "dest_path", None) or event.src_path)
+
+        self.root = os.path.abspath(root)
+        self.stats = stats
+        self._observer = Observer()
+        self._observer.schedule(_Forward(), self.root, recursive=True)
+
+    def start(self):
+        self.stats.backend = f"native ({type(self._observer).__name__})"
+        self.stats.watch_unit = "roots"
+        self.stats.watches = 1
+        self._observer.start()
+
+    def stop(self):
+        self._observer.stop()
+
+    def join(self, timeout: Optional[float] = None):
+        self._observer.join(timeout)
+
+
+def start_backend(
+    kind: str,
+    root: str,
+    ignore: IgnoreMatcher,
+    on_change: OnChange,
+    stats: WatchStats,
+    extensions: Optional[Iterable[str]] = None,
+    poll_interval: float = DEFAULT_POLL_INTERVAL
+):
+    """
+    Create and start a watch backend
+
+    Args:
+        kind: "auto" (inotify on Linux, polling on network file systems,
+            native elsewhere), "inotify", "polling" or "native"
+        root: Directory to watch
+        ignore: Matcher whose ignored directories are never watched
+        on_change: Called with each changed file path (on the backend's thread)
+        stats: Metrics the backend updates
+        extensions: File suffixes the polling backend checks
+        poll_interval: Seconds between polling scans
+
+    Returns:
+        The started backend (call stop() and join() to shut it down)
+    """
+    kind = (kind or "auto").lower()
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown watcher backend {kind!r} (choose from {', '.join(BACKENDS)})")
+
+    def polling():
+        backend = PollingBackend(root, ignore, on_change, stats, extensions, poll_interval)
+        backend.start()
+        return backend
+
+    if kind == "auto":
+        fs_type = filesystem_type(root)
+        if fs_type in NETWORK_FILESYSTEMS:
+            print(f"🌐 {root} is on a network file system ({fs_type}) - using polling")
+            return polling()
+        kind = "inotify" if sys.platform.startswith("linux") else "native"
+    if kind == "polling":
+        return polling()
+    if kind == "inotify":
+        try:
+            backend = InotifyBackend(root, ignore, on_change, stats)
+            backend.start()
+            return backend
+        except WatchLimitError:
+            print(f"⚠️  inotify watch limit ({inotify_watch_limit()}) reached - falling back to polling. "
+                  f"Raise fs.inotify.max_user_watches or add ignore patterns to use inotify")
+        except (OSError, AttributeError) as e:
+            print(f"⚠️  inotify unavailable ({e}) - falling back to polling")
+        return polling()
+    try:
+        backend = NativeBackend(root, on_change, stats)
+    except ImportError:
+        print("⚠️  watchdog is not installed (pip install watchdog) - falling back to polling")
+        return polling()
+    backend.start()
+    return backend
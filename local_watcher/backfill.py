@@ -0,0 +1,180 @@
+"""
+Initial-scan (backfill) support shared by the file watchers
+
+Walks the watched tree once (respecting ignore rules), hashes every file and
+sends the ones not delivered before, in rate-limited batches with progress
+output (one bulk ingest message per batch when the backend supports it).
+Delivered digests are kept in a local state file, so an interrupted backfill
+resumes where it stopped and a repeated one only sends what changed.
+"""
+import os
+import json
+import time
+import asyncio
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, List, Tuple
+
+# Imported as local_watcher.backfill by vscode_watcher.py, as backfill by watcher.py
+try:
+    from .debounce import content_digest
+    from .files import DEFAULT_MAX_BYTES, read_source
+    from .ignore import IgnoreMatcher
+except ImportError:
+    from debounce import content_digest
+    from files import DEFAULT_MAX_BYTES, read_source
+    from ignore import IgnoreMatcher
+
+# Defaults; both watchers let these be overridden
+DEFAULT_RATE = 20  # files per minute - the backend analyzes every file with the LLM
+DEFAULT_BATCH_SIZE = 50
+MAX_BATCH_CHARS = 8 * 1024 * 1024  # keeps one batch message well under the backend's 16 MB frame limit
+SAVE_EVERY = 25  # files between state file writes
+
+# send_batch([(path, content, digest), ...]) -> True once the whole batch was delivered
+SendBatch = Callable[[List[Tuple[str, str, str]]], Awaitable[bool]]
+
+
+class BackfillState:
+    """Digests of files already delivered, persisted between runs"""
+
+    def __init__(self, path: str, root: str):
+        """
+        Load state for a watched root
+
+        Args:
+            path: State file location
+            root: Watched root; state recorded for another root is discarded
+        """
+        self.path = path
+        self.root = os.path.abspath(root)
+        self.files: Dict[str, str] = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("root") == self.root:
+                self.files = data.get("files", {})
+        except (OSError, ValueError):
+            pass
+        self._unsaved = 0
+
+    def is_delivered(self, rel: str, digest: str) -> bool:
+        """Whether this exact content was already delivered"""
+        return self.files.get(rel) == digest
+
+    def record(self, rel: str, digest: str):
+        """Remember a delivered file, saving periodically"""
+        self.files[rel] = digest
+        self._unsaved += 1
+        if self._unsaved >= SAVE_EVERY:
+            self.save()
+
+    def save(self):
+        """Write the state file atomically"""
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"root": self.root, "files": self.files}, f)
+        os.replace(tmp, self.path)
+        self._unsaved = 0
+
+
+def _format_eta(seconds: float) -> str:
+    """Short human-readable duration"""
+    if seconds >= 3600:
+        return f"{seconds / 3600:.1f}h"
+    if seconds >= 60:
+        return f"{seconds / 60:.0f}m"
+    return f"{seconds:.0f}s"
+
+
+async def backfill(
+    root: str,
+    ignore: IgnoreMatcher,
+    extensions: Iterable[str],
+    send_batch: SendBatch,
+    state: BackfillState,
+    rate: float = DEFAULT_RATE,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_bytes: int = DEFAULT_MAX_BYTES
+) -> bool:
+    """
+    Send every not-yet-delivered file under root
+
+    Args:
+        root: Directory to scan
+        ignore: Matcher whose ignored directories are never walked
+        extensions: File extensions to include (lowercase, with dot)
+        send_batch: Delivers a batch of files; returning False (or raising) stops the run
+        state: Delivered-file state (updated and saved as files go out)
+        rate: Maximum files per minute
+        batch_size: Files per batch (the throttle waits between batches)
+        max_bytes: Larger files (and binary ones) are skipped
+
+    Returns:
+        True if every file was handled, False if the run stopped early
+    """
+    extensions = set(extensions)
+    files = await asyncio.to_thread(
+        lambda: sorted(p for p in ignore.walk(root) if Path(p).suffix.lower() in extensions)
+    )
+    total = len(files)
+    print(f"📦 Backfill: {total} file(s) found under {root}")
+    if state.files:
+        print(f"   Resuming - {len(state.files)} file(s) delivered by earlier runs are skipped if unchanged")
+
+    interval = 60.0 / rate if rate > 0 else 0.0
+    sent = skipped = unreadable = 0
+    started = time.monotonic()
+    batch: List[Tuple[str, str, str, str]] = []  # (path, rel, content, digest)
+    batch_chars = 0
+
+    async def flush() -> bool:
+        nonlocal sent, batch_chars
+        batch_started = time.monotonic()
+        if not await send_batch([(path, content, digest) for path, _, content, digest in batch]):
+            return False
+        for _, rel, _, digest in batch:
+            state.record(rel, digest)
+        batch_files = len(batch)
+        sent += batch_files
+        batch.clear()
+        batch_chars = 0
+        handled = sent + skipped + unreadable
+        remaining = total - handled
+        elapsed = time.monotonic() - started
+        print(
+            f"📦 Backfill {handled}/{total} ({handled * 100 // max(total, 1)}%): "
+            f"{sent} sent, {skipped} unchanged"
+            + (f", {unreadable} skipped (binary, too large or unreadable)" if unreadable else "")
+            + (f", ~{_format_eta(remaining * max(interval, elapsed / max(sent, 1)))} left" if remaining else "")
+        )
+        # Hold the average at `rate` files per minute
+        wait = batch_started + interval * batch_files - time.monotonic()
+        if wait > 0 and remaining:
+            await asyncio.sleep(wait)
+        return True
+
+    try:
+        for path in files:
+            content, _ = await asyncio.to_thread(read_source, path, max_bytes)
+            if content is None:
+                unreadable += 1
+                continue
+            rel = os.path.relpath(path, state.root)
+            digest = content_digest(content)
+            if state.is_delivered(rel, digest):
+                skipped += 1
+                continue
+            batch.append((path, rel, content, digest))
+            batch_chars += len(content)
+            if (len(batch) >= batch_size or batch_chars >= MAX_BATCH_CHARS) and not await flush():
+                return False
+        if batch and not await flush():
+            return False
+    except Exception as e:
+        print(f"❌ Backfill stopped: {e}")
+        return False
+    finally:
+        state.save()
+
+    print(f"✅ Backfill complete: {sent} sent, {skipped} unchanged, {unreadable} skipped")
+    return True
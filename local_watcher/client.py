@@ -0,0 +1,525 @@
+"""
+Watcher client core shared by both entry points
+
+WatcherClient ties the pieces together: the watch backend reports changed
+paths from its thread, the debouncer settles them on the event loop, one
+sender task reads and sends queued files over the transport, and the
+receiver prints what the backend sends back. While the backend is
+unreachable changes go to the offline spool; after every (re)connect the
+spool is replayed in bulk and the optional backfill resumes.
+
+Files rewritten by a git checkout, pull, rebase or stash - or by any storm
+of changes - are not sent one by one: they are collected through the same
+spool and go out as one background ingest batch once the burst is over, or
+are skipped, depending on vcs_policy (see vcs.py).
+
+vscode_watcher.py and local_watcher/watcher.py only load settings (see
+config.py) and run a client, so both get the same behaviour and every
+performance feature - one persistent connection, batching, binary frames,
+compression - lives here and in transport.py.
+"""
+import os
+import time
+import random
+import asyncio
+import urllib.error
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+# Imported as local_watcher.client by vscode_watcher.py, as client by watcher.py
+try:
+    from .backends import start_backend
+    from .backfill import BackfillState, backfill
+    from .debounce import Debouncer
+    from .files import read_source
+    from .ignore import IgnoreMatcher
+    from .spool import Spool
+    from .stats import WatchStats
+    from .transport import ConnectionLost, Transport, WebSocketTransport
+    from .vcs import ChangeClassifier
+except ImportError:
+    from backends import start_backend
+    from backfill import BackfillState, backfill
+    from debounce import Debouncer
+    from files import read_source
+    from ignore import IgnoreMatcher
+    from spool import Spool
+    from stats import WatchStats
+    from transport import ConnectionLost, Transport, WebSocketTransport
+    from vcs import ChangeClassifier
+
+# Documents the backend extracts itself: uploaded instead of sent as text
+UPLOAD_EXTENSIONS = {".pdf"}
+
+
+def print_backend_message(data: Dict):
+    """Print a message received from the backend"""
+    msg_type = data.get("type", "unknown")
+
+    if msg_type == "connected":
+        print(f"✅ {data.get('message', 'Connected')}")
+
+    elif msg_type in ("resumed", "resync"):
+        if msg_type == "resumed":
+            if data.get("replayed"):
+                print(f"   🔁 Replayed {data['replayed']} missed event(s)")
+        else:
+            print(f"   🔁 Missed events are no longer available ({data.get('reason')})")
+
+    elif msg_type == "subscribed":
+        scope = f" (workspace: {data['workspace']})" if data.get("workspace") else ""
+        print(f"   📡 Subscribed to {', '.join(data.get('channels', []))}{scope}")
+
+    elif msg_type == "received":
+        known = " (already analyzed)" if data.get("unchanged") else ""
+        print(f"   ✓ Backend received: {data.get('filename', 'file')}{known}")
+
+    elif msg_type == "ingest":
+        if data.get("status") == "completed":
+            print(f"\n📦 Ingest job finished: {data.get('analyzed', 0)} analyzed, "
+                  f"{data.get('duplicates', 0) + data.get('unchanged', 0)} already known, "
+                  f"{data.get('failed', 0)} failed")
+
+    elif msg_type == "analysis":
+        analysis = data.get("analysis", {})
+        print(f"\n🧠 AI Analysis:")
+        print(f"   Topics: {', '.join(analysis.get('topics', []))}")
+        print(f"   Difficulty: {analysis.get('difficulty', 'N/A')}")
+        if analysis.get('summary'):
+            print(f"   Summary: {analysis['summary']}")
+        if analysis.get('errors'):
+            print(f"   ⚠️  Errors found: {len(analysis['errors'])}")
+        if analysis.get('weak_areas'):
+            print(f"   📉 Weak areas: {', '.join(analysis['weak_areas'][:3])}")
+        if analysis.get('potential_struggles'):
+            print(f"   ⚠️  Watch out for: {', '.join(analysis['potential_struggles'])}")
+
+    elif msg_type == "documentation":
+        suggestions = data.get("suggestions", [])
+        errors = data.get("errors", [])
+        weak_areas = data.get("weak_areas", [])
+
+        print(f"\n📚 Documentation Suggestions ({len(suggestions)}):")
+        if errors:
+            print(f"   ⚠️  {len(errors)} error(s) detected")
+        if weak_areas:
+            print(f"   📉 Weak areas: {', '.join(weak_areas[:3])}")
+        for i, sug in enumerate(suggestions[:3], 1):
+            print(f"   {i}. {sug.get('title', 'N/A')}")
+            if sug.get('url'):
+                print(f"      🔗 {sug['url']}")
+
+    elif msg_type == "recommendations":
+        recs = data.get("recommendations", [])
+        if recs:
+            print(f"\n💡 Recommendations ({len(recs)}):")
+            for i, rec in enumerate(recs[:3], 1):
+                print(f"   {i}. {rec.get('title', 'N/A')}")
+
+    elif msg_type == "quiz":
+        quiz = data.get("quiz", {})
+        questions = quiz.get("questions", [])
+        focus_areas = data.get("focus_areas", [])
+        if questions:
+            print(f"\n📝 Quiz Generated ({len(questions)} questions):")
+            print(f"   Focus areas: {', '.join(focus_areas[:3])}")
+            print(f"   Check the frontend to take the quiz!")
+
+    elif msg_type == "error":
+        print(f"   ❌ Error: {data.get('message', 'Unknown error')}")
+
+
+def describe_connection_error(error: Exception, url: str) -> str:
+    """Explain why connecting to the backend failed"""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(error, ConnectionRefusedError):
+        return f"❌ Could not connect to {url}\n   Make sure the Python backend is running"
+    if status:
+        return f"❌ Connection failed with status {status}"
+    if isinstance(error, asyncio.TimeoutError) or "timed out" in str(error).lower():
+        return f"❌ Connection timeout to {url}\n   The backend might be processing a large file"
+    return f"❌ Error: {error}"
+
+
+class WatcherClient:
+    """Watch a directory and stream changed files to the backend"""
+
+    # Reconnect backoff bounds (seconds)
+    RECONNECT_MIN = 1
+    RECONNECT_MAX = 30
+
+    # Single files at least this large are checked against the backend's content
+    # index before their body is sent; smaller ones cost less to send than a
+    # round-trip, and the backend skips analysis of known content itself
+    CONTENT_CHECK_MIN_BYTES = 4096
+
+    # Seconds without further bulk-changed files before a burst is submitted
+    BULK_QUIET = 3.0
+
+    def __init__(self, config: Dict, transport: Optional[Transport] = None):
+        """
+        Initialize client
+
+        Args:
+            config: Settings from config.load_config()
+            transport: Backend transport (default: the WebSocket stream endpoint)
+        """
+        self.config = config
+        self.root = config["watch_directory"]
+        self.extensions: Set[str] = set(config["extensions"])
+        self.max_file_size = int(config["max_file_size_kb"] * 1024)
+        self.max_upload_size = int(config["max_upload_size_kb"] * 1024)
+        self.transport = transport or WebSocketTransport(
+            config["backend_url"], config["workspace"], upload_url=config["upload_url"]
+        )
+        self.ignore = IgnoreMatcher(self.root, config["ignore_patterns"], use_gitignore=config["use_gitignore"])
+        self.stats = WatchStats()
+        self.connected = False
+        self.backfill_done = False
+        # Created in run(), on the event loop they belong to
+        self.debouncer: Optional[Debouncer] = None
+        self.spool: Optional[Spool] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.queued: Set[str] = set()  # Paths waiting in the queue (a path is queued at most once)
+        self.replay_lock: Optional[asyncio.Lock] = None
+        # Bulk changes (git checkout/pull, change storms); no classifier when vcs_policy is "off"
+        self.vcs_policy = config["vcs_policy"]
+        self.classifier: Optional[ChangeClassifier] = None
+        if self.vcs_policy != "off":
+            self.classifier = ChangeClassifier(self.root, storm_threshold=config["storm_threshold"])
+        self.bulk_reason: Optional[str] = None  # cause of the burst being collected
+        self.bulk_files = 0
+        self._bulk_timer: Optional[asyncio.TimerHandle] = None
+        self._bulk_tasks: Set[asyncio.Task] = set()
+
+    def on_change(self, file_path: str):
+        """Handle a changed file (called on the watch backend's thread)"""
+        if os.path.basename(file_path) == ".gitignore":
+            self.ignore.invalidate(file_path)
+            return
+        # Cheapest check first; both run before any file I/O
+        if Path(file_path).suffix.lower() not in self.extensions or self.ignore.is_ignored(file_path):
+            return
+        if self.classifier is not None:
+            self.classifier.touch(file_path)  # counted towards change storms
+        # Trailing-edge debounce on the event loop - never blocks the backend thread
+        self.debouncer.touch(file_path)
+
+    async def _settled(self, file_path: str):
+        """A file stopped changing - queue it, or spool it while offline"""
+        if self.classifier is not None:
+            reason = self.classifier.bulk_reason(file_path)
+            if reason is not None:
+                self._hold_bulk(file_path, reason)
+                return
+        if not self.connected:
+            # The latest content is read when the spool is replayed
+            self.spool.add(file_path)
+            print(f"📥 Backend offline - spooled {os.path.basename(file_path)} ({len(self.spool)} file(s) waiting)")
+            return
+        if file_path not in self.queued:
+            self.queued.add(file_path)
+            self.queue.put_nowait(file_path)
+
+    def _hold_bulk(self, file_path: str, reason: str):
+        """Collect a file changed by a git operation or change storm instead of sending it now"""
+        if self.bulk_reason is None:
+            self.bulk_reason = reason
+            action = "collecting files for one background batch" if self.vcs_policy == "batch" else "skipping changed files"
+            print(f"🔀 Bulk change detected: {reason} - {action}")
+        self.bulk_files += 1
+        if self.vcs_policy == "batch":
+            # The spool keeps only the path and sends everything in ingest batches
+            self.spool.add(file_path)
+        if self._bulk_timer is not None:
+            self._bulk_timer.cancel()
+        self._bulk_timer = asyncio.get_running_loop().call_later(self.BULK_QUIET, self._end_bulk)
+
+    def _end_bulk(self):
+        """The burst is over - submit what it changed as one low-priority batch (or report the skip)"""
+        self._bulk_timer = None
+        reason, count = self.bulk_reason, self.bulk_files
+        self.bulk_reason, self.bulk_files = None, 0
+        if self.vcs_policy == "skip":
+            print(f"⏭️  Skipped {count} file(s) from {reason} (vcs_policy=skip)")
+            return
+        if not self.connected:
+            print(f"📥 {count} file(s) from {reason} spooled until the backend is back")
+            return
+        # Queued behind any replay already running, which may have sent these files too
+        task = asyncio.create_task(self._replay_spool(f"from {reason}"))
+        self._bulk_tasks.add(task)
+        task.add_done_callback(self._bulk_tasks.discard)
+
+    async def _replay_spool(self, description: str = "changed while offline") -> bool:
+        """Send everything in the spool in batches (one replay at a time)"""
+        async with self.replay_lock:
+            return await self.spool.replay(
+                self.send_batch,
+                max_bytes=self.max_file_size,
+                send_binary=self.upload_file,
+                description=description
+            )
+
+    async def run(self):
+        """Watch and keep a backend connection open, reconnecting with backoff, until cancelled"""
+        config = self.config
+        self.debouncer = Debouncer(asyncio.get_running_loop(), self._settled, delay=config["debounce_seconds"])
+        self.queue = asyncio.Queue()
+        self.replay_lock = asyncio.Lock()
+        self.spool = Spool(config["spool_file"], config["spool_max_files"])
+        if len(self.spool):
+            print(f"📥 {len(self.spool)} file(s) waiting in the offline spool from an earlier run")
+
+        # The backend runs for the whole session - changes made while the
+        # backend is unreachable go to the offline spool instead of being lost
+        observer = start_backend(
+            config["watcher_backend"],
+            self.root,
+            self.ignore,
+            self.on_change,
+            self.stats,
+            extensions=self.extensions,
+            poll_interval=config["poll_interval"]
+        )
+        stats_task = asyncio.create_task(self.stats.report(config["stats_interval"]))
+        print("👀 Watching for file changes...")
+
+        url = config["backend_url"]
+        delay = self.RECONNECT_MIN
+        try:
+            while True:
+                try:
+                    welcome = await self.transport.connect()
+                    print("✅ Connected to Learning AI Agent backend!")
+                    print_backend_message(welcome)
+                    delay = self.RECONNECT_MIN
+                    await self._serve()
+                    print("❌ Connection lost, spooling changes until it is back")
+                except ConnectionLost:
+                    print("❌ Connection lost, spooling changes until it is back")
+                except Exception as e:
+                    print(describe_connection_error(e, url))
+                    await self._close_transport()
+
+                # Exponential backoff with jitter, so watchers don't all reconnect at once
+                wait = delay * random.uniform(0.5, 1.0)
+                spooled = f", {len(self.spool)} file(s) spooled" if len(self.spool) else ""
+                print(f"   Retrying in {wait:.0f} seconds{spooled}...")
+                await asyncio.sleep(wait)
+                delay = min(delay * 2, self.RECONNECT_MAX)
+        finally:
+            stats_task.cancel()
+            observer.stop()
+            observer.join()
+            self.debouncer.cancel_all()
+            if self._bulk_timer is not None:
+                self._bulk_timer.cancel()
+            self.spool.close()
+
+    async def _serve(self):
+        """Send, receive and catch up over an open connection until it drops"""
+        self.connected = True
+        sender = asyncio.create_task(self._send_loop())
+        receiver = asyncio.create_task(self._receive_loop())
+        # Changes made while offline go out in bulk, then the backfill (if any)
+        catch_up = asyncio.create_task(self._catch_up())
+        try:
+            done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self.connected = False
+            for task in (catch_up, sender, receiver):
+                task.cancel()  # spool and backfill state resume on the next connection
+            await self._close_transport()
+            self._spool_queued()
+        for task in done:
+            if not task.cancelled() and task.exception() is not None:
+                raise task.exception()  # surface the error that ended the connection
+
+    async def _close_transport(self):
+        """Close the connection, ignoring errors from one that is already broken"""
+        try:
+            await self.transport.close()
+        except Exception:
+            pass
+
+    def _spool_queued(self):
+        """Move files still waiting in the send queue to the offline spool"""
+        while not self.queue.empty():
+            self.spool.add(self.queue.get_nowait())
+        self.queued.clear()
+
+    async def _send_loop(self):
+        """Send queued files one at a time over the open connection"""
+        while True:
+            file_path = await self.queue.get()
+            self.queued.discard(file_path)
+            try:
+                await self.send_file(file_path)
+            except ConnectionLost:
+                # Not delivered - keep it for the next connection
+                self.spool.add(file_path)
+                raise
+
+    async def _receive_loop(self):
+        """Print responses and broadcasts as they arrive"""
+        async for message in self.transport.messages():
+            print_backend_message(message)
+
+    async def _catch_up(self):
+        """After connecting: replay the offline spool in bulk, then run the backfill if enabled"""
+        if not await self._replay_spool():
+            return  # connection dropped - the rest stays spooled
+        if self.config["backfill"] and not self.backfill_done:
+            state = BackfillState(self.config["backfill_state"], self.root)
+            self.backfill_done = await backfill(
+                self.root,
+                self.ignore,
+                self.extensions,
+                self.send_batch,
+                state,
+                rate=self.config["backfill_rate"],
+                max_bytes=self.max_file_size
+            )
+
+    async def send_file(self, file_path: str):
+        """
+        Read a changed file and send it (documents are uploaded instead)
+
+        Raises:
+            ConnectionLost: If the connection dropped
+        """
+        if Path(file_path).suffix.lower() in UPLOAD_EXTENSIONS:
+            if not await self.upload_file(file_path):
+                self.spool.add(file_path)
+            return
+
+        # Read in a worker thread so a large file never stalls the event loop;
+        # oversized and binary files are skipped instead of sent as garbage text
+        content, reason = await asyncio.to_thread(read_source, file_path, self.max_file_size)
+        if content is None:
+            print(f"⏭️  Skipping {os.path.basename(file_path)}: {reason}")
+            return
+
+        # Saved without changes (or changed and reverted) - nothing new to analyze
+        digest = self.debouncer.changed(file_path, content)
+        if digest is None:
+            return
+
+        # Ask first whether the backend already analyzed this content
+        # (watcher restarts, branch switches, git stash pop) - if so, skip the upload
+        size = len(content.encode("utf-8", "surrogatepass"))
+        if size >= self.CONTENT_CHECK_MIN_BYTES and self.transport.supports_content_check:
+            needed = await self.transport.check_content([(file_path, digest, size)])
+            if needed is not None and file_path not in needed:
+                self.debouncer.mark_sent(file_path, digest)
+                print(f"⏭️  {os.path.basename(file_path)}: already analyzed by the backend, not sent")
+                return
+        await self._deliver(file_path, content, digest)
+
+    async def _deliver(self, file_path: str, content: str, digest: str):
+        """Send already-read content; raises ConnectionLost"""
+        started = time.monotonic()
+        await self.transport.send_file(file_path, content)
+        self.stats.sent_in(time.monotonic() - started)
+        self.debouncer.mark_sent(file_path, digest)
+        print(f"📤 Sent: {os.path.basename(file_path)} ({len(content)} chars)")
+
+    async def send_batch(self, files: List[Tuple[str, str, str]]) -> bool:
+        """
+        Send several already-read files in one message
+
+        Uses the transport's batch message (one round-trip per batch) when the
+        backend supports it, otherwise one upload per file.
+
+        Args:
+            files: (file_path, content, digest) tuples
+
+        Returns:
+            True if every file was delivered
+        """
+        if not self.connected:
+            return False
+        try:
+            files = await self._drop_known(files)
+            if not files:
+                return True
+            if not self.transport.supports_batches:
+                for file_path, content, digest in files:
+                    await self._deliver(file_path, content, digest)
+                return True
+            started = time.monotonic()
+            job = await self.transport.send_batch([(file_path, content) for file_path, content, _ in files])
+        except ConnectionLost:
+            return False
+        if job is None:
+            return False
+        self.stats.sent_in(time.monotonic() - started, len(files))
+        for file_path, _, digest in files:
+            self.debouncer.mark_sent(file_path, digest)
+        print(f"📤 Sent batch of {len(files)} file(s) - {job.get('accepted', 0)} queued for analysis")
+        return True
+
+    async def _drop_known(self, files: List[Tuple[str, str, str]]) -> List[Tuple[str, str, str]]:
+        """
+        Leave out files whose content the backend has analyzed before
+
+        Raises:
+            ConnectionLost: If the connection dropped
+        """
+        if not self.transport.supports_content_check:
+            return files
+        needed = await self.transport.check_content([
+            (file_path, digest, len(content.encode("utf-8", "surrogatepass")))
+            for file_path, content, digest in files
+        ])
+        if needed is None:
+            return files  # no answer - send everything
+        remaining = [item for item in files if item[0] in needed]
+        if len(remaining) < len(files):
+            for file_path, _, digest in files:
+                if file_path not in needed:
+                    self.debouncer.mark_sent(file_path, digest)
+            print(f"⏭️  {len(files) - len(remaining)} of {len(files)} file(s) already analyzed by the backend, not sent")
+        return remaining
+
+    async def upload_file(self, file_path: str) -> bool:
+        """
+        Upload a document (PDF), where the backend extracts its text
+
+        Returns:
+            False if the backend could not be reached (worth retrying later)
+        """
+        try:
+            size = os.path.getsize(file_path)
+        except OSError:
+            return True  # deleted meanwhile
+        if size > self.max_upload_size:
+            print(f"⏭️  Skipping {os.path.basename(file_path)}: larger than {self.max_upload_size // 1024} KB")
+            return True
+
+        try:
+            data = await asyncio.to_thread(Path(file_path).read_bytes)
+        except OSError as e:
+            print(f"❌ Error reading {file_path}: {e}")
+            return True
+        digest = self.debouncer.changed(file_path, data)
+        if digest is None:
+            return True
+
+        print(f"📤 Uploading {os.path.basename(file_path)} ({size // 1024} KB)...")
+        started = time.monotonic()
+        try:
+            result = await self.transport.upload(file_path, data)
+        except urllib.error.HTTPError as e:
+            # The backend answered but couldn't process it (e.g. no extractable text) - don't retry
+            print(f"❌ Upload of {os.path.basename(file_path)} rejected: HTTP {e.code}")
+            return True
+        except (OSError, ValueError) as e:
+            print(f"❌ Upload of {os.path.basename(file_path)} failed: {e}")
+            return False
+        self.stats.sent_in(time.monotonic() - started)
+        self.debouncer.mark_sent(file_path, digest)
+        topics = (result.get("analysis") or {}).get("topics", [])
+        print(f"   ✓ Uploaded - topics: {', '.join(topics) or 'N/A'}")
+        return True
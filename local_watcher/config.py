@@ -0,0 +1,186 @@
+"""
+Configuration loader shared by the file watchers
+
+Settings come from, lowest precedence first: built-in defaults, a JSON config
+file (config.json), environment variables, and command-line arguments. Both
+entry points (vscode_watcher.py and local_watcher/watcher.py) load their
+settings here, so every option has the same name, default and meaning
+whichever one is used.
+"""
+import os
+import json
+import argparse
+from typing import Dict, List, Optional
+
+# Imported as local_watcher.config by vscode_watcher.py, as config by watcher.py
+try:
+    from .backends import BACKENDS, DEFAULT_POLL_INTERVAL
+    from .vcs import DEFAULT_STORM_THRESHOLD, POLICIES
+except ImportError:
+    from backends import BACKENDS, DEFAULT_POLL_INTERVAL
+    from vcs import DEFAULT_STORM_THRESHOLD, POLICIES
+
+DEFAULT_BACKEND_URL = "ws://localhost:8000/api/ws/stream"
+
+# File types sent for analysis (.pdf files are uploaded for text extraction)
+DEFAULT_EXTENSIONS = [
+    ".py", ".js", ".jsx", ".ts", ".tsx",   # Python, JavaScript, TypeScript
+    ".java", ".cpp", ".c", ".h", ".hpp",   # Java, C++
+    ".go", ".rs", ".rb", ".php",           # Go, Rust, Ruby, PHP
+    ".html", ".css", ".scss", ".sass",     # Web
+    ".json", ".yaml", ".yml", ".toml",     # Config
+    ".sql", ".md", ".txt", ".pdf"          # SQL, Markdown, Text, documents
+]
+
+# Gitignore-style patterns; .gitignore files in the watched tree are honoured too
+DEFAULT_IGNORE_PATTERNS = [
+    "node_modules/", ".git/", "__pycache__/", ".env", ".env.*", "venv/", ".venv/",
+    "dist/", "build/", ".next/", "coverage/", ".vscode/", ".idea/"
+]
+
+DEFAULTS = {
+    "watch_directory": None,  # None = current directory
+    "backend_url": DEFAULT_BACKEND_URL,
+    "workspace": None,
+    "extensions": DEFAULT_EXTENSIONS,
+    "ignore_patterns": DEFAULT_IGNORE_PATTERNS,
+    "use_gitignore": True,
+    "debounce_seconds": 2.0,
+    "max_file_size_kb": 1024,
+    "max_upload_size_kb": 20480,
+    "upload_url": None,  # None = derived from backend_url
+    "backfill": False,
+    "backfill_rate": 20.0,  # files per minute
+    "backfill_state": ".backfill_state.json",
+    "spool_file": ".watcher_spool.jsonl",
+    "spool_max_files": 5000,
+    "watcher_backend": "auto",
+    "poll_interval": DEFAULT_POLL_INTERVAL,
+    "stats_interval": 60.0,
+    "vcs_policy": "batch",  # git checkouts/pulls and change storms: batch, skip or off
+    "storm_threshold": DEFAULT_STORM_THRESHOLD  # files changed within seconds (0 = no storm detection)
+}
+
+# Environment variable for each setting
+ENVIRONMENT = {
+    "watch_directory": "WATCH_DIR",
+    "backend_url": "WS_URL",
+    "workspace": "WORKSPACE",
+    "use_gitignore": "USE_GITIGNORE",
+    "debounce_seconds": "DEBOUNCE_SECONDS",
+    "max_file_size_kb": "MAX_FILE_SIZE_KB",
+    "max_upload_size_kb": "MAX_UPLOAD_SIZE_KB",
+    "upload_url": "UPLOAD_URL",
+    "backfill": "BACKFILL",
+    "backfill_rate": "BACKFILL_RATE",
+    "backfill_state": "BACKFILL_STATE",
+    "spool_file": "SPOOL_FILE",
+    "spool_max_files": "SPOOL_MAX_FILES",
+    "watcher_backend": "WATCHER_BACKEND",
+    "poll_interval": "POLL_INTERVAL",
+    "stats_interval": "STATS_INTERVAL",
+    "vcs_policy": "VCS_POLICY",
+    "storm_threshold": "STORM_THRESHOLD"
+}
+
+# Relative paths in these settings are resolved against the config's base directory
+PATH_SETTINGS = ("backfill_state", "spool_file")
+
+
+def _convert(key: str, value: str):
+    """Convert an environment variable's text to the setting's type"""
+    default = DEFAULTS[key]
+    if isinstance(default, bool):
+        return value.strip().lower() not in ("0", "false", "no", "off", "")
+    if isinstance(default, int):
+        return int(value)
+    if isinstance(default, float):
+        return float(value)
+    return value
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse the command-line options common to both watchers"""
+    parser = argparse.ArgumentParser(description="Stream code changes to the Learning AI Agent backend")
+    parser.add_argument("watch_directory", nargs="?", help="Directory to watch")
+    parser.add_argument("--config", help="JSON config file")
+    parser.add_argument("--backend-url", help="Backend WebSocket URL")
+    parser.add_argument("--workspace", help="Workspace/user key")
+    parser.add_argument("--backfill", action="store_true", default=None,
+                        help="Send every existing file once (resumable)")
+    parser.add_argument("--watcher-backend", choices=BACKENDS, help="How file changes are detected")
+    parser.add_argument("--poll-interval", type=float, help="Seconds between polling scans")
+    parser.add_argument("--stats-interval", type=float, help="Seconds between stats lines (0 = never)")
+    parser.add_argument("--vcs-policy", choices=POLICIES,
+                        help="What to do with files changed by git checkouts, pulls and change storms")
+    return parser.parse_args(argv)
+
+
+def load_config(
+    argv: Optional[List[str]] = None,
+    config_file: Optional[str] = None,
+    base_dir: Optional[str] = None,
+    environ: Optional[Dict[str, str]] = None
+) -> Dict:
+    """
+    Load watcher settings
+
+    Args:
+        argv: Command-line arguments (default: sys.argv[1:])
+        config_file: JSON config file used when --config isn't given (skipped if missing)
+        base_dir: Directory relative state/spool paths are resolved against
+            (default: the config file's directory, else the current directory)
+        environ: Environment variables (default: os.environ)
+
+    Returns:
+        Settings dict with every key of DEFAULTS, plus "config_file" (the
+        file that was loaded, or None)
+
+    Raises:
+        ValueError: If the config file or a setting is invalid
+    """
+    args = parse_args(argv)
+    environ = os.environ if environ is None else environ
+    config = dict(DEFAULTS)
+
+    config_file = args.config or config_file
+    loaded = None
+    if config_file and os.path.exists(config_file):
+        try:
+            with open(config_file, "r", encoding="utf-8") as f:
+                values = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ValueError(f"Could not read {config_file}: {e}")
+        if not isinstance(values, dict):
+            raise ValueError(f"{config_file} must contain a JSON object")
+        config.update({key: value for key, value in values.items() if value is not None})
+        loaded = config_file
+    elif args.config:
+        raise ValueError(f"Config file not found: {args.config}")
+
+    for key, name in ENVIRONMENT.items():
+        value = environ.get(name)
+        if value:
+            try:
+                config[key] = _convert(key, value)
+            except ValueError:
+                raise ValueError(f"Invalid value for {name}: {value!r}")
+
+    for key in ("watch_directory", "backend_url", "workspace", "backfill",
+                "watcher_backend", "poll_interval", "stats_interval", "vcs_policy"):
+        value = getattr(args, key)
+        if value is not None:
+            config[key] = value
+
+    if config["watcher_backend"] not in BACKENDS:
+        raise ValueError(f"watcher_backend must be one of {', '.join(BACKENDS)}")
+    if config["vcs_policy"] not in POLICIES:
+        raise ValueError(f"vcs_policy must be one of {', '.join(POLICIES)}")
+    config["watch_directory"] = os.path.abspath(os.path.expanduser(config["watch_directory"] or os.getcwd()))
+    if base_dir is None:
+        base_dir = os.path.dirname(os.path.abspath(loaded)) if loaded else os.getcwd()
+    for key in PATH_SETTINGS:
+        config[key] = os.path.join(base_dir, os.path.expanduser(config[key]))
+    config["extensions"] = [ext.lower() for ext in config["extensions"]]
+    config["config_file"] = loaded
+    return config
@@ -0,0 +1,106 @@
+"""
+Change debouncing shared by the file watchers
+
+Editors emit several modify events per save (truncate, write, metadata), and
+formatters or "save all" produce bursts. The debouncer waits until a path has
+been quiet for the delay and then fires once (trailing edge), so the final
+content is always the one sent. A bounded LRU of content hashes then skips
+saves that did not change the file.
+"""
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Set, Union
+
+
+def content_digest(content: Union[str, bytes]) -> str:
+    """SHA-256 hex digest of file content (text or raw bytes)"""
+    if isinstance(content, str):
+        content = content.encode("utf-8", "surrogatepass")
+    return hashlib.sha256(content).hexdigest()
+
+
+class Debouncer:
+    """Trailing-edge, per-path debounce with content-hash change detection"""
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        callback: Callable[[str], Awaitable[None]],
+        delay: float = 2.0,
+        max_entries: int = 4096
+    ):
+        """
+        Initialize debouncer
+
+        Args:
+            loop: Event loop the callback runs on
+            callback: Coroutine function called with the path once it settles
+            delay: Quiet period in seconds before the callback fires
+            max_entries: Content hashes remembered (least recently used are evicted)
+        """
+        self.loop = loop
+        self.callback = callback
+        self.delay = delay
+        self.max_entries = max_entries
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._digests: "OrderedDict[str, str]" = OrderedDict()
+        self._tasks: Set[asyncio.Task] = set()
+        self.fired = 0
+        self.unchanged = 0
+
+    def touch(self, path: str):
+        """Record an event for a path (safe to call from the observer thread)"""
+        self.loop.call_soon_threadsafe(self._reschedule, path)
+
+    def _reschedule(self, path: str):
+        """Restart the quiet period for a path"""
+        timer = self._timers.pop(path, None)
+        if timer is not None:
+            timer.cancel()
+        self._timers[path] = self.loop.call_later(self.delay, self._fire, path)
+
+    def _fire(self, path: str):
+        """Quiet period elapsed - run the callback once"""
+        self._timers.pop(path, None)
+        self.fired += 1
+        task = self.loop.create_task(self.callback(path))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def changed(self, path: str, content: Union[str, bytes]) -> Optional[str]:
+        """
+        Check content against the last version sent for a path
+
+        Returns:
+            The content digest if the content differs (pass it to mark_sent
+            once the send succeeds), or None if it is unchanged
+        """
+        digest = content_digest(content)
+        if self._digests.get(path) == digest:
+            self._digests.move_to_end(path)
+            self.unchanged += 1
+            return None
+        return digest
+
+    def mark_sent(self, path: str, digest: str):
+        """Remember the digest of content that was delivered"""
+        self._digests[path] = digest
+        self._digests.move_to_end(path)
+        while len(self._digests) > self.max_entries:
+            self._digests.popitem(last=False)
+
+    def forget(self, path: str):
+        """Drop the remembered digest so the next change is always sent"""
+        self._digests.pop(path, None)
+
+    def cancel_all(self):
+        """Cancel every pending timer"""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+
+    @property
+    def pending(self) -> int:
+        """Paths currently waiting for their quiet period to end"""
+        return len(self._timers)
@@ -0,0 +1,113 @@
+"""
+File reading shared by the file watchers
+
+Source files are read as bytes (callers run this in a worker thread, never on
+the event loop), checked against a size limit, and sniffed for binary content
+before being decoded. Binary files such as PDFs are not sent as text; they can
+be posted to the backend's /api/upload endpoint instead.
+"""
+import os
+import json
+import uuid
+import urllib.parse
+import urllib.request
+from typing import Dict, Optional, Tuple
+
+# Largest text file sent (the backend's bulk ingest rejects files over 1 MB too)
+DEFAULT_MAX_BYTES = 1024 * 1024
+
+# Bytes inspected when deciding whether a file is binary
+SNIFF_BYTES = 8192
+
+# read_source's skip reason for binary files
+BINARY = "binary content"
+
+# Control characters that do appear in text files (tab, newlines, form feed, escape)
+_TEXT_CONTROLS = {0x08, 0x09, 0x0a, 0x0c, 0x0d, 0x1b}
+_BINARY_MAGIC = (b"%PDF-", b"\x89PNG", b"\xff\xd8\xff", b"GIF8", b"PK\x03\x04", b"\x7fELF")
+
+
+def looks_binary(sample: bytes) -> bool:
+    """
+    Guess whether file content is binary from its first bytes
+
+    A NUL byte, a known binary signature or more than 10% control
+    characters marks the content as binary (the heuristic git and most
+    editors use).
+    """
+    if not sample:
+        return False
+    if b"\x00" in sample or sample.startswith(_BINARY_MAGIC):
+        return True
+    controls = sum(1 for byte in sample if byte < 0x20 and byte not in _TEXT_CONTROLS)
+    return controls * 10 > len(sample)
+
+
+def read_source(path: str, max_bytes: int = DEFAULT_MAX_BYTES) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Read a source file as text
+
+    Blocking - run it with asyncio.to_thread from async code.
+
+    Args:
+        path: File to read
+        max_bytes: Larger files are skipped without reading them
+
+    Returns:
+        (content, None), or (None, reason) if the file is missing, too large
+        or binary. Text that isn't valid UTF-8 is decoded with replacement
+        characters rather than skipped.
+    """
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size > max_bytes:
+                return None, f"larger than {max_bytes // 1024} KB ({size // 1024} KB)"
+            data = f.read(max_bytes + 1)
+    except FileNotFoundError:
+        return None, "file not found"
+    except OSError as e:
+        return None, str(e)
+    if len(data) > max_bytes:
+        return None, f"larger than {max_bytes // 1024} KB"  # grew while being read
+    if looks_binary(data[:SNIFF_BYTES]):
+        return None, BINARY
+    return data.decode("utf-8", "replace"), None
+
+
+def upload_url_for(websocket_url: str) -> str:
+    """Derive the backend's /api/upload URL from its stream WebSocket URL"""
+    parts = urllib.parse.urlsplit(websocket_url)
+    scheme = {"ws": "http", "wss": "https"}.get(parts.scheme, parts.scheme)
+    return urllib.parse.urlunsplit((scheme, parts.netloc, "/api/upload", "", ""))
+
+
+def upload_file(url: str, path: str, data: bytes, content_type: str = "application/pdf", timeout: float = 120) -> Dict:
+    """
+    Post a file to /api/upload as multipart/form-data
+
+    Blocking - run it with asyncio.to_thread from async code.
+
+    Returns:
+        The decoded JSON response
+
+    Raises:
+        OSError: If the request fails (urllib.error.URLError/HTTPError are OSErrors)
+    """
+    boundary = uuid.uuid4().hex
+    filename = os.path.basename(path).replace('"', "%22")
+    body = b"".join((
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n".encode("utf-8"),
+        data,
+        f"\r\n--{boundary}--\r\n".encode("ascii")
+    ))
+    request = urllib.request.Request(
+        url,
+        data=body,
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        method="POST"
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
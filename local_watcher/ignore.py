@@ -0,0 +1,283 @@
+"""
+Ignore-pattern matching shared by the file watchers
+
+Glob patterns (from config.json or the watcher defaults) and .gitignore files
+are compiled to regular expressions once. Decisions for directories are
+cached, and a path inside an ignored directory is rejected as soon as that
+directory matches, so events under node_modules/ or build output cost one
+cache lookup and no file I/O. The caches are shared by the watcher thread,
+the backfill walk and the event loop, so they are guarded by a lock (held
+only for lookups and updates, never while matching or reading files).
+
+Pattern syntax follows .gitignore: "name" matches at any depth, a pattern
+containing "/" is anchored to its base directory, a trailing "/" matches
+directories only, "**" spans directories and "!" re-includes.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+def glob_to_regex(pattern: str) -> str:
+    """Translate one gitignore-style glob (without "!" or trailing "/") to a regex body"""
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        if pattern.startswith("**/", i) and (i == 0 or pattern[i - 1] == "/"):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == n:
+            # "dir/**" - everything inside dir (and dir itself, so it can be pruned)
+            out.append("(?:/.*)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif pattern[i] == "[":
+            end = pattern.find("]", i + 2)
+            if end < 0:
+                out.append(re.escape("["))
+                i += 1
+                continue
+            body = pattern[i + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out.append("[" + body.replace("\\", "\\\\") + "]")
+            i = end + 1
+        elif pattern[i] == "\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(out)
+
+
+class RuleSet:
+    """Patterns sharing one base directory, compiled for fast matching"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.rules: List[Tuple["re.Pattern", bool, bool]] = []  # (regex, negate, dir_only)
+        for raw in patterns:
+            pattern = raw.rstrip("\n\r")
+            if not pattern.strip() or pattern.startswith("#"):
+                continue
+            pattern = pattern.strip()
+            negate = pattern.startswith("!")
+            if negate:
+                pattern = pattern[1:]
+            dir_only = pattern.endswith("/")
+            pattern = pattern.rstrip("/")
+            if not pattern:
+                continue
+            # A slash anywhere but the end anchors the pattern to the base directory
+            anchored = "/" in pattern
+            body = glob_to_regex(pattern.lstrip("/"))
+            regex = re.compile("^" + ("" if anchored else "(?:.*/)?") + body + "$")
+            self.rules.append((regex, negate, dir_only))
+
+        # Without negations the order doesn't matter: one alternation per kind
+        self.has_negation = any(negate for _, negate, _ in self.rules)
+        self._any_file = self._any_dir = None
+        if not self.has_negation and self.rules:
+            self._any_dir = re.compile("|".join(r.pattern for r, _, _ in self.rules))
+            file_rules = [r.pattern for r, _, dir_only in self.rules if not dir_only]
+            if file_rules:
+                self._any_file = re.compile("|".join(file_rules))
+
+    def match(self, path: str, is_dir: bool) -> Optional[bool]:
+        """
+        Match a path relative to the base directory
+
+        Returns:
+            True (ignored), False (re-included by "!") or None (no rule matched)
+        """
+        if not self.rules:
+            return None
+        if not self.has_negation:
+            regex = self._any_dir if is_dir else self._any_file
+            return True if regex is not None and regex.match(path) else None
+        result = None
+        for regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(path):
+                result = not negate
+        return result
+
+
+class IgnoreMatcher:
+    """Decide whether paths under a root directory are ignored"""
+
+    # Git's own metadata is never part of the working tree
+    ALWAYS_IGNORED = (".git/",)
+
+    def __init__(
+        self,
+        root: str,
+        patterns: Iterable[str] = (),
+        use_gitignore: bool = True,
+        cache_size: int = 8192
+    ):
+        """
+        Initialize matcher
+
+        Args:
+            root: Watched root directory
+            patterns: Extra glob patterns, relative to root
+            use_gitignore: Also honour .gitignore files in root and its subdirectories
+            cache_size: Directory decisions remembered (least recently used are evicted)
+        """
+        self.root = os.path.abspath(root)
+        self.use_gitignore = use_gitignore
+        self.cache_size = cache_size
+        self._base = RuleSet([*self.ALWAYS_IGNORED, *patterns])
+        self._gitignores: Dict[str, RuleSet] = {}  # directory (relative) -> its .gitignore rules
+        self._dir_cache: "OrderedDict[str, bool]" = OrderedDict()
+        self._lock = threading.Lock()  # guards _gitignores and _dir_cache
+
+    def _relative(self, path: str) -> Optional[str]:
+        """Path relative to root with "/" separators, or None if outside root"""
+        path = os.path.abspath(path)
+        if path == self.root:
+            return ""
+        prefix = self.root.rstrip(os.sep) + os.sep
+        if not path.startswith(prefix):
+            return None
+        rel = path[len(prefix):]
+        return rel.replace(os.sep, "/") if os.sep != "/" else rel
+
+    def _gitignore(self, dir_rel: str) -> RuleSet:
+        """Rules of the .gitignore in a directory (loaded once)"""
+        with self._lock:
+            rules = self._gitignores.get(dir_rel)
+        if rules is None:
+            path = os.path.join(self.root, *dir_rel.split("/"), ".gitignore")
+            try:
+                with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                    rules = RuleSet(f.readlines())
+            except OSError:
+                rules = RuleSet(())
+            with self._lock:
+                rules = self._gitignores.setdefault(dir_rel, rules)
+        return rules
+
+    def _match(self, rel: str, is_dir: bool) -> bool:
+        """Apply config patterns, then .gitignore files from the root down (last match wins)"""
+        ignored = bool(self._base.match(rel, is_dir))
+        if not self.use_gitignore:
+            return ignored
+        parts = rel.split("/")
+        for depth in range(len(parts)):
+            base = "/".join(parts[:depth])
+            result = self._gitignore(base).match("/".join(parts[depth:]), is_dir)
+            if result is not None:
+                ignored = result
+        return ignored
+
+    def _dir_ignored(self, dir_rel: str) -> bool:
+        """Cached decision for a directory"""
+        with self._lock:
+            cached = self._dir_cache.get(dir_rel)
+            if cached is not None:
+                self._dir_cache.move_to_end(dir_rel)
+                return cached
+        ignored = self._match(dir_rel, True)
+        with self._lock:
+            self._dir_cache[dir_rel] = ignored
+            if len(self._dir_cache) > self.cache_size:
+                self._dir_cache.popitem(last=False)
+        return ignored
+
+    def is_ignored(self, path: str, is_dir: bool = False) -> bool:
+        """
+        Check whether a path is ignored
+
+        Args:
+            path: Absolute path (or relative to the working directory)
+            is_dir: Whether the path is a directory
+
+        Returns:
+            True if the path or one of its parent directories is ignored
+        """
+        rel = self._relative(path)
+        if not rel:
+            return False  # the root itself, or outside it
+        parts = rel.split("/")
+        # Once a directory is excluded nothing below it can be re-included (as in git)
+        for depth in range(1, len(parts)):
+            if self._dir_ignored("/".join(parts[:depth])):
+                return True
+        if is_dir:
+            return self._dir_ignored(rel)
+        return self._match(rel, False)
+
+    def invalidate(self, path: str):
+        """Forget cached rules after a .gitignore file changed"""
+        rel = self._relative(os.path.dirname(os.path.abspath(path)))
+        if rel is not None:
+            with self._lock:
+                self._gitignores.pop(rel, None)
+                self._dir_cache.clear()
+
+    def scan(self, top: Optional[str] = None) -> Iterator[os.DirEntry]:
+        """
+        Yield the entry of every non-ignored file and directory under a directory
+
+        Ignored directories are never descended into, and symlinks are not
+        followed. Entries carry their type (and on Windows their stat), so
+        callers avoid extra system calls.
+
+        Args:
+            top: Directory to scan (default: the root)
+        """
+        stack = [os.path.abspath(top or self.root)]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if self.is_ignored(entry.path, is_dir):
+                    continue
+                if is_dir:
+                    stack.append(entry.path)
+                    yield entry
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+    def walk(self, top: Optional[str] = None) -> Iterator[str]:
+        """
+        Yield every non-ignored file under a directory, never descending into ignored ones
+
+        Args:
+            top: Directory to walk (default: the root)
+        """
+        for entry in self.scan(top):
+            if not entry.is_dir(follow_symlinks=False):
+                yield entry.path
+
+    def walk_dirs(self, top: Optional[str] = None) -> Iterator[str]:
+        """
+        Yield a directory and every non-ignored directory below it
+
+        Args:
+            top: Directory to walk (default: the root)
+        """
+        yield os.path.abspath(top or self.root)
+        for entry in self.scan(top):
+            if entry.is_dir(follow_symlinks=False):
+                yield entry.path
@@ -0,0 +1,181 @@
+"""
+Offline spool shared by the file watchers
+
+While the backend is unreachable, changed files are recorded in an on-disk
+spool instead of being dropped. Only the path is kept - the working tree
+already holds the latest content, which is read when the spool is replayed -
+so repeated changes to one file collapse into a single entry, and pending
+work survives a watcher restart. On reconnect the spooled files are sent in
+bulk (one ingest batch per chunk) instead of one upload each.
+
+The spool is an append-only journal of JSON lines (["+", path] / ["-", path]),
+compacted when it is loaded and once it grows well past the live entries.
+"""
+import os
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, Optional
+
+# Imported as local_watcher.spool by vscode_watcher.py, as spool by watcher.py
+try:
+    from .backfill import DEFAULT_BATCH_SIZE, MAX_BATCH_CHARS, SendBatch
+    from .debounce import content_digest
+    from .files import BINARY, DEFAULT_MAX_BYTES, read_source
+except ImportError:
+    from backfill import DEFAULT_BATCH_SIZE, MAX_BATCH_CHARS, SendBatch
+    from debounce import content_digest
+    from files import BINARY, DEFAULT_MAX_BYTES, read_source
+
+DEFAULT_MAX_ENTRIES = 5000
+
+# Journal lines allowed per live entry before it is rewritten
+COMPACT_RATIO = 4
+
+
+class Spool:
+    """Persistent, per-path deduplicated set of files waiting to be sent"""
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Load the spool journal (created on first use)
+
+        Args:
+            path: Journal file location
+            max_entries: Paths kept; beyond this the oldest are dropped
+        """
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.entries: "OrderedDict[str, float]" = OrderedDict()  # path -> last spooled (epoch seconds)
+        self.dropped = 0
+        self._lines = 0
+        self._journal = None
+        self._load()
+        self._compact()
+
+    def _load(self):
+        """Replay the journal into entries"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        op, file_path, *rest = json.loads(line)
+                    except (ValueError, TypeError):
+                        continue  # torn last line after a crash
+                    if op == "+":
+                        self.entries.pop(file_path, None)
+                        self.entries[file_path] = rest[0] if rest else time.time()
+                    else:
+                        self.entries.pop(file_path, None)
+        except OSError:
+            pass
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _compact(self):
+        """Rewrite the journal with one line per live entry"""
+        if self.entries or os.path.exists(self.path):
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for file_path, spooled_at in self.entries.items():
+                    f.write(json.dumps(["+", file_path, spooled_at]) + "\n")
+            os.replace(tmp, self.path)
+        self._lines = len(self.entries)
+
+    def _append(self, records: Iterable[list]):
+        """Append journal lines, compacting once the journal is mostly dead lines"""
+        if self._journal is None:
+            self._journal = open(self.path, "a", encoding="utf-8")
+        for record in records:
+            self._journal.write(json.dumps(record) + "\n")
+            self._lines += 1
+        self._journal.flush()
+        if self._lines > COMPACT_RATIO * len(self.entries) + 100:
+            self._journal.close()
+            self._journal = None
+            self._compact()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, file_path: str):
+        """Record a changed file (the newest change moves it to the back)"""
+        now = time.time()
+        self.entries.pop(file_path, None)
+        self.entries[file_path] = now
+        records = [["+", file_path, now]]
+        while len(self.entries) > self.max_entries:
+            evicted, _ = self.entries.popitem(last=False)
+            records.append(["-", evicted])
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                print(f"⚠️  Offline spool full ({self.max_entries} files) - dropped {self.dropped} oldest change(s)")
+        self._append(records)
+
+    def remove(self, file_paths: Iterable[str]):
+        """Forget files that were delivered"""
+        records = []
+        for file_path in file_paths:
+            if self.entries.pop(file_path, None) is not None:
+                records.append(["-", file_path])
+        if records:
+            self._append(records)
+
+    def close(self):
+        """Close the journal file"""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    async def replay(
+        self,
+        send_batch: SendBatch,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        send_binary: Optional[Callable[[str], Awaitable[bool]]] = None,
+        description: str = "changed while offline"
+    ) -> bool:
+        """
+        Send every spooled file in batches, oldest first
+
+        Files are read when replayed, so the latest content is sent. Files
+        that are gone, too large or unreadable are just dropped from the spool.
+
+        Args:
+            send_batch: Delivers a batch of (path, content, digest); False stops the replay
+            batch_size: Files per batch
+            max_bytes: Larger files are dropped
+            send_binary: Delivers a binary file (e.g. a PDF upload); without it they are dropped
+            description: Why the files were spooled, for the progress lines
+
+        Returns:
+            True once the spool is empty, False if a batch was not delivered
+        """
+        if not self.entries:
+            return True
+        total = len(self.entries)
+        print(f"📤 Replaying {total} file(s) {description}...")
+        sent = 0
+        while self.entries:
+            stamps = {}  # path -> spool time when read
+            files = []
+            chars = 0
+            for file_path in list(self.entries)[:batch_size]:
+                stamps[file_path] = self.entries[file_path]
+                content, reason = await asyncio.to_thread(read_source, file_path, max_bytes)
+                if content is None:
+                    if reason == BINARY and send_binary is not None and not await send_binary(file_path):
+                        return False  # kept for the next replay
+                    continue
+                files.append((file_path, content, content_digest(content)))
+                chars += len(content)
+                if chars >= MAX_BATCH_CHARS:
+                    break
+            if files and not await send_batch(files):
+                return False
+            # Only forget entries not re-spooled by a newer change while the batch was in flight
+            self.remove([p for p, stamp in stamps.items() if self.entries.get(p) == stamp])
+            sent += len(files)
+        print(f"✅ Sent {sent} file(s) {description}")
+        return True
@@ -0,0 +1,85 @@
+"""
+Event and send metrics shared by the file watchers
+
+The watch backend counts file system events and dropped events, and the
+senders record how long each delivery to the backend took. A stats line
+(events/sec, dropped events, send latency percentiles) is printed
+periodically while there is activity, so event storms and a slow backend
+are visible without a profiler.
+"""
+import time
+import asyncio
+import threading
+from typing import List, Optional
+
+# Send latencies kept for the percentiles of one stats line
+MAX_SAMPLES = 1024
+
+
+class WatchStats:
+    """Counters updated from the watch backend's thread and the event loop"""
+
+    def __init__(self):
+        self.backend = "none"
+        self.watches = 0
+        self.watch_unit = "watches"  # inotify: directory watches, polling: files tracked
+        self.events = 0
+        self.dropped = 0
+        self.sent = 0
+        self._lock = threading.Lock()
+        self._latencies: List[float] = []
+        self._window_start = time.monotonic()
+        self._window_events = 0
+        self._window_dropped = 0
+
+    def event(self, count: int = 1):
+        """Record file system events (called from the backend thread)"""
+        with self._lock:
+            self.events += count
+            self._window_events += count
+
+    def drop(self, count: int = 1):
+        """Record events lost (kernel queue overflow, directories that could not be watched)"""
+        with self._lock:
+            self.dropped += count
+            self._window_dropped += count
+
+    def sent_in(self, seconds: float, files: int = 1):
+        """Record one delivery to the backend (a single file or a batch)"""
+        self.sent += files
+        if len(self._latencies) < MAX_SAMPLES:
+            self._latencies.append(seconds)
+
+    def line(self) -> Optional[str]:
+        """
+        Format the stats since the last line and start a new window
+
+        Returns:
+            The stats line, or None if nothing happened in the window
+        """
+        with self._lock:
+            now = time.monotonic()
+            elapsed = max(now - self._window_start, 1e-6)
+            events, dropped = self._window_events, self._window_dropped
+            latencies, self._latencies = sorted(self._latencies), []
+            self._window_start = now
+            self._window_events = self._window_dropped = 0
+        if not events and not dropped and not latencies:
+            return None
+        line = f"📊 {events / elapsed:.1f} events/s ({events} in {elapsed:.0f}s), {dropped} dropped"
+        if latencies:
+            p50 = latencies[len(latencies) // 2]
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            line += (f", send latency p50 {p50 * 1000:.0f} ms / p95 {p95 * 1000:.0f} ms"
+                     f" / max {latencies[-1] * 1000:.0f} ms ({len(latencies)} sends)")
+        return line + f" [{self.backend}: {self.watches} {self.watch_unit}]"
+
+    async def report(self, interval: float):
+        """Print a stats line every interval seconds while there is activity (run as a task)"""
+        if interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(interval)
+            line = self.line()
+            if line:
+                print(line)
@@ -0,0 +1,307 @@
+"""
+Backend transports for the watcher client
+
+A transport owns the wire format: how a file, a batch of files or a document
+upload reaches the backend, and how the backend's broadcasts come back. The
+client core (client.py) only deals in file paths and content, so a different
+transport (another protocol, a test double) plugs in without touching the
+debounce, spool, backfill or queueing logic.
+
+WebSocketTransport speaks python_backend/routes/stream.py: binary upload
+frames when the backend offers them, "ingest_batch" messages acknowledged by
+"ingest_accepted", "content_check" (which bodies the backend still needs)
+answered by "content_needed", channel subscriptions with resume-from-sequence
+after a reconnect, and PDF uploads over HTTP to /api/upload.
+"""
+import os
+import json
+import struct
+import asyncio
+import itertools
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlencode, urlsplit, urlunsplit
+
+import websockets
+
+# Imported as local_watcher.transport by vscode_watcher.py, as transport by watcher.py
+try:
+    from .files import upload_file, upload_url_for
+except ImportError:
+    from files import upload_file, upload_url_for
+
+# Binary upload framing (python_backend/utils/frame_codec.py): file content is
+# sent as raw UTF-8 after a small JSON header instead of JSON-escaped text
+BINARY_ENCODING = "binary-v1"
+_FRAME_PREFIX = struct.Struct(">2sBI")
+
+# Broadcast types the watchers print (streaming delta frames are skipped)
+DEFAULT_CHANNELS = ["analysis", "documentation", "recommendations", "quiz", "error", "ingest"]
+
+
+def encode_file_frame(header: dict, content: str) -> bytes:
+    """Encode upload metadata and file content into one binary frame"""
+    header_bytes = json.dumps(header, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return _FRAME_PREFIX.pack(b"PF", 1, len(header_bytes)) + header_bytes + content.encode("utf-8")
+
+
+class ConnectionLost(Exception):
+    """The backend connection closed while sending"""
+
+
+class Transport:
+    """Interface between the watcher client and the backend"""
+
+    # Backend features from the last connect() (e.g. "ingest_batch", "encodings")
+    capabilities: Dict = {}
+
+    async def connect(self) -> Dict:
+        """Open the connection; returns the backend's welcome message"""
+        raise NotImplementedError
+
+    async def close(self):
+        """Close the connection (no-op when not connected)"""
+        raise NotImplementedError
+
+    async def send_file(self, file_path: str, content: str):
+        """Send one file's content; raises ConnectionLost"""
+        raise NotImplementedError
+
+    @property
+    def supports_batches(self) -> bool:
+        """Whether send_batch() delivers many files per round-trip"""
+        return False
+
+    async def send_batch(self, files: List[Tuple[str, str]]) -> Optional[Dict]:
+        """
+        Send many (file_path, content) pairs at once; raises ConnectionLost
+
+        Returns:
+            The backend's ingest job, or None if it was not accepted in time
+        """
+        raise NotImplementedError
+
+    @property
+    def supports_content_check(self) -> bool:
+        """Whether check_content() can tell which bodies the backend needs"""
+        return False
+
+    async def check_content(self, files: List[Tuple[str, str, int]]) -> Optional[Set[str]]:
+        """
+        Ask which (file_path, sha256, size) the backend still needs; raises ConnectionLost
+
+        Returns:
+            The file paths whose content must be sent, or None if there was no answer in time
+        """
+        raise NotImplementedError
+
+    async def upload(self, file_path: str, data: bytes) -> Dict:
+        """Upload a document for server-side extraction; raises OSError"""
+        raise NotImplementedError
+
+    def messages(self) -> AsyncIterator[Dict]:
+        """Backend messages until the connection closes"""
+        raise NotImplementedError
+
+
+class WebSocketTransport(Transport):
+    """The backend's /api/ws/stream WebSocket (plus /api/upload for documents)"""
+
+    # Seconds to wait for the backend to accept a batch / answer a content check
+    BATCH_ACK_TIMEOUT = 30
+    CHECK_TIMEOUT = 10
+
+    def __init__(
+        self,
+        url: str,
+        workspace: Optional[str] = None,
+        channels: Iterable[str] = DEFAULT_CHANNELS,
+        upload_url: Optional[str] = None
+    ):
+        """
+        Initialize transport
+
+        Args:
+            url: Backend WebSocket URL
+            workspace: Workspace/user key; only this workspace's events are sent back
+            channels: Broadcast types to subscribe to
+            upload_url: Document upload endpoint (default: derived from url)
+        """
+        self.url = url
+        self.workspace = workspace
+        self.channels = list(channels)
+        self.upload_url = upload_url or upload_url_for(url)
+        self.capabilities = {}
+        self.websocket = None
+        # Last broadcast seen (stream id + sequence number); sent on reconnect so
+        # the backend replays only the events missed while disconnected
+        self.stream_id = None
+        self.seq = None
+        # batch_id -> ingest_accepted reply, check_id -> content_needed reply
+        self._pending_batches: Dict[int, asyncio.Future] = {}
+        self._pending_checks: Dict[int, asyncio.Future] = {}
+        self._request_ids = itertools.count(1)
+
+    def _connect_url(self) -> str:
+        """
+        The backend URL, with the resume position after a reconnect
+
+        Resuming on the URL makes the backend queue the missed events right
+        after the connected frame, before any live broadcast; resuming in the
+        subscribe message would let live events (with higher seq) overtake them.
+        """
+        if self.seq is None:
+            return self.url
+        parts = urlsplit(self.url)
+        resume = urlencode({"resume_from": self.seq, "stream_id": self.stream_id or ""})
+        query = f"{parts.query}&{resume}" if parts.query else resume
+        return urlunsplit(parts._replace(query=query))
+
+    async def connect(self) -> Dict:
+        self.websocket = await websockets.connect(
+            self._connect_url(),
+            ping_interval=20,
+            ping_timeout=10,
+            open_timeout=30,
+            close_timeout=10,
+            compression="deflate"  # permessage-deflate for large analysis/quiz frames
+        )
+        # The connected frame lists this backend's capabilities (encodings, ingest_batch)
+        welcome = json.loads(await self.websocket.recv())
+        self.capabilities = welcome.get("capabilities") or {}
+        if self.seq is None or welcome.get("stream_id") != self.stream_id:
+            # First connect, or a restarted backend whose numbering starts over
+            # (the backend answers a stale resume position with "resync")
+            self.stream_id = welcome.get("stream_id")
+            self.seq = welcome.get("last_seq") or 0
+
+        # Only receive the message types we display
+        await self.websocket.send(json.dumps({
+            "type": "subscribe",
+            "channels": self.channels,
+            "workspace": self.workspace,
+            "batch": True  # bursts (initial scan, formatter runs) arrive as one array frame
+        }))
+        return welcome
+
+    async def close(self):
+        websocket, self.websocket = self.websocket, None
+        for reply in (*self._pending_batches.values(), *self._pending_checks.values()):
+            if not reply.done():
+                reply.cancel()
+        if websocket is not None:
+            await websocket.close()
+
+    async def _send(self, message):
+        if self.websocket is None:
+            raise ConnectionLost("not connected")
+        try:
+            await self.websocket.send(message)
+        except websockets.exceptions.ConnectionClosed as e:
+            raise ConnectionLost(str(e))
+
+    async def send_file(self, file_path: str, content: str):
+        payload = {
+            "filename": os.path.basename(file_path),
+            "filepath": file_path,
+            "workspace": self.workspace,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        # Binary framing once the backend has offered it
+        if BINARY_ENCODING in self.capabilities.get("encodings", []):
+            await self._send(encode_file_frame(payload, content))
+        else:
+            payload["content"] = content
+            await self._send(json.dumps(payload))
+
+    @property
+    def supports_batches(self) -> bool:
+        return "ingest_batch" in self.capabilities
+
+    async def _request(self, pending: Dict[int, asyncio.Future], id_field: str, message: Dict, timeout: float):
+        """Send a message and wait for the reply echoing its id (None on timeout)"""
+        request_id = next(self._request_ids)
+        reply = asyncio.get_running_loop().create_future()
+        pending[request_id] = reply
+        try:
+            await self._send(json.dumps({**message, id_field: request_id}))
+            return await asyncio.wait_for(reply, timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        except asyncio.CancelledError:
+            if self.websocket is None:
+                raise ConnectionLost("closed while waiting for a reply")
+            raise
+        finally:
+            pending.pop(request_id, None)
+
+    async def send_batch(self, files: List[Tuple[str, str]]) -> Optional[Dict]:
+        return await self._request(self._pending_batches, "batch_id", {
+            "type": "ingest_batch",
+            "workspace": self.workspace,
+            "files": [
+                {"filename": os.path.basename(file_path), "filepath": file_path, "content": content}
+                for file_path, content in files
+            ]
+        }, self.BATCH_ACK_TIMEOUT)
+
+    @property
+    def supports_content_check(self) -> bool:
+        return "content_check" in self.capabilities
+
+    async def check_content(self, files: List[Tuple[str, str, int]]) -> Optional[Set[str]]:
+        reply = await self._request(self._pending_checks, "check_id", {
+            "type": "content_check",
+            "workspace": self.workspace,
+            "files": [
+                {"filepath": file_path, "sha256": sha256, "size": size}
+                for file_path, sha256, size in files
+            ]
+        }, self.CHECK_TIMEOUT)
+        return None if reply is None else set(reply.get("needed") or [])
+
+    async def upload(self, file_path: str, data: bytes) -> Dict:
+        return await asyncio.to_thread(upload_file, self.upload_url, file_path, data)
+
+    async def messages(self) -> AsyncIterator[Dict]:
+        websocket = self.websocket
+        if websocket is None:
+            return
+        try:
+            async for message in websocket:
+                try:
+                    data = json.loads(message)
+                except ValueError:
+                    continue
+                for item in (data if isinstance(data, list) else [data]):
+                    if isinstance(item, dict) and self._track(item):
+                        yield item
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    def _track(self, data: Dict) -> bool:
+        """
+        Update stream position and batch acknowledgements from a message
+
+        Returns:
+            False if the message was consumed here (already seen, or a reply to a request)
+        """
+        msg_type = data.get("type")
+        if msg_type in ("ingest_accepted", "content_needed"):
+            if msg_type == "ingest_accepted":
+                reply = self._pending_batches.get(data.get("batch_id"))
+            else:
+                reply = self._pending_checks.get(data.get("check_id"))
+            if reply is not None and not reply.done():
+                reply.set_result(data)
+            return False
+
+        seq = data.get("seq")
+        if isinstance(seq, int):
+            if self.seq is not None and seq <= self.seq:
+                return False  # already handled before the reconnect
+            self.seq = seq
+        if msg_type in ("resumed", "resync"):
+            self.stream_id = data.get("stream_id")
+            self.seq = data.get("last_seq") or 0
+        return True
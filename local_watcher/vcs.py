@@ -0,0 +1,171 @@
+"""
+Detection of version-control-driven bulk changes
+
+Branch checkouts, rebases, `git pull` and `git stash pop` rewrite dozens of
+files at once. Sent one by one they would each trigger interactive analysis
+(and recommendations, documentation, quizzes) for code nobody just wrote.
+The watcher client asks this module whether a settled change looks like
+part of such a burst, and if so collects the burst and submits it as one
+low-priority batch (or skips it, by policy).
+
+Two signals are used:
+
+- Git activity: the reflog (.git/logs/HEAD) or the stash log changed
+  shortly after the file was written. Git writes working-tree files first
+  and moves HEAD afterwards, so a file whose mtime falls just before a
+  reflog update was written by that operation. Plain commits, which don't
+  touch the working tree, are ignored.
+- Event storms: many distinct files changed within a few seconds (any VCS,
+  formatters run over the tree, code generators).
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+POLICIES = ("batch", "skip", "off")
+
+DEFAULT_STORM_THRESHOLD = 20  # distinct files
+DEFAULT_STORM_WINDOW = 5.0  # seconds
+
+# How long before a reflog update a file may have been written and still count
+# as part of that git operation (large checkouts take a while)
+VCS_WINDOW = 120.0
+
+# Slack for coarse file system timestamps
+MTIME_SLACK = 1.0
+
+
+def find_git_dir(path: str) -> Optional[str]:
+    """
+    Find the git directory of the repository containing a path
+
+    Handles the watched folder being a subdirectory of the repository, and
+    worktrees/submodules whose .git is a "gitdir: ..." file.
+    """
+    directory = os.path.abspath(path)
+    while True:
+        candidate = os.path.join(directory, ".git")
+        if os.path.isdir(candidate):
+            return candidate
+        if os.path.isfile(candidate):
+            try:
+                with open(candidate, "r", encoding="utf-8", errors="ignore") as f:
+                    line = f.readline().strip()
+            except OSError:
+                return None
+            if line.startswith("gitdir:"):
+                return os.path.normpath(os.path.join(directory, line[len("gitdir:"):].strip()))
+            return None
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+def _last_line(path: str, tail: int = 4096) -> str:
+    """Last line of a (possibly large) text file"""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - tail))
+        lines = f.read().decode("utf-8", "replace").rstrip("\n").rsplit("\n", 1)
+    return lines[-1]
+
+
+class ChangeClassifier:
+    """Decide whether a changed file is part of a VCS operation or an event storm"""
+
+    def __init__(
+        self,
+        root: str,
+        storm_threshold: int = DEFAULT_STORM_THRESHOLD,
+        storm_window: float = DEFAULT_STORM_WINDOW
+    ):
+        """
+        Args:
+            root: Watched directory (inside a git repository or not)
+            storm_threshold: Distinct files changed within storm_window that
+                make a storm (0 disables storm detection)
+            storm_window: Seconds over which changes are counted
+        """
+        self.git_dir = find_git_dir(root)
+        self.storm_threshold = storm_threshold
+        self.storm_window = storm_window
+        self._recent: "OrderedDict[str, float]" = OrderedDict()  # path -> last event (monotonic)
+        self._lock = threading.Lock()
+        self._signal_cache: Tuple[float, Optional[Tuple[float, str]]] = (0.0, None)
+
+    def touch(self, file_path: str):
+        """Record a change event (safe to call from the watch backend's thread)"""
+        now = time.monotonic()
+        with self._lock:
+            self._recent[file_path] = now
+            self._recent.move_to_end(file_path)
+            self._prune(now)
+
+    def _prune(self, now: float):
+        while self._recent:
+            oldest = next(iter(self._recent.values()))
+            if now - oldest <= self.storm_window:
+                break
+            self._recent.popitem(last=False)
+
+    def storm_size(self) -> int:
+        """Distinct files changed within the storm window"""
+        with self._lock:
+            self._prune(time.monotonic())
+            return len(self._recent)
+
+    def _git_signal(self) -> Optional[Tuple[float, str]]:
+        """
+        Latest working-tree-changing git activity
+
+        Returns:
+            (wall-clock time, description), or None outside a repository
+        """
+        if self.git_dir is None:
+            return None
+        cached_at, signal = self._signal_cache
+        if time.monotonic() - cached_at < 0.25:
+            return signal
+        signal = None
+        try:
+            reflog = os.path.join(self.git_dir, "logs", "HEAD")
+            mtime = os.stat(reflog).st_mtime
+            # "<old> <new> <who> <when> <tz>\t<action>: <message>"
+            action = _last_line(reflog).split("\t", 1)[-1].split(":", 1)[0]
+            if not action.startswith("commit"):
+                signal = (mtime, f"git {action.split(' ')[0] or 'operation'}")
+        except OSError:
+            pass
+        try:
+            mtime = os.stat(os.path.join(self.git_dir, "logs", "refs", "stash")).st_mtime
+            if signal is None or mtime > signal[0]:
+                signal = (mtime, "git stash")
+        except OSError:
+            pass
+        self._signal_cache = (time.monotonic(), signal)
+        return signal
+
+    def bulk_reason(self, file_path: str) -> Optional[str]:
+        """
+        Check whether a settled change is part of a bulk change
+
+        Returns:
+            What caused the burst (e.g. "git checkout", "change storm"), or
+            None for a genuine edit
+        """
+        signal = self._git_signal()
+        if signal is not None:
+            try:
+                mtime = os.stat(file_path).st_mtime
+            except OSError:
+                mtime = None
+            if mtime is not None and signal[0] - VCS_WINDOW <= mtime <= signal[0] + MTIME_SLACK:
+                return signal[1]
+        if self.storm_threshold > 0:
+            size = self.storm_size()
+            if size >= self.storm_threshold:
+                return f"change storm of {size} files"
+        return None
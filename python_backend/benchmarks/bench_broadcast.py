@@ -0,0 +1,91 @@
+"""
+Broadcast Micro-benchmark
+Per-broadcast CPU cost of WebSocketManager at 1, 10 and 100 connections,
+against the previous encode-per-connection approach (send_json per socket)
+
+Run from python_backend/:  python benchmarks/bench_broadcast.py
+"""
+import sys
+import json
+import time
+import asyncio
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.websocket_manager import WebSocketManager, orjson
+
+BROADCASTS = 300
+
+
+class FakeWebSocket:
+    """Accepts frames instantly so only server-side CPU is measured"""
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        pass
+
+    async def send_json(self, data):
+        # What Starlette's WebSocket.send_json does per call
+        await self.send_text(json.dumps(data, separators=(",", ":"), ensure_ascii=False))
+
+
+def sample_message() -> dict:
+    """A quiz broadcast of typical size (~6 KB)"""
+    questions = [{
+        "question": f"Question {i}: what does this \"snippet\" print?\n  for x in range(3): print(x)",
+        "options": {k: f"Option {k} for question {i} with some explanatory text" for k in "ABCD"},
+        "correct_answer": "A",
+        "explanation": "Because range(3) yields 0, 1 and 2 and print writes each on its own line. " * 3
+    } for i in range(10)]
+    return {
+        "type": "quiz",
+        "quiz": {"questions": questions},
+        "focus_areas": ["loops", "iterators", "printing"],
+        "timestamp": "2025-01-01T00:00:00"
+    }
+
+
+async def bench_per_connection(connections: int, message: dict) -> float:
+    """Previous behaviour: encode the message again for every connection"""
+    sockets = [FakeWebSocket() for _ in range(connections)]
+    start = time.process_time()
+    for _ in range(BROADCASTS):
+        for ws in sockets:
+            await ws.send_json(message)
+    return (time.process_time() - start) / BROADCASTS
+
+
+async def bench_encode_once(connections: int, message: dict) -> float:
+    """Current behaviour: encode once, queue the same frame for every sender task"""
+    manager = WebSocketManager()
+    for _ in range(connections):
+        await manager.connect(FakeWebSocket())
+    start = time.process_time()
+    for _ in range(BROADCASTS):
+        await manager.broadcast(message)
+        # Let every sender task drain its queue
+        while any(q.frames for q in manager.queues.values()):
+            await asyncio.sleep(0)
+    elapsed = (time.process_time() - start) / BROADCASTS
+    senders = [q.sender for q in manager.queues.values()]
+    for ws in list(manager.active_connections):
+        manager.disconnect(ws)
+    await asyncio.gather(*senders, return_exceptions=True)
+    return elapsed
+
+
+async def main():
+    message = sample_message()
+    print(f"Payload: {len(json.dumps(message))} bytes, encoder: {'orjson' if orjson else 'json'}")
+    print(f"{'connections':>11} {'per-connection':>16} {'encode-once':>13} {'speedup':>8}")
+    for connections in (1, 10, 100):
+        before = await bench_per_connection(connections, message)
+        after = await bench_encode_once(connections, message)
+        print(f"{connections:>11} {before * 1e6:>13.0f} us {after * 1e6:>10.0f} us {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+"""
+Text Cleaner Benchmark
+Time and peak memory of clean_text on multi-megabyte PDF-like text, against
+the previous implementation (two re.sub passes with module-level lookups, then
+split/loop/join), plus iter_clean_text cleaning the same text page by page
+
+Run from python_backend/:  python benchmarks/bench_text_cleaner.py
+"""
+import re
+import sys
+import time
+import random
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.text_cleaner import clean_text, iter_clean_text
+
+SIZES_MB = (1, 4, 16)
+PAGE_CHARS = 3000
+RUNS = 3
+
+
+def legacy_clean_text(text: str) -> str:
+    """The previous clean_text"""
+    text = re.sub(r'\n\s*\n\s*\n', '\n\n', text)
+    text = re.sub(r'[\x00-\x08\x0b-\x0c\x0e-\x1f\x7f-\x9f]', '', text)
+    lines = text.split('\n')
+    cleaned_lines = []
+    for line in lines:
+        if len(line) > 500:
+            cleaned_lines.append(line[:500] + '...')
+        else:
+            cleaned_lines.append(line)
+    return '\n'.join(cleaned_lines)
+
+
+def sample_pages(size_mb: int) -> list:
+    """Pages of extracted-PDF-like text: wrapped prose, code, blank runs, stray control characters"""
+    rng = random.Random(size_mb)
+    words = ("the function returns a list of values for each key in the dictionary "
+             "while loop iterator generator closure decorator class instance").split()
+    pages, total = [], 0
+    while total < size_mb * 1024 * 1024:
+        lines = []
+        while sum(len(line) + 1 for line in lines) < PAGE_CHARS:
+            kind = rng.random()
+            if kind < 0.70:
+                lines.append(" ".join(rng.choice(words) for _ in range(rng.randint(6, 14))))
+            elif kind < 0.85:
+                lines.append("    " + "x = compute(" + ", ".join(rng.choice(words) for _ in range(3)) + ")")
+            elif kind < 0.95:
+                lines.extend([""] * rng.randint(1, 4))
+            elif kind < 0.98:
+                lines.append("\x0c" + rng.choice(words).upper() + "\x00")
+            else:
+                lines.append(" ".join(rng.choice(words) for _ in range(120)))  # unwrapped paragraph
+        page = "\n".join(lines)
+        pages.append(page)
+        total += len(page) + 2
+    return pages
+
+
+def measure(func):
+    """Returns (result, best of RUNS seconds, peak MB allocated during one traced run)"""
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, min(times), peak / (1024 * 1024)
+
+
+def main():
+    print(f"{'input':>6} {'previous':>18} {'clean_text':>18} {'iter_clean_text':>18} {'speedup':>8}")
+    for size_mb in SIZES_MB:
+        pages = sample_pages(size_mb)
+        text = "\n\n".join(pages)
+        before, t_before, m_before = measure(lambda: legacy_clean_text(text))
+        after, t_after, m_after = measure(lambda: clean_text(text))
+        # Pages are generated lazily, as a PDF extractor would yield them
+        streamed, t_stream, m_stream = measure(
+            lambda: "".join(iter_clean_text((page for page in pages), separator="\n\n"))
+        )
+        assert before == after == streamed, "cleaners disagree"
+        print(f"{size_mb:>4}MB "
+              f"{t_before * 1e3:>7.0f} ms {m_before:>5.1f} MB "
+              f"{t_after * 1e3:>7.0f} ms {m_after:>5.1f} MB "
+              f"{t_stream * 1e3:>7.0f} ms {m_stream:>5.1f} MB "
+              f"{t_before / t_after:>7.1f}x")
+    print("Memory is the peak allocated during the call (including the result), not the input text")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
-from routes import stream, insights, recommendations, summary, upload, quiz
+from routes import stream, insights, recommendations, summary, upload, quiz, ingest
 
 # Load environment variables
 load_dotenv()
@@ -30,6 +30,7 @@ async def startup_event():
     """Initialize services when app starts"""
     from services.ai_agent import get_ai_agent
     from services.vector_store import get_vector_store
+    from services.websocket_manager import ws_manager
     import services.ai_agent as ai_module
     import services.vector_store as vs_module
     
@@ -37,8 +38,17 @@ async def startup_event():
     ai_module.ai_agent = get_ai_agent()
     vs_module.vector_store = get_vector_store()
     
+    # Connect to the other workers' broadcast bus (no-op for a single process)
+    await ws_manager.start_bus()
+    
     print("✅ Services initialized successfully")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release shared resources when the app stops"""
+    from services.websocket_manager import ws_manager
+    await ws_manager.stop_bus()
+
 # CORS middleware for frontend communication
 app.add_middleware(
     CORSMiddleware,
@@ -55,6 +65,7 @@ app.include_router(recommendations.router, prefix="/api", tags=["Recommendations
 app.include_router(summary.router, prefix="/api", tags=["Summary"])
 app.include_router(upload.router, prefix="/api", tags=["Upload"])
 app.include_router(quiz.router, prefix="/api", tags=["Quiz"])
+app.include_router(ingest.router, prefix="/api", tags=["Ingest"])
 
 @app.get("/")
 async def root():
@@ -72,9 +83,15 @@ async def health_check():
         "status": "healthy",
         "gemini_api_configured": bool(os.getenv("GOOGLE_API_KEY")),
         "vector_store": "chromadb",
-        "endpoints": ["/api/ws/stream", "/api/insights", "/api/recommendations", "/api/summary", "/api/upload", "/api/quiz"]
+        "endpoints": ["/api/ws/stream", "/api/insights", "/api/recommendations", "/api/summary", "/api/upload", "/api/quiz", "/api/ingest/batch"]
     }
 
+@app.get("/api/ws/stats")
+async def get_websocket_stats():
+    """Get WebSocket connection count, outbound queue depths and dropped/coalesced frames"""
+    from services.websocket_manager import ws_manager
+    return ws_manager.get_stats()
+
 @app.get("/api/rate-limit")
 async def get_rate_limit_status():
     """Get current API rate limit status"""
@@ -87,9 +104,22 @@ async def get_rate_limit_status():
         "remaining": status["remaining"],
         "can_request": status["can_request"],
         "last_date": status["last_date"],
+        "interactive_reserve": status["interactive_reserve"],
         "message": f"{status['remaining']} API calls remaining today (out of {status['limit']})"
     }
 
+@app.get("/api/llm/status")
+async def get_llm_status():
+    """Get Gemini call health: circuit breaker, retry/trip counters, dispatch queues and prompt token stats"""
+    from services.resilience import get_resilient_caller
+    from services.ai_agent import get_ai_agent
+    from utils.prompt_builder import get_prompt_stats
+    return {
+        **get_resilient_caller().get_status(),
+        "dispatcher": get_ai_agent().dispatcher.get_status(),
+        "prompt_tokens": get_prompt_stats()
+    }
+
 @app.post("/api/rate-limit/reset")
 async def reset_rate_limit():
     """Reset the rate limit counter (useful when switching API keys or for testing)"""
@@ -114,5 +144,7 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=port,
         reload=True,
-        log_level="info"
+        log_level="info",
+        # Compress frames when the client offers permessage-deflate (large quiz/recommendation payloads)
+        ws_per_message_deflate=True
     )
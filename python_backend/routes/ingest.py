@@ -0,0 +1,126 @@
+"""
+Ingest Route - Bulk file ingestion (many files or an archive per request)
+"""
+import asyncio
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse
+from starlette.datastructures import UploadFile
+
+from services.ingest_queue import get_ingest_queue, read_archive, MAX_ARCHIVE_BYTES, MAX_BATCH_FILES
+from services.content_index import get_content_index, MAX_CHECK_FILES
+
+router = APIRouter()
+
+# Content types treated as a raw archive body
+ARCHIVE_CONTENT_TYPES = (
+    "application/zip", "application/x-zip-compressed", "application/x-tar",
+    "application/gzip", "application/x-gzip", "application/x-bzip2",
+    "application/x-xz", "application/octet-stream"
+)
+
+@router.post("/ingest/batch", status_code=202)
+async def ingest_batch(request: Request):
+    """
+    Submit many files for analysis in one request
+    
+    Accepts:
+    - JSON: {"files": [{"filepath": "...", "content": "..."}, ...], "workspace": "..."}
+    - multipart/form-data with an "archive" file (zip, tar, tar.gz) and optional "workspace"
+    - A raw zip/tar body (workspace in the ?workspace= query parameter)
+    
+    Files are deduplicated and queued; analysis happens in the background.
+    Returns the job ID to poll at GET /api/ingest/jobs/{job_id} (progress is
+    also broadcast on the "ingest" WebSocket channel).
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    workspace = request.query_params.get("workspace")
+    
+    if content_type == "application/json":
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON body")
+        if not isinstance(body, dict) or not isinstance(body.get("files"), list):
+            raise HTTPException(status_code=400, detail='Expected {"files": [...]}')
+        files = body["files"]
+        workspace = body.get("workspace") or workspace
+        source = "api"
+        skipped = 0
+    elif content_type == "multipart/form-data":
+        form = await request.form()
+        archive = form.get("archive") or form.get("file")
+        if not isinstance(archive, UploadFile):
+            raise HTTPException(status_code=400, detail='Expected an "archive" file field')
+        workspace = form.get("workspace") or workspace
+        files, skipped = await _read_archive(await archive.read())
+        source = "archive"
+    elif content_type in ARCHIVE_CONTENT_TYPES:
+        files, skipped = await _read_archive(await request.body())
+        source = "archive"
+    else:
+        raise HTTPException(status_code=415, detail=f"Unsupported content type: {content_type or 'none'}")
+    
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many files ({len(files)}); split the batch into at most {MAX_BATCH_FILES}"
+        )
+    
+    job = get_ingest_queue().submit(files, workspace=workspace, source=source, skipped=skipped)
+    return JSONResponse(job.to_dict(), status_code=202)
+
+
+async def _read_archive(data: bytes):
+    """Read an uploaded archive off the event loop, mapping bad input to HTTP errors"""
+    if len(data) > MAX_ARCHIVE_BYTES:
+        raise HTTPException(status_code=413, detail=f"Archive larger than {MAX_ARCHIVE_BYTES} bytes")
+    try:
+        return await asyncio.to_thread(read_archive, data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error reading archive: {str(e)}")
+
+
+@router.post("/ingest/check")
+async def check_content(request: Request):
+    """
+    Ask which files the backend needs before uploading them
+    
+    Body: {"files": [{"filepath": "...", "sha256": "<hex>", "size": <bytes>}, ...], "workspace": "..."}
+    
+    Returns the filepaths whose content was not analyzed before ("needed")
+    and those that were ("known"); only the needed ones are worth sending
+    to /api/ingest/batch.
+    """
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if not isinstance(body, dict) or not isinstance(body.get("files"), list):
+        raise HTTPException(status_code=400, detail='Expected {"files": [...]}')
+    if len(body["files"]) > MAX_CHECK_FILES:
+        raise HTTPException(status_code=413, detail=f"Too many files; check at most {MAX_CHECK_FILES} at once")
+    
+    needed, known = get_content_index().check(body.get("workspace"), body["files"])
+    return {"needed": needed, "known": known}
+
+
+@router.get("/ingest/jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    """Get the progress of a bulk ingestion job"""
+    state = get_ingest_queue().job_state(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Unknown job ID (finished jobs are kept for a limited time)")
+    return state
+
+
+@router.get("/ingest/jobs")
+async def list_ingest_jobs():
+    """Get ingest queue status and recent jobs (newest first)"""
+    queue = get_ingest_queue()
+    return {
+        "queue": queue.get_status(),
+        "content_index": get_content_index().get_status(),
+        "jobs": queue.job_states()
+    }
@@ -3,11 +3,16 @@ Stream Route - WebSocket endpoint for real-time code streaming
 """
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from datetime import datetime
+import json
 import uuid
 
 from services.websocket_manager import ws_manager
-from services.ai_agent import get_ai_agent
+from services.ai_agent import get_ai_agent, DispatchCancelled, PRIORITY_BACKGROUND, PRIORITY_PREFETCH
 from services.vector_store import get_vector_store
+from services.ingest_queue import get_ingest_queue, MAX_BATCH_FILES
+from services.content_index import get_content_index, MAX_CHECK_FILES
+from utils.frame_codec import decode_file_frame, is_file_frame
+from utils.prompt_builder import valid_line_numbers
 
 router = APIRouter()
 
@@ -25,13 +30,32 @@ async def websocket_stream(websocket: WebSocket):
         await ws_manager.send_message(websocket, {
             "type": "connected",
             "message": "Connected to Learning AI Agent",
+            # Clients opt into batching with "batch": true in their subscribe message;
+            # many files can be sent at once as an "ingest_batch" message, and
+            # "content_check" tells which file bodies are needed before uploading
+            "capabilities": {
+                **ws_manager.capabilities(websocket),
+                "ingest_batch": {"max_files": MAX_BATCH_FILES},
+                "content_check": {"max_files": MAX_CHECK_FILES, "hash": "sha256"}
+            },
+            # Broadcasts carry "seq"; reconnect with resume_from=<last seq> to replay missed ones
+            **ws_manager.stream_position(),
             "timestamp": datetime.utcnow().isoformat()
         })
         
+        # Resume handshake on the URL (?resume_from=N&stream_id=...): the missed events are queued
+        # before any live broadcast can reach this connection
+        resume_from = websocket.query_params.get("resume_from")
+        if resume_from is not None and resume_from.isdigit():
+            await ws_manager.send_message(
+                websocket,
+                ws_manager.replay(websocket, int(resume_from), websocket.query_params.get("stream_id"))
+            )
+        
         while True:
             try:
-                # Receive data from client
-                data = await websocket.receive_json()
+                # Receive data from client (JSON text, or a binary frame)
+                message = await websocket.receive()
             except WebSocketDisconnect:
                 print("✅ WebSocket client disconnected normally")
                 break
@@ -44,33 +68,118 @@ async def websocket_stream(websocket: WebSocket):
                 ]):
                     print(f"✅ WebSocket disconnected: {e}")
                     break
-                
-                # For other errors, try to receive as text
-                print(f"⚠️ Error receiving JSON: {e}")
-                try:
-                    text_data = await websocket.receive_text()
-                    import json
-                    data = json.loads(text_data)
-                except WebSocketDisconnect:
-                    print("✅ WebSocket disconnected during text receive")
-                    break
-                except Exception as parse_error:
-                    parse_error_str = str(parse_error).lower()
-                    # Check if it's a disconnect error
-                    if any(keyword in parse_error_str for keyword in [
-                        "disconnect", "closed", "cannot call receive",
-                        "connection closed", "websocket is closed"
-                    ]):
-                        print(f"✅ WebSocket disconnected: {parse_error}")
-                        break
-                    # Otherwise, it's a parse error - skip this message
-                    print(f"❌ Could not parse message: {parse_error}, skipping...")
+                print(f"⚠️ Error receiving message: {e}")
+                continue
+            
+            if message.get("type") == "websocket.disconnect":
+                print("✅ WebSocket client disconnected normally")
+                break
+            
+            try:
+                raw = message.get("bytes")
+                if raw is not None and is_file_frame(raw):
+                    # Binary upload: header JSON + raw file content
+                    data = decode_file_frame(raw)
+                else:
+                    # JSON text (proxies may forward it as a binary frame)
+                    data = json.loads(raw if raw is not None else message.get("text") or "")
+                if not isinstance(data, dict):
+                    raise ValueError("message must be a JSON object")
+            except ValueError as parse_error:
+                # Parse error - skip this message
+                print(f"❌ Could not parse message: {parse_error}, skipping...")
+                continue
+            
+            # Control messages: choose which broadcast types (and whose files) to receive
+            msg_type = data.get("type")
+            if msg_type == "subscribe":
+                workspace = data.get("workspace")
+                channels = ws_manager.subscribe(websocket, data.get("channels"), workspace)
+                ws_manager.set_batching(websocket, bool(data.get("batch")))
+                await ws_manager.send_message(websocket, {
+                    "type": "subscribed",
+                    "channels": channels,
+                    "workspace": workspace,
+                    "batch": bool(data.get("batch")),
+                    "timestamp": datetime.utcnow().isoformat()
+                })
+                # Replay what was missed while disconnected, filtered by the new subscription
+                if isinstance(data.get("resume_from"), int):
+                    await ws_manager.send_message(
+                        websocket,
+                        ws_manager.replay(websocket, data["resume_from"], data.get("stream_id"))
+                    )
+                continue
+            if msg_type == "unsubscribe":
+                ws_manager.unsubscribe(websocket)
+                continue
+            
+            # Dedup handshake: {filepath, sha256, size} per file; only bodies the
+            # content index doesn't know yet need to be uploaded
+            if msg_type == "content_check":
+                files = data.get("files")
+                if not isinstance(files, list) or len(files) > MAX_CHECK_FILES:
+                    await ws_manager.send_message(websocket, {
+                        "type": "error",
+                        "message": f"content_check needs a \"files\" list of at most {MAX_CHECK_FILES} files",
+                        "timestamp": datetime.utcnow().isoformat()
+                    })
+                    continue
+                needed, known = get_content_index().check(
+                    data.get("workspace") or ws_manager.workspace_of(websocket), files
+                )
+                await ws_manager.send_message(websocket, {
+                    "type": "content_needed",
+                    # Echoed so the client can match the reply to its request
+                    "check_id": data.get("check_id"),
+                    "needed": needed,
+                    "known": known,
+                    "timestamp": datetime.utcnow().isoformat()
+                })
+                continue
+            
+            # Bulk upload: many files in one message, analyzed by the ingest queue
+            if msg_type == "ingest_batch":
+                files = data.get("files")
+                if not isinstance(files, list) or len(files) > MAX_BATCH_FILES:
+                    await ws_manager.send_message(websocket, {
+                        "type": "error",
+                        "message": f"ingest_batch needs a \"files\" list of at most {MAX_BATCH_FILES} files",
+                        "timestamp": datetime.utcnow().isoformat()
+                    })
                     continue
+                job = get_ingest_queue().submit(
+                    files,
+                    workspace=data.get("workspace") or ws_manager.workspace_of(websocket),
+                    source="websocket"
+                )
+                await ws_manager.send_message(websocket, {
+                    "type": "ingest_accepted",
+                    # Echoed so the client can match the reply to its request
+                    "batch_id": data.get("batch_id"),
+                    **job.to_dict(),
+                    "timestamp": datetime.utcnow().isoformat()
+                })
+                continue
             
             # Extract file information
             filename = data.get("filename", "unknown.txt")
             filepath = data.get("filepath", "")
             content = data.get("content", "")
+            changed_lines = valid_line_numbers(data.get("changed_lines"))  # optional hint from the watcher
+            # Events for this file only go to subscribers of the sender's workspace
+            workspace = data.get("workspace") or ws_manager.workspace_of(websocket)
+            
+            # Content analyzed before (e.g. a file switched back by a branch checkout)
+            # costs no LLM or embedding work
+            if get_content_index().contains_content(workspace, content):
+                await ws_manager.send_message(websocket, {
+                    "type": "received",
+                    "filename": filename,
+                    "unchanged": True,
+                    "timestamp": datetime.utcnow().isoformat()
+                })
+                continue
             
             # Send immediate acknowledgment (non-blocking)
             await ws_manager.send_message(websocket, {
@@ -81,18 +190,41 @@ async def websocket_stream(websocket: WebSocket):
             
             # Process AI analysis in background (non-blocking)
             # This prevents WebSocket timeout during long AI processing
-            async def process_analysis():
+            # Per-message values are passed in, not closed over: the loop may
+            # receive the next file before this task finishes
+            async def process_analysis(filename, filepath, content, changed_lines, workspace):
                 """Process AI analysis in background"""
                 try:
+                    # Generate session ID up front so streamed deltas can be
+                    # correlated with the final analysis message
+                    session_id = str(uuid.uuid4())
+                    
+                    async def send_analysis_delta(partial, attempt):
+                        """Push partial analysis to clients while the model is generating"""
+                        await ws_manager.broadcast({
+                            "type": "analysis_delta",
+                            "session_id": session_id,
+                            "filename": filename,
+                            "partial": partial,
+                            "attempt": attempt,
+                            "timestamp": datetime.utcnow().isoformat()
+                        }, workspace=workspace)
+                    
                     ai_agent = get_ai_agent()
                     analysis = await ai_agent.analyze_code(
                         code_content=content,
                         filename=filename,
-                        filepath=filepath
+                        filepath=filepath,
+                        on_delta=send_analysis_delta,
+                        focus_lines=changed_lines,
+                        priority=PRIORITY_BACKGROUND,
+                        workspace=workspace
                     )
                     
-                    # Generate session ID
-                    session_id = str(uuid.uuid4())
+                    # Only real analyses count as "seen": a mock (no key, quota
+                    # spent) must not stop the file from being analyzed later
+                    if not analysis.get("mock"):
+                        get_content_index().add(workspace, content, filepath)
                     
                     # Store in vector database
                     vector_store = get_vector_store()
@@ -109,7 +241,7 @@ async def websocket_stream(websocket: WebSocket):
                         "analysis": analysis,
                         "timestamp": datetime.utcnow().isoformat()
                     }
-                    await ws_manager.broadcast(analysis_message)
+                    await ws_manager.broadcast(analysis_message, workspace=workspace)
                     
                     # Generate documentation suggestions if there are errors or weak areas
                     errors = analysis.get("errors", [])
@@ -120,7 +252,8 @@ async def websocket_stream(websocket: WebSocket):
                             errors=errors,
                             weak_areas=weak_areas,
                             topics=analysis.get("topics", []),
-                            code_content=content
+                            code_content=content,
+                            priority=PRIORITY_BACKGROUND
                         )
                         
                         if doc_suggestions:
@@ -131,14 +264,15 @@ async def websocket_stream(websocket: WebSocket):
                                 "errors": errors,
                                 "weak_areas": weak_areas,
                                 "timestamp": datetime.utcnow().isoformat()
-                            })
+                            }, workspace=workspace)
                     
                     # Generate recommendations if there are struggles
                     if analysis.get("potential_struggles") or weak_areas:
                         recommendations = await ai_agent.generate_recommendations(
                             topics=analysis.get("topics", []),
                             struggles=analysis.get("potential_struggles", []) + weak_areas,
-                            recent_code_summary=analysis.get("summary", "")
+                            recent_code_summary=analysis.get("summary", ""),
+                            priority=PRIORITY_BACKGROUND
                         )
                         
                         # Store recommendations
@@ -151,7 +285,7 @@ async def websocket_stream(websocket: WebSocket):
                             "type": "recommendations",
                             "recommendations": recommendations,
                             "timestamp": datetime.utcnow().isoformat()
-                        })
+                        }, workspace=workspace)
                     
                     # Generate quiz based on weak areas if they exist
                     if weak_areas:
@@ -159,7 +293,9 @@ async def websocket_stream(websocket: WebSocket):
                             quiz = await ai_agent.generate_quiz(
                                 topics=weak_areas[:3],  # Focus on weak areas
                                 content_summary=analysis.get("summary", ""),
-                                num_questions=5
+                                num_questions=5,
+                                # Nobody asked for this quiz yet - first to go under load
+                                priority=PRIORITY_PREFETCH
                             )
                             
                             if quiz and quiz.get("questions"):
@@ -168,10 +304,16 @@ async def websocket_stream(websocket: WebSocket):
                                     "quiz": quiz,
                                     "focus_areas": weak_areas,
                                     "timestamp": datetime.utcnow().isoformat()
-                                })
+                                }, workspace=workspace)
+                        except DispatchCancelled:
+                            pass  # shed under load before anyone asked for it
                         except Exception as e:
                             print(f"Error generating quiz: {e}")
                 
+                except DispatchCancelled as e:
+                    # A newer version of the file is queued (or load was shed):
+                    # nothing is stored, broadcast or indexed for this one
+                    print(f"⏭️  Skipped {filename}: {e}")
                 except Exception as e:
                     # Send error message but keep connection alive
                     print(f"⚠️ Error analyzing code: {e}")
@@ -182,22 +324,22 @@ async def websocket_stream(websocket: WebSocket):
                             "type": "error",
                             "message": f"Analysis error: {str(e)}",
                             "timestamp": datetime.utcnow().isoformat()
-                        })
+                        }, workspace=workspace)
                     except:
                         pass  # If we can't send, connection might be dead
             
             # Start background task (non-blocking)
             import asyncio
-            asyncio.create_task(process_analysis())
+            asyncio.create_task(process_analysis(filename, filepath, content, changed_lines, workspace))
     
     except WebSocketDisconnect:
         print("WebSocket client disconnected normally")
-        ws_manager.disconnect(websocket)
     except Exception as e:
         print(f"❌ WebSocket error: {e}")
         import traceback
         traceback.print_exc()
-        try:
+    finally:
+        # Also reached when the receive loop breaks on disconnect -
+        # stops this connection's sender task
+        if websocket in ws_manager.active_connections:
             ws_manager.disconnect(websocket)
-        except:
-            pass
@@ -2,22 +2,27 @@
 Summary Route - Get learning progress summaries
 """
 from fastapi import APIRouter, Query
-from typing import Dict
+from typing import Dict, Optional
 from datetime import datetime, timedelta
+import uuid
 from services.vector_store import get_vector_store
 from services.ai_agent import get_ai_agent
+from services.websocket_manager import ws_manager
 
 router = APIRouter()
 
 @router.get("/summary")
 async def get_summary(
-    period: str = Query("weekly", regex="^(daily|weekly|monthly)$")
+    period: str = Query("weekly", regex="^(daily|weekly|monthly)$"),
+    workspace: Optional[str] = Query(None)
 ) -> Dict:
     """
     Get AI-generated learning summary
     
     Args:
         period: Time period for summary (daily/weekly/monthly)
+        workspace: Workspace/user key whose stream clients get the summary_delta
+            frames (default: every summary_delta subscriber)
     
     Returns:
         Summary of learning progress, topics covered, and areas of focus
@@ -49,14 +54,31 @@ async def get_summary(
     else:  # monthly
         filtered_sessions = all_sessions
     
+    # Stream summary text to dashboard clients as it is generated; only
+    # connections subscribed to summary_delta (for this workspace) get it
+    summary_id = str(uuid.uuid4())
+    
+    async def send_summary_delta(text: str, attempt: int):
+        await ws_manager.broadcast({
+            "type": "summary_delta",
+            "summary_id": summary_id,
+            "period": period,
+            "delta": text,
+            # A retried stream starts over: drop text from lower attempts
+            "attempt": attempt,
+            "timestamp": datetime.utcnow().isoformat()
+        }, workspace=workspace)
+    
     # Generate AI summary
     ai_agent = get_ai_agent()
     summary_data = await ai_agent.generate_summary(
         sessions=filtered_sessions,
-        period=period
+        period=period,
+        on_delta=send_summary_delta
     )
     
     # Add date range
+    summary_data["summary_id"] = summary_id
     summary_data["period"] = period
     summary_data["date_range"] = {
         "start": filtered_sessions[-1].get("timestamp", "") if filtered_sessions else "",
@@ -3,13 +3,13 @@ Upload Route - Handle file uploads (PDF, code files, etc.)
 """
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from fastapi.responses import JSONResponse
-from typing import Optional
+from typing import Iterator, Optional
 import uuid
 from datetime import datetime
 
 from services.ai_agent import get_ai_agent
 from services.vector_store import get_vector_store
-from utils.text_cleaner import clean_text, clean_code
+from utils.text_cleaner import clean_text, clean_code, iter_clean_text
 
 router = APIRouter()
 
@@ -31,8 +31,8 @@ async def upload_file(file: UploadFile = File(...)):
         
         # Process based on file type
         if file_extension == "pdf":
-            # Process PDF
-            text_content = process_pdf(content)
+            # Process PDF (cleaned page by page as it is extracted)
+            cleaned_content = process_pdf(content)
         elif file_extension in ["py", "js", "ts", "jsx", "tsx", "java", "cpp", "go", "rs", "html", "css", "sql", "txt", "md"]:
             # Process code/text file
             try:
@@ -43,12 +43,12 @@ async def upload_file(file: UploadFile = File(...)):
                     text_content = content.decode('latin-1')
                 except:
                     raise HTTPException(status_code=400, detail="Unable to decode file content")
+            
+            # Clean text content
+            cleaned_content = clean_text(text_content)
         else:
             raise HTTPException(status_code=400, detail=f"Unsupported file type: {file_extension}")
         
-        # Clean text content
-        cleaned_content = clean_text(text_content)
-        
         if not cleaned_content or len(cleaned_content.strip()) < 10:
             raise HTTPException(status_code=400, detail="File content is too short or empty")
         
@@ -115,54 +115,66 @@ async def upload_file(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
 
-def process_pdf(content: bytes) -> str:
+def iter_pdf_pages(content: bytes) -> Iterator[str]:
     """
-    Extract text from PDF content
+    Extract text from PDF content, one page at a time
     
     Args:
         content: PDF file bytes
         
-    Returns:
-        Extracted text content
+    Yields:
+        Text of each page that has any
+        
+    Raises:
+        ValueError: If no text could be extracted
     """
+    import io
+    
+    # Try using pypdf first
+    from pypdf import PdfReader
+    
+    extracted = False
+    for page in PdfReader(io.BytesIO(content)).pages:
+        text = page.extract_text()
+        if text:
+            extracted = True
+            yield text
+    if extracted:
+        return
+    
+    # Fallback to pdfplumber if pypdf finds no text
     try:
-        # Try using pypdf first
-        from pypdf import PdfReader
-        import io
-        
-        pdf_file = io.BytesIO(content)
-        reader = PdfReader(pdf_file)
-        
-        text_parts = []
-        for page in reader.pages:
-            text = page.extract_text()
-            if text:
-                text_parts.append(text)
-        
-        if text_parts:
-            return "\n\n".join(text_parts)
-        
-        # Fallback to pdfplumber if pypdf fails
-        try:
-            import pdfplumber
-            
-            pdf_file = io.BytesIO(content)
-            with pdfplumber.open(pdf_file) as pdf:
-                text_parts = []
-                for page in pdf.pages:
-                    text = page.extract_text()
-                    if text:
-                        text_parts.append(text)
-                
-                if text_parts:
-                    return "\n\n".join(text_parts)
-        except ImportError:
-            pass
-        
+        import pdfplumber
+    except ImportError:
+        pdfplumber = None
+    if pdfplumber is not None:
+        with pdfplumber.open(io.BytesIO(content)) as pdf:
+            for page in pdf.pages:
+                text = page.extract_text()
+                if text:
+                    extracted = True
+                    yield text
+    
+    if not extracted:
         raise ValueError("Unable to extract text from PDF")
+
+
+def process_pdf(content: bytes) -> str:
+    """
+    Extract and clean text from PDF content
+    
+    Pages are cleaned as they are extracted, so the raw text of the whole
+    document is never held next to its cleaned copy.
+    
+    Args:
+        content: PDF file bytes
         
+    Returns:
+        Cleaned text content, pages separated by a blank line
+    """
+    try:
+        return "".join(iter_clean_text(iter_pdf_pages(content), separator="\n\n"))
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error processing PDF: {str(e)}")
-
@@ -8,10 +8,20 @@ if __name__ == "__main__":
     script_dir = Path(__file__).parent.resolve()
     os.chdir(script_dir)
     
+    # With several workers, broadcasts must be relayed between processes
+    workers = int(os.getenv("BACKEND_WORKERS", "1"))
+    if workers > 1:
+        os.environ.setdefault("BROADCAST_BUS", "local")
+        print(f"⚠️ {workers} workers: the content index, LLM concurrency limit, circuit breaker "
+              "and replay buffer are kept per worker process")
+    
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
         reload=False,
-        log_level="info"
+        workers=workers,
+        log_level="info",
+        # Compress frames when the client offers permessage-deflate (large quiz/recommendation payloads)
+        ws_per_message_deflate=True
     )
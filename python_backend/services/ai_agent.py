@@ -3,9 +3,37 @@ AI Agent Service - Gemini Integration
 Handles code analysis, topic extraction, and learning insights
 """
 import os
-from typing import Dict, List, Optional
+import re
+import heapq
+import asyncio
+import itertools
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 from pydantic import BaseModel
 from services.rate_limiter import get_rate_limiter
+from services.resilience import get_resilient_caller, classify_error, CircuitOpenError, QUOTA
+from utils.prompt_builder import build_code_excerpt, error_lines, ANALYSIS_CODE_BUDGET, DOCS_CODE_BUDGET
+from utils.json_extractor import extract_json
+
+# Stream model output token-by-token when a caller supplies an on_delta callback.
+# Set LLM_STREAMING=false to always wait for the complete response instead.
+STREAMING_ENABLED = os.getenv("LLM_STREAMING", "true").lower() not in ("0", "false", "no")
+
+# Async callback receiving incremental output (partial analysis dict or text chunk)
+# and the 1-based attempt it belongs to. A failed stream may be retried after it
+# already produced output; deltas of an earlier attempt are then superseded
+DeltaCallback = Callable[[Any, int], Awaitable[None]]
+
+# Priority classes for LLM work, highest first
+PRIORITY_INTERACTIVE = "interactive"  # user clicked something and is waiting
+PRIORITY_BACKGROUND = "background"    # watcher-driven analysis from /ws/stream
+PRIORITY_PREFETCH = "prefetch"        # speculative work nobody asked for yet
+_PRIORITY_RANK = {PRIORITY_INTERACTIVE: 0, PRIORITY_BACKGROUND: 1, PRIORITY_PREFETCH: 2}
+
+# Concurrent Gemini calls, and how many non-interactive calls may wait in line
+MAX_CONCURRENT_CALLS = int(os.getenv("LLM_MAX_CONCURRENCY", "2"))
+MAX_QUEUED_BACKGROUND = int(os.getenv("LLM_MAX_QUEUED_BACKGROUND", "20"))
+
+_URL_PATTERN = re.compile(r'https?://[^\s)\]>"\']+')
 
 # Conditional imports - only if API key is available
 if os.getenv("GOOGLE_API_KEY"):
@@ -39,6 +67,178 @@ class RecommendationList(BaseModel):
     """Structured output for recommendations"""
     recommendations: List[Recommendation]
 
+class QuizOptions(BaseModel):
+    """Multiple choice options for a quiz question"""
+    A: str
+    B: str
+    C: str
+    D: str
+
+class QuizQuestion(BaseModel):
+    """Structured output for a single quiz question"""
+    question: str
+    options: QuizOptions
+    correct_answer: str  # "A", "B", "C" or "D"
+    explanation: str
+
+class Quiz(BaseModel):
+    """Structured output for a quiz"""
+    questions: List[QuizQuestion]
+
+class DocumentationSuggestion(BaseModel):
+    """Structured output for a single documentation suggestion"""
+    title: str
+    url: str
+    description: str
+    focus_area: str
+    difficulty: str  # "beginner", "intermediate", "advanced"
+    resource_type: str  # "documentation", "article", "tutorial", "video"
+
+class DocumentationSuggestionList(BaseModel):
+    """Structured output for documentation suggestions"""
+    suggestions: List[DocumentationSuggestion]
+
+class DispatchCancelled(Exception):
+    """Raised to a queued call that was superseded or shed before it ran"""
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of a mock result when a caller can't use one (no API key, quota spent, circuit open)"""
+
+def analysis_key(workspace: Optional[str], filepath: str) -> str:
+    """Dispatcher dedup key of a background analysis (same path in two workspaces = two files)"""
+    return f"analyze_code:{workspace or ''}:{filepath}"
+
+class LLMDispatcher:
+    """
+    Priority-aware gate in front of Gemini calls
+    
+    At most MAX_CONCURRENT_CALLS run at once; waiting calls are released
+    interactive first, then background, then prefetch (FIFO within a class).
+    Queued (never running) work can be preempted: a newer call with the same
+    key supersedes the older one, queued prefetch work is dropped when an
+    interactive call has to wait, and the oldest lowest-priority entries are
+    shed once more than MAX_QUEUED_BACKGROUND non-interactive calls wait.
+    """
+    
+    def __init__(
+        self,
+        max_concurrency: int = MAX_CONCURRENT_CALLS,
+        max_queued_background: int = MAX_QUEUED_BACKGROUND
+    ):
+        """Initialize dispatcher"""
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queued_background = max_queued_background
+        self.running = 0
+        self._queue: List[list] = []  # heap of [rank, seq, future, priority, key]
+        self._by_key: Dict[str, list] = {}
+        self._seq = itertools.count()
+        self.counters = {
+            "dispatched": {p: 0 for p in _PRIORITY_RANK},
+            "superseded": 0,
+            "shed": 0
+        }
+    
+    async def run(self, priority: str, make_call: Callable[[], Awaitable[Any]], key: Optional[str] = None):
+        """
+        Run a call once a slot is available for its priority class
+        
+        Args:
+            priority: PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND or PRIORITY_PREFETCH
+            make_call: Zero-argument factory returning the awaitable to run
+            key: Optional dedup key; a newer queued call with the same key
+                supersedes this one while it is still waiting
+        
+        Raises:
+            DispatchCancelled: If the call was preempted while queued
+        """
+        await self._acquire(priority, key)
+        self.counters["dispatched"][priority] += 1
+        try:
+            return await make_call()
+        finally:
+            self._release()
+    
+    def _purge(self):
+        """Drop finished (cancelled/preempted) entries from the top of the heap"""
+        while self._queue and self._queue[0][2].done():
+            heapq.heappop(self._queue)
+    
+    def _cancel(self, entry: list, reason: str):
+        """Preempt a queued entry"""
+        if not entry[2].done():
+            entry[2].set_exception(DispatchCancelled(reason))
+    
+    async def _acquire(self, priority: str, key: Optional[str]):
+        """Wait until this call may run"""
+        rank = _PRIORITY_RANK[priority]
+        
+        if key is not None and key in self._by_key:
+            self._cancel(self._by_key.pop(key), f"superseded by a newer {priority} call")
+            self.counters["superseded"] += 1
+        
+        self._purge()
+        if self.running < self.max_concurrency and not (self._queue and self._queue[0][0] <= rank):
+            self.running += 1
+            return
+        
+        future = asyncio.get_running_loop().create_future()
+        entry = [rank, next(self._seq), future, priority, key]
+        heapq.heappush(self._queue, entry)
+        if key is not None:
+            self._by_key[key] = entry
+        self._shed(rank)
+        
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Cancelled after being granted a slot - hand it on
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self._release()
+            raise
+        finally:
+            if key is not None and self._by_key.get(key) is entry:
+                del self._by_key[key]
+    
+    def _shed(self, incoming_rank: int):
+        """Preempt queued low-priority work that can no longer be afforded"""
+        waiting = [e for e in self._queue if not e[2].done() and e[0] > 0]
+        
+        if incoming_rank == 0:
+            for entry in waiting:
+                if entry[3] == PRIORITY_PREFETCH:
+                    self._cancel(entry, "prefetch preempted by interactive call")
+                    self.counters["shed"] += 1
+            waiting = [e for e in waiting if not e[2].done()]
+        
+        excess = len(waiting) - self.max_queued_background
+        if excess > 0:
+            # Lowest priority first, oldest first within a class
+            for entry in sorted(waiting, key=lambda e: (-e[0], e[1]))[:excess]:
+                self._cancel(entry, f"{entry[3]} queue full")
+                self.counters["shed"] += 1
+    
+    def _release(self):
+        """Free a slot and wake the highest-priority waiter"""
+        self.running -= 1
+        self._purge()
+        if self._queue and self.running < self.max_concurrency:
+            entry = heapq.heappop(self._queue)
+            self.running += 1
+            entry[2].set_result(None)
+    
+    def get_status(self) -> Dict:
+        """Get running/queued counts per priority class and preemption counters"""
+        queued = {p: 0 for p in _PRIORITY_RANK}
+        for entry in self._queue:
+            if not entry[2].done():
+                queued[entry[3]] += 1
+        return {
+            "running": self.running,
+            "max_concurrency": self.max_concurrency,
+            "queued": queued,
+            **self.counters
+        }
+
 class AIAgent:
     """AI Agent using Gemini for code analysis"""
     
@@ -47,6 +247,8 @@ class AIAgent:
         api_key = os.getenv("GOOGLE_API_KEY")
         self.api_key_available = bool(api_key)
         self.rate_limiter = get_rate_limiter()
+        self.resilience = get_resilient_caller()
+        self.dispatcher = LLMDispatcher()
         
         if self.api_key_available:
             try:
@@ -59,6 +261,13 @@ class AIAgent:
                 self.structured_llm = self.llm.with_structured_output(LearningAnalysis)
                 # Structured output LLM for recommendations
                 self.recommendation_llm = self.llm.with_structured_output(RecommendationList)
+                # Structured output LLMs for quizzes and documentation suggestions.
+                # include_raw keeps the raw response so a schema mismatch can still
+                # be salvaged by the tolerant JSON extractor instead of discarded
+                self.quiz_llm = self.llm.with_structured_output(Quiz, include_raw=True)
+                self.documentation_llm = self.llm.with_structured_output(
+                    DocumentationSuggestionList, include_raw=True
+                )
             except Exception as e:
                 print(f"Warning: Failed to initialize Gemini: {e}")
                 self.api_key_available = False
@@ -68,12 +277,19 @@ class AIAgent:
             self.llm = None
             self.structured_llm = None
             self.recommendation_llm = None
+            self.quiz_llm = None
+            self.documentation_llm = None
     
     async def analyze_code(
         self,
         code_content: str,
         filename: str,
-        filepath: str
+        filepath: str,
+        on_delta: Optional[DeltaCallback] = None,
+        focus_lines: Optional[List[int]] = None,
+        priority: str = PRIORITY_INTERACTIVE,
+        fallback: bool = True,
+        workspace: Optional[str] = None
     ) -> Dict:
         """
         Analyze code and extract learning insights
@@ -82,10 +298,43 @@ class AIAgent:
             code_content: The code to analyze
             filename: Name of the file
             filepath: Full path to the file
+            on_delta: Optional async callback receiving partial analysis dicts
+                while the model is still generating (streaming mode)
+            focus_lines: Optional 1-based line numbers (e.g. changed hunks) to
+                keep when the file has to be trimmed to the prompt budget
+            priority: Dispatch class; queued non-interactive analyses of the
+                same file are superseded by newer ones
+            fallback: Return a mock analysis when Gemini can't be used or
+                fails; if False, raise instead (bulk ingest must not record
+                placeholder results)
+            workspace: Workspace/user key the file belongs to; only queued
+                analyses of the same file in the same workspace supersede each other
             
         Returns:
             Dictionary with analysis results
+            
+        Raises:
+            DispatchCancelled: If the queued call was superseded or shed;
+                callers should drop the file rather than record anything
+            UpstreamUnavailable: If fallback is False and there is no API
+                key, the rate limit is reached or upstream refuses calls
+            Exception: If fallback is False and the call fails otherwise
         """
+        # Mock mode fallback
+        if not self.api_key_available or not self.structured_llm:
+            if not fallback:
+                raise UpstreamUnavailable("GOOGLE_API_KEY not configured")
+            return self._mock_analysis(code_content, filename, filepath)
+        
+        # Check rate limit
+        can_request, message = self.rate_limiter.can_make_request(priority)
+        if not can_request:
+            if not fallback:
+                raise UpstreamUnavailable(message)
+            print(f"⚠️  {message}")
+            return self._mock_analysis(code_content, filename, filepath)
+        
+        from langchain_core.messages import HumanMessage, SystemMessage
         system_prompt = SystemMessage(content="""You are an expert programming tutor and learning analyst.
 Analyze the provided code and identify:
 1. What programming topics/concepts are being learned
@@ -109,6 +358,23 @@ For weak areas, identify:
 
 Be encouraging and specific. Focus on the learning journey.""")
         
+        # Keep the prompt within budget - large files are trimmed to their
+        # most informative regions instead of being embedded verbatim
+        excerpt = build_code_excerpt(
+            code_content,
+            ANALYSIS_CODE_BUDGET,
+            focus_lines=focus_lines,
+            purpose="analyze_code"
+        )
+        if excerpt["truncated"]:
+            print(f"✂️  Trimmed {filename} for analysis: ~{excerpt['tokens_before']} -> ~{excerpt['tokens_after']} tokens")
+        
+        # Placeholders stand for whole line ranges, so counting lines in the
+        # excerpt would not give line numbers of the file
+        line_note = ""
+        if excerpt["text"] != code_content:
+            line_note = "\nBracketed markers such as [lines 10-40 omitted] replace parts of the file; give line numbers of the original file, not of this excerpt.\n"
+        
         user_prompt = HumanMessage(content=f"""Analyze this code file:
 
 Filename: {filename}
@@ -116,64 +382,187 @@ Path: {filepath}
 
 Code:
 ```
-{code_content}
+{excerpt["text"]}
 ```
-
+{line_note}
 Provide a structured analysis of what the learner is studying and working on.""")
         
-        # Mock mode fallback
-        if not self.api_key_available or not self.structured_llm:
-            return self._mock_analysis(code_content, filename, filepath)
-        
-        # Check rate limit
-        can_request, message = self.rate_limiter.can_make_request()
-        if not can_request:
-            print(f"⚠️  {message}")
-            return self._mock_analysis(code_content, filename, filepath)
+        # Only the latest queued background analysis of a file is worth running
+        dedup_key = analysis_key(workspace, filepath) if priority != PRIORITY_INTERACTIVE else None
         
         try:
             # Get structured analysis (don't record until success)
-            analysis = self.structured_llm.invoke([system_prompt, user_prompt])
+            if on_delta and STREAMING_ENABLED:
+                attempts = itertools.count(1)
+                analysis = await self._call_llm(
+                    "analyze_code",
+                    priority,
+                    lambda: self._stream_structured(
+                        self.structured_llm, [system_prompt, user_prompt], on_delta, next(attempts)
+                    ),
+                    key=dedup_key
+                )
+            else:
+                analysis = await self._call_llm(
+                    "analyze_code",
+                    priority,
+                    lambda: self.structured_llm.ainvoke([system_prompt, user_prompt]),
+                    key=dedup_key
+                )
             
             # Only record if successful
             self.rate_limiter.record_request()
             
-            # Type guard - ensure analysis is LearningAnalysis
-            if isinstance(analysis, dict):
-                return {
-                    "filename": filename,
-                    "filepath": filepath,
-                    "topics": analysis.get("topics", []),
-                    "difficulty": analysis.get("difficulty", "intermediate"),
-                    "concepts": analysis.get("concepts", []),
-                    "potential_struggles": analysis.get("potential_struggles", []),
-                    "summary": analysis.get("summary", ""),
-                    "errors": analysis.get("errors", []),
-                    "weak_areas": analysis.get("weak_areas", [])
-                }
-            else:
-                # analysis is LearningAnalysis model
-                return {
-                    "filename": filename,
-                    "filepath": filepath,
-                    "topics": list(analysis.topics) if analysis.topics else [],
-                    "difficulty": analysis.difficulty,
-                    "concepts": list(analysis.concepts) if analysis.concepts else [],
-                    "potential_struggles": list(analysis.potential_struggles) if analysis.potential_struggles else [],
-                    "summary": analysis.summary,
-                    "errors": list(analysis.errors) if hasattr(analysis, 'errors') and analysis.errors else [],
-                    "weak_areas": list(analysis.weak_areas) if hasattr(analysis, 'weak_areas') and analysis.weak_areas else []
-                }
+            return self._analysis_to_dict(analysis, filename, filepath)
+        except DispatchCancelled:
+            raise  # superseded or shed while queued: there is no result to fall back to
         except Exception as e:
-            # Check if it's a quota/quota error
-            error_str = str(e).lower()
-            if "quota" in error_str or "resourceexhausted" in error_str or "429" in error_str:
-                print(f"⚠️  API quota exceeded - using mock analysis")
+            # Quota exhausted or circuit open - upstream is refusing calls
+            if self._upstream_refused(e):
+                if not fallback:
+                    raise UpstreamUnavailable(str(e)) from e
+                print(f"⚠️  Gemini unavailable ({e}) - using mock analysis")
                 return self._mock_analysis(code_content, filename, filepath)
+            if not fallback:
+                raise
             # Fallback to mock analysis for other errors
             print(f"Error analyzing code: {e}")
             return self._mock_analysis(code_content, filename, filepath)
     
+    async def _call_llm(
+        self,
+        name: str,
+        priority: str,
+        make_call: Callable[[], Awaitable[Any]],
+        key: Optional[str] = None
+    ):
+        """Run an upstream call through the priority dispatcher and resilience wrapper"""
+        return await self.dispatcher.run(
+            priority,
+            lambda: self.resilience.call(name, make_call),
+            key=key
+        )
+    
+    def _upstream_refused(self, error: Exception) -> bool:
+        """True if upstream did not serve the call: quota spent or circuit open"""
+        return isinstance(error, CircuitOpenError) or classify_error(error) == QUOTA
+    
+    def _analysis_to_dict(self, analysis, filename: str, filepath: str) -> Dict:
+        """Convert a LearningAnalysis model (or dict) into the analysis message format"""
+        # Type guard - ensure analysis is LearningAnalysis
+        if isinstance(analysis, dict):
+            return {
+                "filename": filename,
+                "filepath": filepath,
+                "topics": analysis.get("topics", []),
+                "difficulty": analysis.get("difficulty", "intermediate"),
+                "concepts": analysis.get("concepts", []),
+                "potential_struggles": analysis.get("potential_struggles", []),
+                "summary": analysis.get("summary", ""),
+                "errors": analysis.get("errors", []),
+                "weak_areas": analysis.get("weak_areas", [])
+            }
+        
+        # analysis is LearningAnalysis model
+        return {
+            "filename": filename,
+            "filepath": filepath,
+            "topics": list(analysis.topics) if analysis.topics else [],
+            "difficulty": analysis.difficulty,
+            "concepts": list(analysis.concepts) if analysis.concepts else [],
+            "potential_struggles": list(analysis.potential_struggles) if analysis.potential_struggles else [],
+            "summary": analysis.summary,
+            "errors": list(analysis.errors) if hasattr(analysis, 'errors') and analysis.errors else [],
+            "weak_areas": list(analysis.weak_areas) if hasattr(analysis, 'weak_areas') and analysis.weak_areas else []
+        }
+    
+    async def _stream_structured(self, runnable, messages: List, on_delta: DeltaCallback, attempt: int = 1):
+        """
+        Stream a structured-output call, forwarding each partial result
+        
+        Args:
+            runnable: Structured output LLM (e.g. self.structured_llm)
+            messages: Prompt messages
+            on_delta: Async callback receiving each new partial result as a dict
+            attempt: Which try of the call this is (passed on with every delta)
+            
+        Returns:
+            The final (complete) structured result
+        """
+        final = None
+        last_sent = None
+        async for chunk in runnable.astream(messages):
+            if chunk is None:
+                continue
+            final = chunk
+            partial = chunk if isinstance(chunk, dict) else chunk.model_dump()
+            # Partial parsers may repeat the same snapshot for several tokens
+            if partial != last_sent:
+                last_sent = partial
+                await on_delta(partial, attempt)
+        
+        if final is None:
+            raise ValueError("Streaming response ended without any output")
+        return final
+    
+    async def _stream_text(self, messages: List, on_delta: DeltaCallback, attempt: int = 1) -> str:
+        """
+        Stream a plain-text call, forwarding each text chunk as it arrives
+        
+        Chunks are passed with the attempt number: a retry starts the text over.
+        
+        Returns:
+            The complete response text
+        """
+        parts = []
+        async for chunk in self.llm.astream(messages):
+            text = self._content_to_text(chunk.content)
+            if text:
+                parts.append(text)
+                await on_delta(text, attempt)
+        return "".join(parts)
+    
+    def _structured_payload(self, result) -> Optional[Dict]:
+        """
+        Get a plain dict from an include_raw structured output result
+        
+        Uses the schema-validated object when available; otherwise salvages the
+        raw response (tool call arguments, then JSON embedded in the text) so a
+        paid-for response is not thrown away over a schema mismatch.
+        """
+        parsed = result.get("parsed") if isinstance(result, dict) else result
+        if parsed is not None:
+            return parsed if isinstance(parsed, dict) else parsed.model_dump()
+        
+        raw = result.get("raw")
+        if raw is None:
+            return None
+        for tool_call in getattr(raw, "tool_calls", None) or []:
+            if isinstance(tool_call.get("args"), dict) and tool_call["args"]:
+                return tool_call["args"]
+        
+        payload = extract_json(self._content_to_text(raw.content))
+        return payload if isinstance(payload, dict) else None
+    
+    def _raw_text(self, result) -> str:
+        """Get the raw response text from an include_raw structured output result"""
+        raw = result.get("raw") if isinstance(result, dict) else None
+        return self._content_to_text(raw.content) if raw is not None else ""
+    
+    def _content_to_text(self, content) -> str:
+        """Flatten message content (string or list of blocks) into plain text"""
+        if isinstance(content, str):
+            return content
+        
+        text = ""
+        if isinstance(content, list):
+            for block in content:
+                if isinstance(block, str):
+                    text += block
+                elif isinstance(block, dict) and "text" in block:
+                    text += str(block.get("text", ""))
+        return text
+    
     def _mock_analysis(self, code_content: str, filename: str, filepath: str) -> Dict:
         """Provide mock analysis when API is not available"""
         # Extract file extension for basic topic detection
@@ -205,14 +594,17 @@ Provide a structured analysis of what the learner is studying and working on."""
             "potential_struggles": [],
             "summary": f"Working on {filename} - {len(code_content)} characters of code",
             "errors": [],
-            "weak_areas": []
+            "weak_areas": [],
+            # Placeholder, not a model result - must not mark the content as analyzed
+            "mock": True
         }
     
     async def generate_recommendations(
         self,
         topics: List[str],
         struggles: List[str],
-        recent_code_summary: str
+        recent_code_summary: str,
+        priority: str = PRIORITY_INTERACTIVE
     ) -> List[Dict]:
         """
         Generate learning recommendations based on analysis
@@ -221,9 +613,13 @@ Provide a structured analysis of what the learner is studying and working on."""
             topics: List of topics being learned
             struggles: Areas where learner might struggle
             recent_code_summary: Summary of recent work
+            priority: Dispatch class (interactive/background/prefetch)
             
         Returns:
             List of recommendation dictionaries
+            
+        Raises:
+            DispatchCancelled: If the queued call was superseded or shed
         """
         system_prompt = SystemMessage(content="""You are an expert learning advisor who helps developers learn effectively.
 
@@ -260,14 +656,18 @@ For each recommendation provide:
             return self._mock_recommendations(topics)
         
         # Check rate limit
-        can_request, message = self.rate_limiter.can_make_request()
+        can_request, message = self.rate_limiter.can_make_request(priority)
         if not can_request:
             print(f"⚠️  {message}")
             return self._mock_recommendations(topics)
         
         try:
             # Get structured recommendations
-            result = await self.recommendation_llm.ainvoke([system_prompt, user_prompt])
+            result = await self._call_llm(
+                "generate_recommendations",
+                priority,
+                lambda: self.recommendation_llm.ainvoke([system_prompt, user_prompt])
+            )
             
             # Only record if successful
             self.rate_limiter.record_request()
@@ -296,11 +696,12 @@ For each recommendation provide:
             
             return recommendations[:6]  # Return max 6
             
+        except DispatchCancelled:
+            raise
         except Exception as e:
-            # Check if it's a quota/quota error
-            error_str = str(e).lower()
-            if "quota" in error_str or "resourceexhausted" in error_str or "429" in error_str:
-                print(f"⚠️  API quota exceeded - using mock recommendations")
+            # Quota exhausted or circuit open - upstream is refusing calls
+            if self._upstream_refused(e):
+                print(f"⚠️  Gemini unavailable ({e}) - using mock recommendations")
                 return self._mock_recommendations(topics)
             print(f"Error generating recommendations: {e}")
             return self._mock_recommendations(topics)
@@ -308,7 +709,9 @@ For each recommendation provide:
     async def generate_summary(
         self,
         sessions: List[Dict],
-        period: str = "weekly"
+        period: str = "weekly",
+        on_delta: Optional[DeltaCallback] = None,
+        priority: str = PRIORITY_INTERACTIVE
     ) -> Dict:
         """
         Generate learning summary for a time period
@@ -316,9 +719,15 @@ For each recommendation provide:
         Args:
             sessions: List of learning sessions
             period: Time period (daily/weekly/monthly)
+            on_delta: Optional async callback receiving summary text chunks
+                as they are generated (streaming mode)
+            priority: Dispatch class (interactive/background/prefetch)
             
         Returns:
             Summary dictionary
+            
+        Raises:
+            DispatchCancelled: If the queued call was superseded or shed
         """
         if not sessions:
             return {
@@ -363,7 +772,7 @@ Keep it concise but meaningful (3-4 sentences)."""
             }
         
         # Check rate limit
-        can_request, message = self.rate_limiter.can_make_request()
+        can_request, message = self.rate_limiter.can_make_request(priority)
         if not can_request:
             print(f"⚠️  {message}")
             return {
@@ -375,22 +784,37 @@ Keep it concise but meaningful (3-4 sentences)."""
         
         try:
             from langchain_core.messages import HumanMessage
-            response = await self.llm.ainvoke([HumanMessage(content=prompt)])
+            messages = [HumanMessage(content=prompt)]
+            if on_delta and STREAMING_ENABLED:
+                attempts = itertools.count(1)
+                summary_text = await self._call_llm(
+                    "generate_summary",
+                    priority,
+                    lambda: self._stream_text(messages, on_delta, next(attempts))
+                )
+            else:
+                response = await self._call_llm(
+                    "generate_summary",
+                    priority,
+                    lambda: self.llm.ainvoke(messages)
+                )
+                summary_text = response.content
             
             # Only record if successful
             self.rate_limiter.record_request()
             
             return {
-                "summary": response.content,
+                "summary": summary_text,
                 "topics_learned": unique_topics[:10],  # Top 10
                 "struggling_topics": unique_struggles[:5],  # Top 5
                 "total_sessions": len(sessions)
             }
+        except DispatchCancelled:
+            raise
         except Exception as e:
-            # Check if it's a quota/quota error
-            error_str = str(e).lower()
-            if "quota" in error_str or "resourceexhausted" in error_str or "429" in error_str:
-                print(f"⚠️  API quota exceeded - using fallback summary")
+            # Quota exhausted or circuit open - upstream is refusing calls
+            if self._upstream_refused(e):
+                print(f"⚠️  Gemini unavailable ({e}) - using fallback summary")
                 return {
                     "summary": f"Completed {len(sessions)} learning sessions covering {', '.join(unique_topics[:3])}.",
                     "topics_learned": unique_topics,
@@ -508,7 +932,8 @@ Keep it concise but meaningful (3-4 sentences)."""
         self,
         topics: List[str],
         content_summary: str,
-        num_questions: int = 5
+        num_questions: int = 5,
+        priority: str = PRIORITY_INTERACTIVE
     ) -> Dict:
         """
         Generate quiz questions based on topics and content
@@ -517,9 +942,13 @@ Keep it concise but meaningful (3-4 sentences)."""
             topics: List of topics to quiz on
             content_summary: Summary of the content
             num_questions: Number of questions to generate
+            priority: Dispatch class (interactive/background/prefetch)
             
         Returns:
             Dictionary with quiz questions
+            
+        Raises:
+            DispatchCancelled: If the queued call was superseded or shed
         """
         if not topics:
             return {
@@ -556,65 +985,46 @@ Format as JSON with this structure:
 }}"""
         
         # Mock mode fallback
-        if not self.api_key_available or not self.llm:
+        if not self.api_key_available or not self.quiz_llm:
             return self._mock_quiz(topics, num_questions)
         
         # Check rate limit
-        can_request, message = self.rate_limiter.can_make_request()
+        can_request, message = self.rate_limiter.can_make_request(priority)
         if not can_request:
             print(f"⚠️  {message}")
             return self._mock_quiz(topics, num_questions)
         
         try:
             from langchain_core.messages import HumanMessage
-            response = await self.llm.ainvoke([HumanMessage(content=prompt)])
+            result = await self._call_llm(
+                "generate_quiz",
+                priority,
+                lambda: self.quiz_llm.ainvoke([HumanMessage(content=prompt)])
+            )
             
             # Only record if successful
             self.rate_limiter.record_request()
             
-            # Parse response
-            content = ""
-            if isinstance(response.content, str):
-                content = response.content
-            elif isinstance(response.content, list):
-                for block in response.content:
-                    if isinstance(block, str):
-                        content += block
-                    elif isinstance(block, dict) and "text" in block:
-                        content += str(block.get("text", ""))
-            
-            # Try to parse JSON from response
-            import json
-            import re
-            
-            # Extract JSON from markdown code blocks if present
-            json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', content, re.DOTALL)
-            if json_match:
-                content = json_match.group(1)
-            else:
-                # Try to find JSON object in content
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    content = json_match.group(0)
-            
-            try:
-                quiz_data = json.loads(content)
+            quiz_data = self._structured_payload(result)
+            if quiz_data and quiz_data.get("questions"):
+                quiz_data["questions"] = quiz_data["questions"][:num_questions]
                 return quiz_data
-            except json.JSONDecodeError:
-                # Fallback: parse manually
-                return self._parse_quiz_response(content, topics, num_questions)
+            
+            # Not JSON at all - parse the raw text line by line
+            return self._parse_quiz_response(self._raw_text(result), topics, num_questions)
                 
+        except DispatchCancelled:
+            raise
         except Exception as e:
-            # Check if it's a quota/quota error
-            error_str = str(e).lower()
-            if "quota" in error_str or "resourceexhausted" in error_str or "429" in error_str:
-                print(f"⚠️  API quota exceeded - using mock quiz")
+            # Quota exhausted or circuit open - upstream is refusing calls
+            if self._upstream_refused(e):
+                print(f"⚠️  Gemini unavailable ({e}) - using mock quiz")
                 return self._mock_quiz(topics, num_questions)
             print(f"Error generating quiz: {e}")
             return self._mock_quiz(topics, num_questions)
     
     def _parse_quiz_response(self, content: str, topics: List[str], num_questions: int) -> Dict:
-        """Parse quiz response when JSON parsing fails"""
+        """Parse quiz response from free text when no JSON could be recovered"""
         questions = []
         lines = content.split('\n')
         current_question = {}
@@ -680,7 +1090,8 @@ Format as JSON with this structure:
         errors: List[Dict],
         weak_areas: List[str],
         topics: List[str],
-        code_content: str
+        code_content: str,
+        priority: str = PRIORITY_INTERACTIVE
     ) -> List[Dict]:
         """
         Generate documentation suggestions based on errors and weak areas
@@ -690,13 +1101,29 @@ Format as JSON with this structure:
             weak_areas: Areas where learner needs improvement
             topics: Topics being learned
             code_content: The code content
+            priority: Dispatch class (interactive/background/prefetch)
             
         Returns:
             List of documentation suggestions with links and descriptions
+            
+        Raises:
+            DispatchCancelled: If the queued call was superseded or shed
         """
         if not errors and not weak_areas:
             return []
         
+        # Only the code around located errors is useful here - never the whole file
+        code_section = ""
+        located = error_lines(errors[:5])
+        if located and code_content:
+            excerpt = build_code_excerpt(
+                code_content,
+                DOCS_CODE_BUDGET,
+                focus_lines=located,
+                purpose="documentation_suggestions"
+            )
+            code_section = f"\nRelevant code:\n```\n{excerpt['text']}\n```\n"
+        
         prompt = f"""Based on the following code analysis, generate specific documentation suggestions:
 
 Errors Found: {len(errors)}
@@ -704,49 +1131,63 @@ Errors Found: {len(errors)}
 
 Weak Areas: {', '.join(weak_areas[:5])}
 Topics: {', '.join(topics[:5])}
-
+{code_section}
 For each error or weak area, provide:
-1. Title of the documentation/resource
-2. URL or resource identifier (MDN, official docs, Stack Overflow, etc.)
-3. Brief description of why this resource helps
-4. Specific section or topic to focus on
-5. Difficulty level (beginner/intermediate/advanced)
+1. title: Title of the documentation/resource
+2. url: URL of the resource (MDN, official docs, Stack Overflow, etc.)
+3. description: Brief description of why this resource helps
+4. focus_area: Specific section or topic to focus on
+5. difficulty: Difficulty level (beginner/intermediate/advanced)
+6. resource_type: documentation, article, tutorial or video
 
-Format as a clear list of 3-5 most relevant documentation resources."""
+Return the 3-5 most relevant documentation resources."""
         
         # Mock mode fallback
-        if not self.api_key_available or not self.llm:
+        if not self.api_key_available or not self.documentation_llm:
             return self._mock_documentation_suggestions(errors, weak_areas, topics)
         
         # Check rate limit
-        can_request, message = self.rate_limiter.can_make_request()
+        can_request, message = self.rate_limiter.can_make_request(priority)
         if not can_request:
             print(f"⚠️  {message}")
             return self._mock_documentation_suggestions(errors, weak_areas, topics)
         
         try:
             from langchain_core.messages import HumanMessage
-            response = await self.llm.ainvoke([HumanMessage(content=prompt)])
+            result = await self._call_llm(
+                "generate_documentation_suggestions",
+                priority,
+                lambda: self.documentation_llm.ainvoke([HumanMessage(content=prompt)])
+            )
             
             # Only record if successful
             self.rate_limiter.record_request()
             
-            content = ""
-            if isinstance(response.content, str):
-                content = response.content
-            elif isinstance(response.content, list):
-                for block in response.content:
-                    if isinstance(block, str):
-                        content += block
-                    elif isinstance(block, dict) and "text" in block:
-                        content += str(block.get("text", ""))
+            payload = self._structured_payload(result)
+            if payload and isinstance(payload.get("suggestions"), list):
+                default_focus = weak_areas[0] if weak_areas else topics[0] if topics else "General"
+                suggestions = []
+                for suggestion in payload["suggestions"]:
+                    if isinstance(suggestion, dict) and suggestion.get("title"):
+                        suggestions.append({
+                            "title": suggestion["title"],
+                            "url": suggestion.get("url", ""),
+                            "description": suggestion.get("description", ""),
+                            "focus_area": suggestion.get("focus_area") or default_focus,
+                            "difficulty": suggestion.get("difficulty", "intermediate"),
+                            "resource_type": suggestion.get("resource_type", "documentation")
+                        })
+                if suggestions:
+                    return suggestions[:5]  # Return max 5
             
-            return self._parse_documentation_suggestions(content, errors, weak_areas, topics)
+            # Not JSON at all - parse the raw text line by line
+            return self._parse_documentation_suggestions(self._raw_text(result), errors, weak_areas, topics)
+        except DispatchCancelled:
+            raise
         except Exception as e:
-            # Check if it's a quota/quota error
-            error_str = str(e).lower()
-            if "quota" in error_str or "resourceexhausted" in error_str or "429" in error_str:
-                print(f"⚠️  API quota exceeded - using mock documentation suggestions")
+            # Quota exhausted or circuit open - upstream is refusing calls
+            if self._upstream_refused(e):
+                print(f"⚠️  Gemini unavailable ({e}) - using mock documentation suggestions")
                 return self._mock_documentation_suggestions(errors, weak_areas, topics)
             print(f"Error generating documentation suggestions: {e}")
             return self._mock_documentation_suggestions(errors, weak_areas, topics)
@@ -758,7 +1199,7 @@ Format as a clear list of 3-5 most relevant documentation resources."""
         weak_areas: List[str],
         topics: List[str]
     ) -> List[Dict]:
-        """Parse documentation suggestions from LLM response"""
+        """Parse documentation suggestions from free-text LLM response (last-resort fallback)"""
         suggestions = []
         lines = content.split('\n')
         current_suggestion = {}
@@ -788,9 +1229,8 @@ Format as a clear list of 3-5 most relevant documentation resources."""
                 }
             
             # Extract URL
-            if 'http' in line.lower() or 'mdn' in line.lower() or 'docs' in line.lower():
-                import re
-                url_match = re.search(r'https?://[^\s]+', line)
+            if current_suggestion and not current_suggestion.get("url"):
+                url_match = _URL_PATTERN.search(line)
                 if url_match:
                     current_suggestion["url"] = url_match.group(0)
             
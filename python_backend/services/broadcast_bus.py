@@ -0,0 +1,234 @@
+"""
+Broadcast Bus - Fan stream events out to every backend worker process
+
+WebSocket connections live in the worker that accepted them, so with
+`uvicorn --workers N` an event published in one worker must be relayed to
+the others before it can reach their clients.
+"""
+import os
+import json
+import uuid
+import asyncio
+from typing import Callable, Dict, Optional, Set
+
+# "memory" (single process, default) or "local" (loopback socket hub shared by workers)
+BUS_BACKEND = os.getenv("BROADCAST_BUS", "memory").lower()
+BUS_HOST = os.getenv("BROADCAST_BUS_HOST", "127.0.0.1")
+BUS_PORT = int(os.getenv("BROADCAST_BUS_PORT", "8765"))
+
+# Largest single event line accepted on the bus (analysis payloads can be large)
+MAX_LINE = int(os.getenv("BROADCAST_BUS_MAX_LINE", str(16 * 1024 * 1024)))
+
+# A peer whose unsent backlog exceeds this is dropped by the hub
+MAX_PEER_BACKLOG = 4 * MAX_LINE
+
+RECONNECT_DELAY = 1.0  # seconds
+
+# deliver(message, workspace, frame, seq) hands an event to this process's connections;
+# seq numbers events in publish order within the bus's stream_id (None = unsequenced)
+Deliver = Callable[[Dict, Optional[str], Optional[str], Optional[int]], None]
+
+
+class InProcessBus:
+    """Deliver events straight to this process's connections (single worker)"""
+
+    name = "memory"
+
+    def __init__(self, deliver: Deliver):
+        self.deliver = deliver
+        self.stream_id = uuid.uuid4().hex[:12]
+        self.published = 0
+
+    async def start(self):
+        """Nothing to set up in-process"""
+
+    async def stop(self):
+        """Nothing to tear down in-process"""
+
+    async def publish(self, message: Dict, workspace: Optional[str] = None, frame: Optional[str] = None):
+        """Deliver an event to local connections"""
+        self.published += 1
+        self.deliver(message, workspace, frame, self.published)
+
+    def get_status(self) -> Dict:
+        """Get bus backend and counters"""
+        return {"backend": self.name, "stream_id": self.stream_id, "published": self.published}
+
+
+class LocalSocketBus:
+    """
+    Relay events between workers through a loopback TCP hub
+
+    Every worker tries to bind the hub address on start; the first one wins
+    and relays each event line to all connected workers (including the
+    publisher, so every worker sees events in the same order). The others
+    just connect to it. If the hub worker exits, the survivors race to take
+    over on reconnect. No external service is needed.
+
+    The hub numbers events as it relays them, so sequence numbers agree
+    across workers. Wire format, one line each: the hub greets a worker with
+    "HELLO <stream_id>" and then sends "<seq> <envelope JSON>" per event.
+    A new hub starts a new stream_id.
+    """
+
+    name = "local"
+
+    def __init__(self, deliver: Deliver, host: str = BUS_HOST, port: int = BUS_PORT):
+        self.deliver = deliver
+        self.host = host
+        self.port = port
+        self.is_hub = False
+        self.stream_id: Optional[str] = None
+        self._hub_stream_id: Optional[str] = None
+        self._hub_seq = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._peers: Set[asyncio.StreamWriter] = set()
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {
+            "published": 0,
+            "received": 0,
+            "delivered_locally": 0,
+            "reconnects": 0,
+            "peers_dropped": 0,
+        }
+
+    async def start(self):
+        """Start the connect/relay loop in the background"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop relaying and release the hub address if this worker holds it"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._server is not None:
+            self._server.close()
+            for peer in list(self._peers):
+                peer.close()
+            self._peers.clear()
+            await self._server.wait_closed()
+            self._server = None
+            self.is_hub = False
+
+    async def _become_hub(self) -> bool:
+        """Try to bind the hub address; False if another worker already holds it"""
+        try:
+            self._server = await asyncio.start_server(
+                self._handle_peer, self.host, self.port, limit=MAX_LINE
+            )
+        except OSError:
+            return False
+        self.is_hub = True
+        self._hub_stream_id = uuid.uuid4().hex[:12]
+        self._hub_seq = 0
+        print(f"📡 Broadcast bus hub listening on {self.host}:{self.port} (pid {os.getpid()})")
+        return True
+
+    async def _handle_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Hub side: number every line from one worker and relay it to all workers"""
+        writer.write(f"HELLO {self._hub_stream_id}\n".encode("ascii"))
+        self._peers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self._hub_seq += 1
+                line = b"%d %s" % (self._hub_seq, line)
+                for peer in list(self._peers):
+                    if peer.transport.get_write_buffer_size() > MAX_PEER_BACKLOG:
+                        # A stuck worker must not make the hub buffer without bound
+                        self._peers.discard(peer)
+                        peer.close()
+                        self.counters["peers_dropped"] += 1
+                        continue
+                    peer.write(line)
+        except (ConnectionError, ValueError, asyncio.CancelledError):
+            pass  # cancelled on shutdown; exiting quietly avoids a noisy stream callback
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+    async def _run(self):
+        """Worker side: stay connected to the hub (becoming it if needed) and deliver events"""
+        while True:
+            if not self.is_hub:
+                await self._become_hub()
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port, limit=MAX_LINE)
+            except OSError:
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+
+            self._writer = writer
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    if line.startswith(b"HELLO "):
+                        self.stream_id = line[6:].strip().decode("ascii")
+                        continue
+                    seq, _, body = line.partition(b" ")
+                    try:
+                        envelope = json.loads(body)
+                        seq = int(seq)
+                    except ValueError:
+                        continue
+                    self.counters["received"] += 1
+                    self.deliver(envelope.get("message") or {}, envelope.get("workspace"), None, seq)
+            except (ConnectionError, ValueError) as e:
+                print(f"⚠️ Broadcast bus connection error: {e}")
+            finally:
+                self._writer = None
+                writer.close()
+
+            self.counters["reconnects"] += 1
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def publish(self, message: Dict, workspace: Optional[str] = None, frame: Optional[str] = None):
+        """
+        Publish an event to every worker
+
+        Args:
+            message: Message dict
+            workspace: Workspace/user key the event belongs to
+            frame: Pre-encoded JSON text of the message, embedded as-is in the bus line
+        """
+        if frame is None:
+            frame = json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=str)
+        if self._writer is None:
+            # Hub unreachable - at least reach this worker's own clients (unsequenced)
+            self.counters["delivered_locally"] += 1
+            self.deliver(message, workspace, frame, None)
+            return
+        line = '{"workspace":%s,"message":%s}\n' % (json.dumps(workspace), frame)
+        self._writer.write(line.encode("utf-8"))
+        self.counters["published"] += 1
+
+    def get_status(self) -> Dict:
+        """Get hub role, peer count and counters"""
+        return {
+            "backend": self.name,
+            "address": f"{self.host}:{self.port}",
+            "is_hub": self.is_hub,
+            "stream_id": self.stream_id,
+            "connected": self._writer is not None,
+            "peers": len(self._peers) if self.is_hub else None,
+            **self.counters
+        }
+
+
+def create_bus(deliver: Deliver):
+    """Create the broadcast bus selected by BROADCAST_BUS"""
+    if BUS_BACKEND == "local":
+        return LocalSocketBus(deliver)
+    if BUS_BACKEND != "memory":
+        print(f"⚠️ Unknown BROADCAST_BUS '{BUS_BACKEND}', using in-process bus")
+    return InProcessBus(deliver)
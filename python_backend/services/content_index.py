@@ -0,0 +1,123 @@
+"""
+Content Index - SHA-256 index of file content that was already analyzed
+Lets watchers ask whether the backend needs a file's body before uploading it,
+and lets the backend skip analysis of content it has seen before
+"""
+import os
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Content digests remembered per workspace (least recently used are evicted)
+CONTENT_INDEX_SIZE = int(os.getenv("CONTENT_INDEX_SIZE", "50000"))
+
+# Files per content_check message / POST /api/ingest/check request
+MAX_CHECK_FILES = int(os.getenv("CONTENT_CHECK_MAX_FILES", "2000"))
+
+
+def content_digest(content: str) -> str:
+    """SHA-256 hex digest of file content (UTF-8), as the watchers compute it"""
+    return hashlib.sha256(content.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+class ContentIndex:
+    """
+    Digests of analyzed content, per workspace
+
+    Keyed by content rather than by path, so a file switched back to an
+    earlier version (branch checkout, git stash pop) or copied/renamed is
+    recognized as already analyzed. The size is stored alongside the
+    digest and must match too.
+    """
+
+    def __init__(self, max_entries: int = CONTENT_INDEX_SIZE):
+        """
+        Initialize index
+
+        Args:
+            max_entries: Digests remembered across all workspaces
+        """
+        self.max_entries = max(1, max_entries)
+        # (workspace, sha256) -> (size, filepath it was last analyzed as)
+        self._entries: "OrderedDict[Tuple[Optional[str], str], Tuple[int, str]]" = OrderedDict()
+        self.counters = {"checked": 0, "known": 0, "recorded": 0}
+
+    def contains(self, workspace: Optional[str], sha256: str, size: Optional[int] = None) -> bool:
+        """
+        Check whether content was analyzed before
+
+        Args:
+            workspace: Workspace/user key
+            sha256: Hex digest of the content
+            size: Content size in bytes (checked when given)
+        """
+        entry = self._entries.get((workspace, sha256))
+        if entry is None or (size is not None and entry[0] != size):
+            return False
+        self._entries.move_to_end((workspace, sha256))
+        return True
+
+    def contains_content(self, workspace: Optional[str], content: str) -> bool:
+        """Check whether this exact content was analyzed before"""
+        encoded = content.encode("utf-8", "surrogatepass")
+        return self.contains(workspace, hashlib.sha256(encoded).hexdigest(), len(encoded))
+
+    def add(self, workspace: Optional[str], content: str, filepath: str = ""):
+        """Record content that was analyzed"""
+        encoded = content.encode("utf-8", "surrogatepass")
+        self.add_digest(workspace, hashlib.sha256(encoded).hexdigest(), len(encoded), filepath)
+
+    def add_digest(self, workspace: Optional[str], sha256: str, size: int, filepath: str = ""):
+        """Record analyzed content by digest"""
+        key = (workspace, sha256)
+        self._entries[key] = (size, filepath)
+        self._entries.move_to_end(key)
+        self.counters["recorded"] += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def check(self, workspace: Optional[str], files: Iterable[Dict]) -> Tuple[List[str], List[str]]:
+        """
+        Answer a content check: which files' bodies are needed
+
+        Args:
+            workspace: Workspace/user key
+            files: Dicts with filepath, sha256 and (optionally) size
+
+        Returns:
+            (needed, known) filepaths; malformed entries count as needed
+        """
+        needed, known = [], []
+        for item in files:
+            if not isinstance(item, dict):
+                continue
+            filepath = str(item.get("filepath") or item.get("filename") or "")
+            sha256 = item.get("sha256")
+            size = item.get("size")
+            self.counters["checked"] += 1
+            if (isinstance(sha256, str) and (size is None or isinstance(size, int))
+                    and self.contains(workspace, sha256.lower(), size)):
+                self.counters["known"] += 1
+                known.append(filepath)
+            else:
+                needed.append(filepath)
+        return needed, known
+
+    def get_status(self) -> Dict:
+        """Get index size and hit counters"""
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            **self.counters
+        }
+
+
+# Lazy singleton
+_content_index_instance = None
+
+def get_content_index() -> ContentIndex:
+    """Get or create the content index"""
+    global _content_index_instance
+    if _content_index_instance is None:
+        _content_index_instance = ContentIndex()
+    return _content_index_instance
@@ -0,0 +1,498 @@
+"""
+Ingest Queue - Bulk file ingestion jobs
+Accepts many files (or an archive of them) in one request, deduplicates
+them and analyzes them in the background
+"""
+import io
+import os
+import json
+import uuid
+import asyncio
+import tarfile
+import zipfile
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from services.ai_agent import get_ai_agent, DispatchCancelled, UpstreamUnavailable, PRIORITY_BACKGROUND
+from services.content_index import content_digest, get_content_index
+from services.vector_store import get_vector_store
+from services.websocket_manager import ws_manager
+
+# Files analyzed at once. Kept at or below LLM_MAX_CONCURRENCY so a bulk import
+# waits here instead of flooding the dispatcher queue (where it would be shed)
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "2"))
+
+# Analyzed files embedded and written to the vector store per batch
+EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH", "16"))
+
+# Request limits
+MAX_BATCH_FILES = int(os.getenv("INGEST_MAX_FILES", "2000"))
+MAX_FILE_BYTES = int(os.getenv("INGEST_MAX_FILE_BYTES", str(1024 * 1024)))
+MAX_ARCHIVE_BYTES = int(os.getenv("INGEST_MAX_ARCHIVE_BYTES", str(64 * 1024 * 1024)))  # uncompressed
+
+# Finished jobs kept for GET /api/ingest/jobs/{job_id}
+MAX_JOBS = 200
+
+# Job snapshots shared by all worker processes, so any worker can answer
+# GET /api/ingest/jobs/{job_id} for a job another one accepted
+JOB_STATE_DIR = Path(__file__).parent.parent / "data" / "ingest_jobs"
+
+# Errors reported per job (the rest are only counted)
+MAX_JOB_ERRORS = 20
+
+# Archive members taken into account (same code/text types the watchers send)
+ARCHIVE_EXTENSIONS = {
+    ".py", ".js", ".jsx", ".ts", ".tsx", ".java", ".cpp", ".c", ".h", ".hpp",
+    ".go", ".rs", ".rb", ".php", ".html", ".css", ".scss", ".sql",
+    ".json", ".yaml", ".yml", ".toml", ".md", ".txt"
+}
+
+# Directories never read from archives
+ARCHIVE_SKIP_DIRS = {".git", "node_modules", "__pycache__", "venv", ".venv", "dist", "build"}
+
+
+def _decode(data: bytes) -> str:
+    """Decode file bytes the way /api/upload does (UTF-8, then latin-1)"""
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return data.decode("latin-1")
+
+
+def _archive_member_wanted(name: str) -> bool:
+    """Whether an archive member is a code/text file outside skipped directories"""
+    parts = [p for p in name.split("/") if p not in ("", ".")]
+    if not parts or any(p in ARCHIVE_SKIP_DIRS for p in parts[:-1]):
+        return False
+    return os.path.splitext(parts[-1])[1].lower() in ARCHIVE_EXTENSIONS
+
+
+def read_archive(data: bytes) -> Tuple[List[Dict], int]:
+    """
+    Read the code files of a zip or tar (optionally compressed) archive in memory
+
+    Nothing is extracted to disk. Members over MAX_FILE_BYTES are skipped and
+    reading stops once MAX_ARCHIVE_BYTES of content was read.
+
+    Args:
+        data: Archive bytes
+
+    Returns:
+        (files, skipped) - file dicts with filename/filepath/content, and the
+        number of code files left out because of the size limits
+
+    Raises:
+        ValueError: If the data is not a zip or tar archive
+    """
+    # (name, size, read(limit) -> bytes) per regular file member
+    members = []
+    buffer = io.BytesIO(data)
+    if zipfile.is_zipfile(buffer):
+        archive = zipfile.ZipFile(buffer)
+        for info in archive.infolist():
+            if not info.is_dir():
+                members.append((info.filename, info.file_size,
+                                lambda limit, info=info: archive.open(info).read(limit)))
+    else:
+        buffer.seek(0)
+        try:
+            archive = tarfile.open(fileobj=buffer, mode="r:*")
+        except tarfile.TarError:
+            raise ValueError("expected a zip or tar archive")
+        for info in archive.getmembers():
+            if info.isfile():
+                members.append((info.name, info.size,
+                                lambda limit, info=info: archive.extractfile(info).read(limit)))
+
+    files = []
+    skipped = 0
+    total = 0
+    for name, size, read in members:
+        name = name.replace("\\", "/").lstrip("/")
+        if not _archive_member_wanted(name):
+            continue
+        if size > MAX_FILE_BYTES or total + size > MAX_ARCHIVE_BYTES:
+            skipped += 1
+            continue
+        # Declared sizes can lie - never read more than the limit
+        raw = read(MAX_FILE_BYTES + 1)
+        if len(raw) > MAX_FILE_BYTES:
+            skipped += 1
+            continue
+        total += len(raw)
+        files.append({
+            "filename": name.rsplit("/", 1)[-1],
+            "filepath": name,
+            "content": _decode(raw)
+        })
+    return files, skipped
+
+
+class IngestJob:
+    """Progress of one bulk submission"""
+
+    def __init__(self, workspace: Optional[str], source: str):
+        self.job_id = uuid.uuid4().hex
+        self.workspace = workspace
+        self.source = source
+        self.status = "queued"
+        self.created_at = datetime.utcnow().isoformat()
+        self.finished_at: Optional[str] = None
+        self.counts = {
+            "received": 0,     # files in the request
+            "accepted": 0,     # queued for analysis
+            "duplicates": 0,   # repeated in the request, or identical content already queued
+            "unchanged": 0,    # content already analyzed earlier
+            "skipped": 0,      # empty, too large or malformed
+            "superseded": 0,   # newer content for the same file arrived before analysis
+            "deferred": 0,     # not analyzed: no API key, daily quota spent or upstream refusing calls
+            "analyzed": 0,
+            "stored": 0,       # written to the vector store
+            "failed": 0
+        }
+        self.errors: List[Dict] = []
+
+    @property
+    def processed(self) -> int:
+        """Accepted files that left the queue"""
+        return (self.counts["analyzed"] + self.counts["superseded"]
+                + self.counts["deferred"] + self.counts["failed"])
+
+    @property
+    def finished(self) -> bool:
+        return self.status == "completed"
+
+    def add_error(self, filepath: str, error: str):
+        """Record a per-file error (only the first few are kept)"""
+        if len(self.errors) < MAX_JOB_ERRORS:
+            self.errors.append({"filepath": filepath, "error": error})
+
+    def to_dict(self) -> Dict:
+        """Job state as returned by the API and the "ingest" broadcast"""
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "source": self.source,
+            "workspace": self.workspace,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "remaining": self.counts["accepted"] - self.processed,
+            **self.counts,
+            "errors": self.errors
+        }
+
+
+class IngestQueue:
+    """
+    Deduplicating work queue for bulk-submitted files
+
+    Files are deduplicated by path and content digest within a request,
+    against files still queued and against content analyzed earlier (the
+    shared content index, which watchers also query before uploading). A
+    fixed number of workers analyze queued files at background priority,
+    and analyzed files are embedded and stored in batches. Progress is
+    broadcast on the "ingest" channel.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = INGEST_CONCURRENCY,
+        embed_batch_size: int = EMBED_BATCH_SIZE
+    ):
+        """
+        Initialize queue (workers start with the first submission)
+
+        Args:
+            concurrency: Files analyzed at once
+            embed_batch_size: Analyzed files stored per vector store write
+        """
+        self.concurrency = max(1, concurrency)
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        # (workspace, filepath) -> digest of the newest queued content
+        self._latest: Dict[Tuple[Optional[str], str], str] = {}
+        # (job, session_id, content, analysis) waiting for the next batched write
+        self._store_buffer: List[Tuple[IngestJob, str, str, Dict]] = []
+        self._store_lock: Optional[asyncio.Lock] = None
+        self.counters = {"jobs": 0, "files_analyzed": 0, "store_batches": 0}
+
+    def _ensure_workers(self):
+        """Start the worker tasks on the running loop"""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._store_lock = asyncio.Lock()
+        self._workers = [w for w in self._workers if not w.done()]
+        while len(self._workers) < self.concurrency:
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    def submit(
+        self,
+        files: Iterable[Dict],
+        workspace: Optional[str] = None,
+        source: str = "api",
+        skipped: int = 0
+    ) -> IngestJob:
+        """
+        Queue a batch of files for analysis
+
+        Args:
+            files: Dicts with filepath (or filename) and content
+            workspace: Workspace/user key the files belong to
+            source: Where the batch came from ("api", "archive", "websocket")
+            skipped: Files already left out by the caller (e.g. oversized archive members)
+
+        Returns:
+            The job tracking the batch
+        """
+        self._ensure_workers()
+        job = IngestJob(workspace, source)
+        self._register(job)
+        job.counts["received"] = job.counts["skipped"] = skipped
+
+        # Within the request: the last entry for a path wins, identical content is analyzed once
+        latest_in_request: "OrderedDict[str, Tuple[str, str, str]]" = OrderedDict()
+        for item in files:
+            job.counts["received"] += 1
+            if not isinstance(item, dict):
+                job.counts["skipped"] += 1
+                continue
+            content = item.get("content")
+            filepath = item.get("filepath") or item.get("filename")
+            if not isinstance(content, str) or not filepath:
+                job.counts["skipped"] += 1
+                job.add_error(str(filepath or ""), "missing filepath or content")
+                continue
+            if not content.strip():
+                job.counts["skipped"] += 1
+                continue
+            if len(content.encode("utf-8")) > MAX_FILE_BYTES:
+                job.counts["skipped"] += 1
+                job.add_error(filepath, f"larger than {MAX_FILE_BYTES} bytes")
+                continue
+            if filepath in latest_in_request:
+                job.counts["duplicates"] += 1
+            filename = item.get("filename") or os.path.basename(filepath)
+            latest_in_request[filepath] = (filename, content, content_digest(content))
+            latest_in_request.move_to_end(filepath)
+
+        content_index = get_content_index()
+        seen_digests = set()
+        for filepath, (filename, content, digest) in latest_in_request.items():
+            key = (workspace, filepath)
+            if digest in seen_digests or self._latest.get(key) == digest:
+                job.counts["duplicates"] += 1
+                continue
+            if content_index.contains(workspace, digest) and key not in self._latest:
+                job.counts["unchanged"] += 1
+                continue
+            seen_digests.add(digest)
+            # A newer version replaces any queued one (checked when it is dequeued)
+            self._latest[key] = digest
+            job.counts["accepted"] += 1
+            self._queue.put_nowait((job, key, filename, content, digest))
+
+        self.counters["jobs"] += 1
+        self._save_snapshot(job)
+        print(
+            f"📥 Ingest job {job.job_id[:8]}: {job.counts['accepted']} of "
+            f"{job.counts['received']} file(s) queued ({self._queue.qsize()} waiting)"
+        )
+        if job.counts["accepted"] == 0:
+            self._complete(job)
+        return job
+
+    def _register(self, job: IngestJob):
+        """Track a job, forgetting the oldest finished ones beyond MAX_JOBS"""
+        self.jobs[job.job_id] = job
+        if len(self.jobs) > MAX_JOBS:
+            for job_id in [j for j, old in self.jobs.items() if old.finished][:len(self.jobs) - MAX_JOBS]:
+                del self.jobs[job_id]
+
+    def get_job(self, job_id: str) -> Optional[IngestJob]:
+        """Look up a job accepted by this worker process by ID"""
+        return self.jobs.get(job_id)
+
+    def _save_snapshot(self, job: IngestJob):
+        """Write a job's state where every worker process can read it"""
+        try:
+            JOB_STATE_DIR.mkdir(parents=True, exist_ok=True)
+            path = JOB_STATE_DIR / f"{job.job_id}.json"
+            temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            temp_path.write_text(json.dumps(job.to_dict()), encoding="utf-8")
+            os.replace(temp_path, path)
+            if job.finished:
+                # Forget the oldest snapshots beyond MAX_JOBS
+                snapshots = sorted(JOB_STATE_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime)
+                for old in snapshots[:-MAX_JOBS]:
+                    old.unlink(missing_ok=True)
+        except OSError as e:
+            print(f"⚠️ Could not save ingest job state: {e}")
+
+    def job_state(self, job_id: str) -> Optional[Dict]:
+        """
+        Current state of a job accepted by any worker process
+
+        Returns:
+            The job dict as returned by the API, or None for unknown IDs
+        """
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if not job_id.isalnum():
+            return None  # not a job ID - never build a path from it
+        try:
+            return json.loads((JOB_STATE_DIR / f"{job_id}.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def job_states(self) -> List[Dict]:
+        """Recent jobs of all worker processes, newest first"""
+        states = {job_id: job.to_dict() for job_id, job in self.jobs.items()}
+        try:
+            snapshots = sorted(JOB_STATE_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        except OSError:
+            snapshots = []
+        for path in snapshots[-MAX_JOBS:]:
+            if path.stem not in states:
+                try:
+                    states[path.stem] = json.loads(path.read_text(encoding="utf-8"))
+                except (OSError, ValueError):
+                    continue
+        return sorted(states.values(), key=lambda state: state.get("created_at") or "", reverse=True)
+
+    async def _worker(self):
+        """Analyze queued files one at a time"""
+        while True:
+            job, key, filename, content, digest = await self._queue.get()
+            try:
+                await self._process(job, key, filename, content, digest)
+            except Exception as e:
+                print(f"⚠️ Ingest worker error: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _process(
+        self,
+        job: IngestJob,
+        key: Tuple[Optional[str], str],
+        filename: str,
+        content: str,
+        digest: str
+    ):
+        """Analyze one queued file and buffer it for storage"""
+        workspace, filepath = key
+        if self._latest.get(key) != digest:
+            job.counts["superseded"] += 1
+        else:
+            job.status = "running"
+            try:
+                analysis = await get_ai_agent().analyze_code(
+                    code_content=content,
+                    filename=filename,
+                    filepath=filepath,
+                    priority=PRIORITY_BACKGROUND,
+                    fallback=False,
+                    workspace=workspace
+                )
+            except DispatchCancelled:
+                # A newer upload of the same file took its place in the LLM queue
+                job.counts["superseded"] += 1
+            except UpstreamUnavailable as e:
+                # Not recorded or indexed, so submitting the file again later analyzes it
+                job.counts["deferred"] += 1
+                job.add_error(filepath, f"deferred: {e}")
+            except Exception as e:
+                job.counts["failed"] += 1
+                job.add_error(filepath, str(e))
+            else:
+                session_id = str(uuid.uuid4())
+                job.counts["analyzed"] += 1
+                self.counters["files_analyzed"] += 1
+                get_content_index().add(workspace, content, filepath)
+                self._store_buffer.append((job, session_id, content, analysis))
+                await ws_manager.broadcast({
+                    "type": "analysis",
+                    "session_id": session_id,
+                    "job_id": job.job_id,
+                    "analysis": analysis,
+                    "timestamp": datetime.utcnow().isoformat()
+                }, workspace=workspace)
+            finally:
+                if self._latest.get(key) == digest:
+                    del self._latest[key]
+
+        job_done = job.processed == job.counts["accepted"]
+        if job_done or len(self._store_buffer) >= self.embed_batch_size or self._queue.empty():
+            await self._flush()
+        if job_done:
+            self._complete(job)
+
+    async def _flush(self):
+        """Embed and store buffered analyses in one batch, then report progress"""
+        async with self._store_lock:
+            batch, self._store_buffer = self._store_buffer, []
+            if not batch:
+                return
+            try:
+                stored = await get_vector_store().store_sessions(
+                    [(session_id, content, analysis) for _, session_id, content, analysis in batch]
+                )
+            except Exception as e:
+                print(f"⚠️ Error storing ingest batch: {e}")
+                for job, session_id, _, analysis in batch:
+                    job.add_error(analysis.get("filepath", ""), f"storage failed: {e}")
+            else:
+                if stored:
+                    self.counters["store_batches"] += 1
+                    for job, _, _, _ in batch:
+                        job.counts["stored"] += 1
+            for job in {job for job, _, _, _ in batch}:
+                if not job.finished:
+                    await self._broadcast_progress(job)
+
+    def _complete(self, job: IngestJob):
+        """Mark a job finished and announce it"""
+        job.status = "completed"
+        job.finished_at = datetime.utcnow().isoformat()
+        print(
+            f"✅ Ingest job {job.job_id[:8]} completed: {job.counts['analyzed']} analyzed, "
+            f"{job.counts['duplicates'] + job.counts['unchanged']} deduplicated, "
+            f"{job.counts['deferred']} deferred, {job.counts['failed']} failed"
+        )
+        asyncio.create_task(self._broadcast_progress(job))
+
+    async def _broadcast_progress(self, job: IngestJob):
+        """Send a job's state on the "ingest" channel (and share it with the other workers)"""
+        self._save_snapshot(job)
+        await ws_manager.broadcast({
+            "type": "ingest",
+            **job.to_dict(),
+            "timestamp": datetime.utcnow().isoformat()
+        }, workspace=job.workspace)
+
+    def get_status(self) -> Dict:
+        """Get queue depth, worker count and counters"""
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "workers": len([w for w in self._workers if not w.done()]),
+            "concurrency": self.concurrency,
+            "embed_batch_size": self.embed_batch_size,
+            "known_contents": get_content_index().get_status()["entries"],
+            "active_jobs": sum(1 for job in self.jobs.values() if not job.finished),
+            **self.counters
+        }
+
+
+# Lazy singleton
+_ingest_queue_instance = None
+
+def get_ingest_queue() -> IngestQueue:
+    """Get or create the ingest queue"""
+    global _ingest_queue_instance
+    if _ingest_queue_instance is None:
+        _ingest_queue_instance = IngestQueue()
+    return _ingest_queue_instance
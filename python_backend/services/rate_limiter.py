@@ -1,17 +1,31 @@
 """
 Rate Limiter Service - Tracks and limits API calls to stay within quota
+
+The daily count lives in data/rate_limit.json and is re-read under a file
+lock on every check, so several worker processes share one quota.
 """
 import os
 import json
+from contextlib import contextmanager
 from datetime import datetime, date
 from pathlib import Path
 from typing import Tuple
 
+try:
+    import fcntl  # POSIX only; without it the count is shared but not locked
+except ImportError:
+    fcntl = None
+
 # Daily limit for Gemini API free tier
 DAILY_LIMIT = 45  # Keep it under 50 to be safe
 
+# Calls held back for interactive requests (upload, summary, quiz clicks);
+# background and prefetch work stops once only this many calls remain
+INTERACTIVE_RESERVE = int(os.getenv("INTERACTIVE_RESERVED_CALLS", "10"))
+
 # File to store rate limit data
 RATE_LIMIT_FILE = Path(__file__).parent.parent / "data" / "rate_limit.json"
+RATE_LIMIT_LOCK = RATE_LIMIT_FILE.with_suffix(".lock")
 
 class RateLimiter:
     """Rate limiter for API calls"""
@@ -20,7 +34,21 @@ class RateLimiter:
         """Initialize rate limiter"""
         self.data_dir = RATE_LIMIT_FILE.parent
         self.data_dir.mkdir(parents=True, exist_ok=True)
-        self._load_data()
+        with self._shared():
+            pass
+    
+    @contextmanager
+    def _shared(self):
+        """Hold the lock on the count file, with the count other workers saved loaded"""
+        with open(RATE_LIMIT_LOCK, 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._load_data()
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
     
     def _load_data(self):
         """Load rate limit data from file"""
@@ -51,54 +79,73 @@ class RateLimiter:
     def _save_data(self):
         """Save rate limit data to file"""
         try:
-            with open(RATE_LIMIT_FILE, 'w') as f:
+            # Replace atomically so a worker never reads a half-written file
+            temp_file = RATE_LIMIT_FILE.with_name(f"{RATE_LIMIT_FILE.name}.{os.getpid()}.tmp")
+            with open(temp_file, 'w') as f:
                 json.dump({
                     "last_date": self.last_date,
                     "count": self.count
                 }, f)
+            os.replace(temp_file, RATE_LIMIT_FILE)
         except Exception as e:
             print(f"Error saving rate limit data: {e}")
     
-    def can_make_request(self) -> Tuple[bool, str]:
+    def can_make_request(self, priority: str = "interactive") -> Tuple[bool, str]:
         """
         Check if we can make an API request
         
+        Args:
+            priority: "interactive", "background" or "prefetch"; non-interactive
+                calls may not use the reserved interactive share
+        
         Returns:
             Tuple of (can_request: bool, message: str)
         """
+        with self._shared():
+            return self._check(priority)
+    
+    def _check(self, priority: str) -> Tuple[bool, str]:
+        """can_make_request with the current count loaded"""
         if self.count >= DAILY_LIMIT:
-            remaining = 0
-            reset_time = "midnight"
             return False, f"Daily API limit reached ({DAILY_LIMIT}/{DAILY_LIMIT}). Limit resets at midnight. Using mock responses."
         
         remaining = DAILY_LIMIT - self.count
+        if priority != "interactive" and remaining <= INTERACTIVE_RESERVE:
+            return False, f"Only {remaining} API calls left today - reserved for interactive requests. Using mock responses for {priority} work."
+        
         return True, f"API calls remaining today: {remaining}/{DAILY_LIMIT}"
     
     def record_request(self):
         """Record that an API request was made"""
-        self.count += 1
-        self._save_data()
+        with self._shared():
+            self.count += 1
+            self._save_data()
         remaining = DAILY_LIMIT - self.count
         if remaining <= 5:
             print(f"⚠️  Warning: Only {remaining} API calls remaining today!")
     
     def undo_request(self):
         """Undo a recorded request (e.g., if it failed due to quota)"""
-        if self.count > 0:
-            self.count -= 1
-            self._save_data()
+        with self._shared():
+            if self.count > 0:
+                self.count -= 1
+                self._save_data()
     
     def reset(self):
         """Manually reset the rate limit counter (for testing or new API key)"""
-        self._reset()
+        with self._shared():
+            self._reset()
         print(f"✅ Rate limit reset - {DAILY_LIMIT} API calls available")
     
     def get_status(self) -> dict:
         """Get current rate limit status"""
+        with self._shared():
+            pass
         return {
             "count": self.count,
             "limit": DAILY_LIMIT,
             "remaining": max(0, DAILY_LIMIT - self.count),
+            "interactive_reserve": INTERACTIVE_RESERVE,
             "last_date": self.last_date,
             "can_request": self.count < DAILY_LIMIT
         }
@@ -0,0 +1,239 @@
+"""
+Resilience Service - Retry, deadlines and circuit breaking for Gemini calls
+"""
+import os
+import time
+import random
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Retry configuration for transient upstream errors (503s, timeouts, ...)
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))  # seconds
+BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))  # seconds
+
+# Overall deadline for one logical call, including all retries
+CALL_DEADLINE = float(os.getenv("LLM_CALL_DEADLINE", "45"))  # seconds
+
+# Circuit breaker: open after this many consecutive upstream failures,
+# then short-circuit for the cooldown before letting one trial call through
+BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "60"))  # seconds
+
+# Error classes
+TRANSIENT = "transient"
+QUOTA = "quota"
+PERMANENT = "permanent"
+
+_TRANSIENT_STATUS = {408, 500, 502, 503, 504}
+_TRANSIENT_NAMES = {
+    "ServiceUnavailable", "InternalServerError", "DeadlineExceeded",
+    "GatewayTimeout", "BadGateway", "Aborted", "TimeoutError",
+    "ConnectionError", "ConnectTimeout", "ReadTimeout", "RemoteDisconnected",
+}
+_QUOTA_NAMES = {"ResourceExhausted", "TooManyRequests", "RateLimitError"}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit breaker is open"""
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    Classify an exception raised by an upstream LLM call
+
+    Exception types and status codes are checked first; the message is only
+    inspected as a last resort for wrapped errors that carry neither.
+
+    Returns:
+        One of TRANSIENT, QUOTA or PERMANENT
+    """
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return TRANSIENT
+
+    # Walk the exception and whatever it wraps (LangChain re-raises SDK errors)
+    seen = set()
+    current: Optional[BaseException] = error
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        names = {cls.__name__ for cls in type(current).__mro__}
+        if names & _QUOTA_NAMES:
+            return QUOTA
+        if names & _TRANSIENT_NAMES:
+            return TRANSIENT
+
+        status = getattr(current, "code", None) or getattr(current, "status_code", None)
+        if isinstance(status, int):
+            if status == 429:
+                return QUOTA
+            if status in _TRANSIENT_STATUS:
+                return TRANSIENT
+        current = current.__cause__ or current.__context__
+
+    error_str = str(error).lower()
+    if "quota" in error_str or "resourceexhausted" in error_str or "429" in error_str:
+        return QUOTA
+    if "503" in error_str or "unavailable" in error_str or "timed out" in error_str:
+        return TRANSIENT
+    return PERMANENT
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker (closed -> open -> half-open)"""
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        """Return True if a call may go upstream right now"""
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._trial_in_flight:
+            # Only one trial call at a time while probing for recovery
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        """Close the circuit after a successful call"""
+        self.state = "closed"
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self, trip_now: bool = False) -> bool:
+        """
+        Record an upstream failure
+
+        Returns:
+            True if this failure tripped the breaker open
+        """
+        self.failures += 1
+        was_open = self.state == "open"
+        self._trial_in_flight = False
+        if trip_now or self.state == "half_open" or self.failures >= self.threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            return not was_open
+        return False
+
+    def release(self):
+        """Release a half-open trial slot without counting success or failure"""
+        self._trial_in_flight = False
+
+
+class ResilientCaller:
+    """Wrap upstream calls with jittered backoff, deadlines and a circuit breaker"""
+
+    def __init__(self):
+        """Initialize breaker and counters"""
+        self.breaker = CircuitBreaker()
+        self.counters: Dict[str, int] = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "timeouts": 0,
+            "trips": 0,
+            "short_circuits": 0,
+        }
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff delay for the given retry attempt"""
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+    async def call(
+        self,
+        name: str,
+        make_call: Callable[[], Awaitable[T]],
+        deadline: float = CALL_DEADLINE,
+        max_retries: int = MAX_RETRIES
+    ) -> T:
+        """
+        Run an upstream call with retries, a deadline and circuit breaking
+
+        Args:
+            name: Operation name used in log messages
+            make_call: Zero-argument factory returning a fresh awaitable per attempt
+            deadline: Total time budget in seconds across all attempts
+            max_retries: Maximum retries after the first attempt (transient errors only)
+
+        Returns:
+            The result of the call
+
+        Raises:
+            CircuitOpenError: If the breaker is open and the call was not attempted
+            Exception: The last upstream error once retries or the deadline are exhausted
+        """
+        self.counters["calls"] += 1
+        if not self.breaker.allow():
+            self.counters["short_circuits"] += 1
+            raise CircuitOpenError(f"{name}: upstream circuit open, skipping call")
+
+        give_up_at = time.monotonic() + deadline
+        attempt = 0
+        while True:
+            remaining = give_up_at - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                result = await asyncio.wait_for(make_call(), timeout=remaining)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.counters["timeouts"] += 1
+                kind = classify_error(e)
+
+                if kind == PERMANENT:
+                    # Bad request / parse problem - not an upstream health signal
+                    self.breaker.release()
+                    self.counters["failures"] += 1
+                    raise
+
+                delay = self._backoff(attempt)
+                out_of_budget = time.monotonic() + delay >= give_up_at
+                if kind == QUOTA or attempt >= max_retries or out_of_budget:
+                    self.counters["failures"] += 1
+                    # Quota errors will keep failing; stop sending calls for a while
+                    if self.breaker.record_failure(trip_now=(kind == QUOTA)):
+                        self.counters["trips"] += 1
+                        print(f"⚠️  Circuit opened for Gemini calls after {name} failure: {e}")
+                    raise
+
+                attempt += 1
+                self.counters["retries"] += 1
+                print(f"⚠️  {name} transient error ({e}), retry {attempt}/{max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            self.counters["successes"] += 1
+            return result
+
+    def get_status(self) -> dict:
+        """Get breaker state and call counters"""
+        return {
+            "circuit_state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            **self.counters
+        }
+
+# Singleton instance
+_resilient_caller_instance = None
+
+def get_resilient_caller():
+    """Get resilient caller singleton"""
+    global _resilient_caller_instance
+    if _resilient_caller_instance is None:
+        _resilient_caller_instance = ResilientCaller()
+    return _resilient_caller_instance
@@ -3,7 +3,8 @@ Vector Store Service - ChromaDB Integration
 Handles storage and retrieval of code embeddings
 """
 import os
-from typing import List, Dict, Optional
+import asyncio
+from typing import List, Dict, Optional, Tuple
 import chromadb
 from chromadb.config import Settings
 from datetime import datetime
@@ -97,6 +98,49 @@ class VectorStore:
             ids=[session_id]
         )
     
+    async def store_sessions(self, sessions: List[Tuple[str, str, Dict]]) -> int:
+        """
+        Store several learning sessions with one embedding call and one write
+        
+        Args:
+            sessions: (session_id, code_content, analysis) tuples
+            
+        Returns:
+            Number of sessions stored (0 when embeddings are not available)
+        """
+        if not sessions:
+            return 0
+        if not self.api_key_available or not self.embedding_function:
+            print(f"⚠️  Skipping vector storage of {len(sessions)} session(s) - embeddings not available")
+            return 0
+        
+        # One batched embedding request instead of one round-trip per file,
+        # off the event loop so a bulk import doesn't stall WebSocket traffic
+        embeddings = await asyncio.to_thread(
+            self.embedding_function.embed_documents,
+            [code_content for _, code_content, _ in sessions]
+        )
+        
+        timestamp = datetime.utcnow().isoformat()
+        await asyncio.to_thread(
+            self.sessions_collection.add,
+            embeddings=embeddings,
+            documents=[code_content[:1000] for _, code_content, _ in sessions],
+            metadatas=[
+                {
+                    "filename": analysis.get("filename", ""),
+                    "filepath": analysis.get("filepath", ""),
+                    "topics": ",".join(analysis.get("topics", [])),
+                    "difficulty": analysis.get("difficulty", "intermediate"),
+                    "summary": analysis.get("summary", ""),
+                    "timestamp": timestamp
+                }
+                for _, _, analysis in sessions
+            ],
+            ids=[session_id for session_id, _, _ in sessions]
+        )
+        return len(sessions)
+    
     async def store_recommendation(
         self,
         rec_id: str,
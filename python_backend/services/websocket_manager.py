@@ -2,65 +2,521 @@
 WebSocket Manager
 Handles real-time connections from local file watcher
 """
-from typing import Dict, Set
+import os
+import asyncio
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
 from fastapi import WebSocket
 import json
 
+from services.broadcast_bus import create_bus
+from utils.frame_codec import ENCODING_NAME
+
+# orjson is optional - several times faster than json for large analysis/quiz payloads
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Outbound frames buffered per connection before the drop policy kicks in
+MAX_QUEUE_SIZE = int(os.getenv("WS_MAX_QUEUE_SIZE", "100"))
+
+# A single send taking longer than this marks the client as dead
+SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))  # seconds
+
+# Batching (opt-in per client): frames queued within this window are sent
+# together as one JSON array frame
+BATCH_WINDOW = float(os.getenv("WS_BATCH_WINDOW_MS", "25")) / 1000  # seconds
+BATCH_MAX = int(os.getenv("WS_BATCH_MAX", "50"))
+
+# Recent broadcasts kept for clients that reconnect with resume_from
+REPLAY_BUFFER_SIZE = int(os.getenv("WS_REPLAY_BUFFER", "500"))
+
+# Frame types that may be dropped first when a client falls behind (a
+# final frame follows them); the final structured messages are only dropped
+# as a last resort, and the client is then told to resync
+DROPPABLE_TYPES = {"received", "analysis_delta", "summary_delta"}
+
+# Broadcast message types clients can subscribe to
+CHANNELS = [
+    "analysis", "analysis_delta", "summary_delta",
+    "documentation", "recommendations", "quiz", "error", "ingest"
+]
+
+# Channels only delivered to explicit subscribers: connections that never
+# subscribed (legacy watchers) would otherwise get every REST-triggered stream
+SUBSCRIBER_ONLY_CHANNELS = {"summary_delta"}
+
+_DISCONNECT_KEYWORDS = [
+    "closed", "disconnect", "connection closed",
+    "websocket is closed", "cannot call send"
+]
+
+
+def encode_message(message: Dict) -> str:
+    """
+    Encode a message to a JSON text frame
+
+    Output matches what WebSocket.send_json would send, so clients see no
+    difference; it is just produced once per message instead of once per
+    connection.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(message).decode("utf-8")
+        except TypeError:
+            pass  # non-JSON-native value (e.g. a model) - let json stringify it
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def stamp_seq(frame: str, seq: int) -> str:
+    """Add a "seq" field to an encoded JSON object frame without re-encoding it"""
+    if frame == "{}":
+        return '{"seq":%d}' % seq
+    return '{"seq":%d,%s' % (seq, frame[1:])
+
+
+def coalesce_key(message: Dict) -> Optional[str]:
+    """
+    Key under which a queued message is replaced by a newer one
+
+    Only the latest analysis per file, the latest partial analysis per
+    session and the latest progress per ingest job matter to a client that
+    has fallen behind.
+    """
+    msg_type = message.get("type")
+    if msg_type == "analysis":
+        analysis = message.get("analysis") or {}
+        filepath = analysis.get("filepath") or analysis.get("filename")
+        return f"analysis:{filepath}" if filepath else None
+    if msg_type == "analysis_delta":
+        return f"analysis_delta:{message.get('session_id')}"
+    if msg_type == "ingest":
+        return f"ingest:{message.get('job_id')}"
+    return None
+
+
+class ClientQueue:
+    """Bounded outbound queue for one connection, drained by its own sender task"""
+
+    def __init__(self, websocket: WebSocket, maxsize: int = MAX_QUEUE_SIZE):
+        self.websocket = websocket
+        self.maxsize = maxsize
+        # (coalesce key, type, seq, frame); sequenced frames are kept in seq order
+        self.frames: Deque[Tuple[Optional[str], Optional[str], Optional[int], str]] = deque()
+        self.last_seq: Optional[int] = None  # highest seq handed to the sender
+        self.gap_seq: Optional[int] = None  # highest final event dropped since the last resync
+        self.ready = asyncio.Event()
+        self.sender: Optional[asyncio.Task] = None
+        self.closed = False
+        self.batching = False
+        self.sent = 0
+        self.batches = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def put(self, message: Dict, frame: Optional[str] = None, seq: Optional[int] = None):
+        """
+        Queue a message without blocking, coalescing or dropping if the client is behind
+
+        A coalesced message replaces the queued one at the tail, not in its
+        place: clients discard any seq at or below the last one they saw, so
+        a newer seq must never be sent ahead of an older one.
+
+        Args:
+            message: Message dict (used for coalescing/drop decisions)
+            frame: Pre-encoded JSON text of the message, shared across connections
+            seq: Sequence number stamped into the frame (None for control frames)
+        """
+        if frame is None:
+            frame = encode_message(message)
+        key = coalesce_key(message)
+        msg_type = message.get("type")
+        if key is not None:
+            for i, (queued_key, _, _, _) in enumerate(self.frames):
+                if queued_key == key:
+                    del self.frames[i]
+                    self.coalesced += 1
+                    break
+
+        if len(self.frames) >= self.maxsize:
+            self._drop_one()
+        self.frames.append((key, msg_type, seq, frame))
+        self.ready.set()
+
+    def take(self, count: int) -> List[str]:
+        """
+        Pop up to count frames to send, in strictly increasing seq
+
+        A sequenced frame at or below the last seq sent would be discarded by
+        the client as already seen, so it is dropped (and logged) here.
+        """
+        frames = []
+        while self.frames and len(frames) < count:
+            _, _, seq, frame = self.frames.popleft()
+            if seq is not None:
+                if self.last_seq is not None and seq <= self.last_seq:
+                    print(f"⚠️ Dropping out-of-order frame seq {seq} (seq {self.last_seq} already sent)")
+                    self.dropped += 1
+                    continue
+                self.last_seq = seq
+            frames.append(frame)
+        return frames
+
+    def discard_after(self, seq: int):
+        """Remove queued frames numbered after seq (they are about to be replayed in order)"""
+        self.frames = deque(entry for entry in self.frames if entry[2] is None or entry[2] <= seq)
+
+    def _drop_one(self):
+        """
+        Drop the oldest droppable frame, or the oldest frame if none is droppable
+
+        Dropping a sequenced final frame leaves a gap the client cannot see
+        (later seqs still arrive in order), so it is recorded in gap_seq and
+        the sender precedes the next frames with a "resync".
+        """
+        for i, (_, msg_type, _, _) in enumerate(self.frames):
+            if msg_type in DROPPABLE_TYPES:
+                del self.frames[i]
+                break
+        else:
+            _, _, seq, _ = self.frames.popleft()
+            if seq is not None:
+                self.gap_seq = max(seq, self.gap_seq or 0)
+        self.dropped += 1
+
+
 class WebSocketManager:
     """Manage WebSocket connections for real-time streaming"""
-    
+
     def __init__(self):
         """Initialize connection manager"""
         self.active_connections: Set[WebSocket] = set()
-    
+        self.queues: Dict[WebSocket, ClientQueue] = {}
+        # channel -> workspace (None = all workspaces) -> subscribed sockets
+        self.channels: Dict[str, Dict[Optional[str], Set[WebSocket]]] = {c: {} for c in CHANNELS}
+        self.subscriptions: Dict[WebSocket, Tuple[List[str], Optional[str]]] = {}
+        # Sockets that never subscribed keep receiving every broadcast (legacy clients)
+        self.unsubscribed: Set[WebSocket] = set()
+        # Totals carried over from connections that have gone away
+        self._closed_totals = {"sent": 0, "batches": 0, "dropped": 0, "coalesced": 0}
+        # Relays broadcasts to the connections held by every worker process
+        self.bus = create_bus(self._deliver)
+        # Ring buffer of (seq, channel, workspace, message, frame) for resuming clients
+        self.replay_buffer: Deque[Tuple[int, Optional[str], Optional[str], Dict, str]] = deque(
+            maxlen=REPLAY_BUFFER_SIZE
+        )
+        self._replay_stream: Optional[str] = None
+        # Events numbered at or below the floor are no longer (or never were) buffered here
+        self._replay_floor: Optional[int] = None
+        self.last_seq: Optional[int] = None
+
+    async def start_bus(self):
+        """Start the broadcast bus (call once the event loop is running)"""
+        await self.bus.start()
+
+    async def stop_bus(self):
+        """Stop the broadcast bus"""
+        await self.bus.stop()
+
     async def connect(self, websocket: WebSocket):
         """Accept new WebSocket connection"""
         await websocket.accept()
         self.active_connections.add(websocket)
+        self.unsubscribed.add(websocket)
+        queue = ClientQueue(websocket)
+        queue.sender = asyncio.create_task(self._sender(queue))
+        self.queues[websocket] = queue
         print(f"WebSocket connected. Total connections: {len(self.active_connections)}")
-    
+
     def disconnect(self, websocket: WebSocket):
         """Remove WebSocket connection"""
         self.active_connections.discard(websocket)
+        self.unsubscribe(websocket)
+        self.unsubscribed.discard(websocket)
+        queue = self.queues.pop(websocket, None)
+        if queue is not None:
+            self._closed_totals["sent"] += queue.sent
+            self._closed_totals["batches"] += queue.batches
+            self._closed_totals["dropped"] += queue.dropped
+            self._closed_totals["coalesced"] += queue.coalesced
+            # The flag (not just cancel()) guarantees the sender exits: wait_for
+            # can swallow a cancellation that races with a completed send
+            queue.closed = True
+            queue.ready.set()
+            if queue.sender is not None and queue.sender is not asyncio.current_task():
+                queue.sender.cancel()
         print(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
-    
-    async def send_message(self, websocket: WebSocket, message: Dict):
-        """Send message to specific connection"""
-        try:
-            await websocket.send_json(message)
-        except Exception as e:
-            error_str = str(e).lower()
-            # Check if connection is closed/disconnected
-            if any(keyword in error_str for keyword in [
-                "closed", "disconnect", "connection closed", 
-                "websocket is closed", "cannot call send"
-            ]):
-                print(f"⚠️ Connection closed, removing from active connections")
-                self.disconnect(websocket)
+
+    async def _sender(self, queue: ClientQueue):
+        """Drain one connection's queue so a slow client never blocks the others"""
+        websocket = queue.websocket
+        while not queue.closed:
+            await queue.ready.wait()
+            if queue.closed:
+                return
+            if not queue.frames:
+                queue.ready.clear()
+                continue
+            if queue.batching and BATCH_WINDOW > 0:
+                # Let a burst accumulate, then send it as one array frame
+                await asyncio.sleep(BATCH_WINDOW)
+                if queue.closed:
+                    return
+                frames = queue.take(BATCH_MAX)
             else:
-                print(f"⚠️ Error sending message to client: {e}")
-    
-    async def broadcast(self, message: Dict):
-        """Broadcast message to all connections"""
-        disconnected = set()
-        for connection in list(self.active_connections):  # Create a copy to iterate
+                frames = queue.take(1)
+            if queue.gap_seq is not None:
+                # Final events were dropped for this client: it must refetch state
+                # before applying the newer ones
+                frames.insert(0, encode_message({
+                    "type": "resync",
+                    "reason": "frames_dropped",
+                    "stream_id": self.bus.stream_id,
+                    "last_seq": queue.gap_seq
+                }))
+                queue.gap_seq = None
+            if not frames:
+                continue
+            count = len(frames)
+            # Only clients that opted into batching get array frames (a lone frame is still an object)
+            payloads = ["[" + ",".join(frames) + "]"] if queue.batching and count > 1 else frames
             try:
-                await connection.send_json(message)
+                for payload in payloads:
+                    await asyncio.wait_for(websocket.send_text(payload), timeout=SEND_TIMEOUT)
+                queue.sent += count
+                queue.batches += len(payloads)
+            except asyncio.TimeoutError:
+                print(f"⚠️ Client too slow (send exceeded {SEND_TIMEOUT}s), dropping connection")
+                self.disconnect(websocket)
+                try:
+                    await websocket.close()
+                except Exception:
+                    pass
+                return
             except Exception as e:
                 error_str = str(e).lower()
-                # Only mark as disconnected if it's a connection error
-                if any(keyword in error_str for keyword in [
-                    "closed", "disconnect", "connection closed",
-                    "websocket is closed", "cannot call send"
-                ]):
-                    disconnected.add(connection)
-                else:
-                    # Other errors - log but don't disconnect
-                    print(f"⚠️ Error broadcasting to client: {e}")
-        
-        # Clean up disconnected clients
-        for conn in disconnected:
-            self.disconnect(conn)
+                # Check if connection is closed/disconnected
+                if any(keyword in error_str for keyword in _DISCONNECT_KEYWORDS):
+                    print(f"⚠️ Connection closed, removing from active connections")
+                    self.disconnect(websocket)
+                    return
+                print(f"⚠️ Error sending message to client: {e}")
+
+    def subscribe(
+        self,
+        websocket: WebSocket,
+        channels: Optional[Iterable[str]] = None,
+        workspace: Optional[str] = None
+    ) -> List[str]:
+        """
+        Subscribe a connection to broadcast channels, replacing earlier subscriptions
+
+        Args:
+            websocket: Connection to subscribe
+            channels: Message types to receive (default: all CHANNELS)
+            workspace: Only receive events for this workspace/user key
+                (None = events from every workspace)
+
+        Returns:
+            The channels actually subscribed (unknown names are ignored)
+        """
+        self.unsubscribe(websocket)
+        self.unsubscribed.discard(websocket)
+        wanted = [c for c in (channels if channels is not None else CHANNELS) if c in self.channels]
+        for channel in wanted:
+            self.channels[channel].setdefault(workspace, set()).add(websocket)
+        self.subscriptions[websocket] = (wanted, workspace)
+        return wanted
+
+    def set_batching(self, websocket: WebSocket, enabled: bool):
+        """Enable or disable array-frame batching for a connection"""
+        queue = self.queues.get(websocket)
+        if queue is not None:
+            queue.batching = enabled
+
+    def capabilities(self, websocket: WebSocket) -> Dict:
+        """Protocol features advertised to a client in the connected handshake"""
+        extensions = websocket.headers.get("sec-websocket-extensions", "").lower()
+        return {
+            "subscribe": CHANNELS,
+            # Uploads may be sent as JSON text or as binary frames (utils/frame_codec.py)
+            "encodings": ["json", ENCODING_NAME],
+            "batching": {"window_ms": int(BATCH_WINDOW * 1000), "max_frames": BATCH_MAX},
+            # ASGI does not expose the extensions the server negotiated, only the client's offer
+            # (uvicorn accepts permessage-deflate when run with ws_per_message_deflate)
+            "compression_offered": "permessage-deflate" if "permessage-deflate" in extensions else None
+        }
+
+    def unsubscribe(self, websocket: WebSocket):
+        """Remove a connection from every channel it subscribed to"""
+        channels, workspace = self.subscriptions.pop(websocket, ([], None))
+        for channel in channels:
+            sockets = self.channels[channel].get(workspace)
+            if sockets is not None:
+                sockets.discard(websocket)
+                if not sockets:
+                    del self.channels[channel][workspace]
+
+    def workspace_of(self, websocket: WebSocket) -> Optional[str]:
+        """Workspace key a connection subscribed with, if any"""
+        return self.subscriptions.get(websocket, ([], None))[1]
+
+    def _recipients(self, channel: Optional[str], workspace: Optional[str]) -> Set[WebSocket]:
+        """Connections interested in an event on a channel for a workspace"""
+        targets = set() if channel in SUBSCRIBER_ONLY_CHANNELS else set(self.unsubscribed)
+        by_workspace = self.channels.get(channel, {})
+        if workspace is None:
+            # Workspace-less events (e.g. summaries) reach every subscriber of the channel
+            for sockets in by_workspace.values():
+                targets |= sockets
+        else:
+            targets |= by_workspace.get(workspace, set())
+            targets |= by_workspace.get(None, set())
+        return targets
+
+    async def send_message(self, websocket: WebSocket, message: Dict):
+        """Send message to specific connection"""
+        queue = self.queues.get(websocket)
+        if queue is not None:
+            queue.put(message)
+
+    async def broadcast(self, message: Dict, workspace: Optional[str] = None):
+        """
+        Broadcast message to the connections subscribed to its type
+
+        Returns immediately; the event goes through the broadcast bus so
+        connections held by other worker processes receive it too, and each
+        connection's sender task delivers it concurrently, so one slow client
+        cannot stall the rest.
+
+        Args:
+            message: Message dict; its "type" is the channel
+            workspace: Workspace/user key the event belongs to (None = global)
+        """
+        await self.bus.publish(message, workspace, encode_message(message))
+
+    def _deliver(
+        self,
+        message: Dict,
+        workspace: Optional[str] = None,
+        frame: Optional[str] = None,
+        seq: Optional[int] = None
+    ):
+        """Queue a bus event for this process's subscribed connections, encoding it at most once"""
+        if frame is None:
+            frame = encode_message(message)
+        if seq is not None:
+            frame = stamp_seq(frame, seq)
+            self._remember(seq, message, workspace, frame)
+        targets = self._recipients(message.get("type"), workspace)
+        for websocket in targets:
+            queue = self.queues.get(websocket)
+            if queue is not None:
+                queue.put(message, frame, seq)
+
+    def _remember(self, seq: int, message: Dict, workspace: Optional[str], frame: str):
+        """Append a sequenced event to the replay buffer"""
+        if self._replay_stream != self.bus.stream_id:
+            # New stream (process start or bus hub change) - old numbering is meaningless
+            self._replay_stream = self.bus.stream_id
+            self.replay_buffer.clear()
+            self._replay_floor = seq - 1
+            for queue in self.queues.values():
+                queue.last_seq = None
+                queue.gap_seq = None
+        if len(self.replay_buffer) == self.replay_buffer.maxlen:
+            self._replay_floor = self.replay_buffer[0][0]
+        self.replay_buffer.append((seq, message.get("type"), workspace, message, frame))
+        self.last_seq = seq
+
+    def _wants(self, websocket: WebSocket, channel: Optional[str], workspace: Optional[str]) -> bool:
+        """Whether a connection's subscription covers an event (same rules as _recipients)"""
+        if websocket in self.unsubscribed:
+            return channel not in SUBSCRIBER_ONLY_CHANNELS
+        channels, subscribed_workspace = self.subscriptions.get(websocket, ([], None))
+        if channel not in channels:
+            return False
+        return workspace is None or subscribed_workspace is None or subscribed_workspace == workspace
+
+    def stream_position(self) -> Dict:
+        """
+        Current stream_id and last sequence number, for the connected handshake
+
+        Named last_seq (not seq) so control frames are never mistaken for events.
+        """
+        return {"stream_id": self.bus.stream_id, "last_seq": self.last_seq}
+
+    def replay(self, websocket: WebSocket, resume_from: int, stream_id: Optional[str]) -> Dict:
+        """
+        Queue the buffered broadcasts a reconnecting client missed
+
+        Only events after resume_from that match the connection's current
+        subscription are replayed, in order and with their original seq.
+
+        Args:
+            websocket: Reconnected connection
+            resume_from: Last seq the client received before the drop
+            stream_id: stream_id the client's seq numbers belong to
+
+        Returns:
+            A "resumed" control message, or "resync" if the missed events are
+            no longer available and the client must refetch state over REST
+        """
+        position = self.stream_position()
+        floor = self._replay_floor if self._replay_stream == self.bus.stream_id else None
+        reason = None
+        if stream_id != self.bus.stream_id:
+            reason = "stream_changed"
+        elif (floor is None and resume_from > 0) or (floor is not None and resume_from < floor):
+            reason = "events_expired"
+        if reason is not None:
+            return {"type": "resync", "reason": reason, **position}
+
+        missed = [
+            (message, frame, seq)
+            for seq, channel, workspace, message, frame in self.replay_buffer
+            if seq > resume_from and self._wants(websocket, channel, workspace)
+        ]
+        queue = self.queues.get(websocket)
+        if queue is None:
+            return {"type": "resumed", "replayed": 0, **position}
+        if queue.last_seq is not None and queue.last_seq > resume_from:
+            # Live events already went out on this connection; replayed older
+            # ones would be dropped as out of order (here and by the client)
+            return {"type": "resync", "reason": "live_events_sent", **position}
+        if len(missed) >= queue.maxsize:
+            # The queue's drop policy would silently lose part of the replay
+            return {"type": "resync", "reason": "too_many_missed", **position}
+        # Live events queued since the connect are part of the replay; requeue
+        # everything after resume_from in order
+        queue.discard_after(resume_from)
+        for message, frame, seq in missed:
+            queue.put(message, frame, seq)
+        return {"type": "resumed", "replayed": len(missed), **position}
+
+    def get_stats(self) -> Dict:
+        """Get connection count, queue depths and sent/dropped/coalesced frame counters"""
+        depths = [len(q.frames) for q in self.queues.values()]
+        return {
+            "connections": len(self.active_connections),
+            "unsubscribed_connections": len(self.unsubscribed),
+            "subscribers": {
+                channel: sum(len(sockets) for sockets in by_workspace.values())
+                for channel, by_workspace in self.channels.items()
+            },
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "max_queue_size": MAX_QUEUE_SIZE,
+            "frames_sent": self._closed_totals["sent"] + sum(q.sent for q in self.queues.values()),
+            "socket_writes": self._closed_totals["batches"] + sum(q.batches for q in self.queues.values()),
+            "batching_connections": sum(1 for q in self.queues.values() if q.batching),
+            "frames_dropped": self._closed_totals["dropped"] + sum(q.dropped for q in self.queues.values()),
+            "frames_coalesced": self._closed_totals["coalesced"] + sum(q.coalesced for q in self.queues.values()),
+            "replay_buffered": len(self.replay_buffer),
+            "replay_floor": self._replay_floor,
+            "bus": self.bus.get_status()
+        }
 
 # Singleton instance
 ws_manager = WebSocketManager()
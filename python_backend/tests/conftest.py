@@ -0,0 +1,9 @@
+"""
+Test setup: make the backend packages (services, utils, routes) importable
+
+Run from python_backend/:  python -m pytest tests
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
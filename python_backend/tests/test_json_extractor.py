@@ -0,0 +1,34 @@
+"""
+extract_json: repairs, stray openers before the JSON, and linear scanning
+"""
+import time
+
+from utils.json_extractor import extract_json
+
+
+def test_fenced_json_with_trailing_commas():
+    assert extract_json('```json\n{"q": [{"a": 1}, {"b": 2},]}\n```') == {"q": [{"a": 1}, {"b": 2}]}
+
+
+def test_truncated_output_is_closed():
+    assert extract_json('{"a": [1, 2') == {"a": [1, 2]}
+    assert extract_json('{"a": 1, "b') == {"a": 1}
+
+
+def test_stray_openers_before_the_json_are_skipped():
+    assert extract_json('Use {name} as the key. Result: {"a": "x}"}') == {"a": "x}"}
+    assert extract_json('if (x) { return; } {"r": 1}') == {"r": 1}
+    assert extract_json('see [1] or ["a", "b"]', '[') == [1]
+
+
+def test_json_after_a_stray_opener_that_never_closes():
+    assert extract_json('use { here: {"a": {"b": [1, 2') == {"a": {"b": [1, 2]}}
+    assert extract_json('x {see: {"a": 1}} y') == {"a": 1}
+
+
+def test_thousands_of_unmatched_openers_parse_in_linear_time():
+    text = "{ " * 20000 + "{x} " * 20000 + '{"answer": 42}'
+    start = time.perf_counter()
+    assert extract_json(text) == {"answer": 42}
+    # Rescanning the rest of the text from every opener took over a minute here
+    assert time.perf_counter() - start < 1.0
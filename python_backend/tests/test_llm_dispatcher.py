@@ -0,0 +1,50 @@
+"""
+LLMDispatcher dedup keys: queued background analyses supersede each other
+only for the same file in the same workspace
+"""
+import asyncio
+
+import pytest
+
+from services.ai_agent import (
+    LLMDispatcher, DispatchCancelled, analysis_key, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+)
+
+
+async def _queue_behind_busy_slot(keys):
+    """Occupy the only slot, queue one background call per key, then free the slot"""
+    dispatcher = LLMDispatcher(max_concurrency=1)
+    release = asyncio.Event()
+
+    async def blocker():
+        await release.wait()
+
+    busy = asyncio.create_task(dispatcher.run(PRIORITY_INTERACTIVE, blocker))
+    await asyncio.sleep(0)
+    queued = []
+    for i, key in enumerate(keys):
+        queued.append(asyncio.create_task(
+            dispatcher.run(PRIORITY_BACKGROUND, lambda i=i: asyncio.sleep(0, result=i), key=key)
+        ))
+        await asyncio.sleep(0)
+    release.set()
+    await busy
+    return await asyncio.gather(*queued, return_exceptions=True)
+
+
+def test_same_path_in_two_workspaces_is_not_superseded():
+    keys = [analysis_key("alice", "src/main.py"), analysis_key("bob", "src/main.py")]
+    assert keys[0] != keys[1]
+    assert asyncio.run(_queue_behind_busy_slot(keys)) == [0, 1]
+
+
+def test_newer_analysis_of_the_same_file_supersedes_the_queued_one():
+    keys = [analysis_key("alice", "src/main.py"), analysis_key("alice", "src/main.py")]
+    first, second = asyncio.run(_queue_behind_busy_slot(keys))
+    assert isinstance(first, DispatchCancelled)
+    assert second == 1
+
+
+@pytest.mark.parametrize("workspace", [None, ""])
+def test_workspaceless_key_differs_from_named_workspaces(workspace):
+    assert analysis_key(workspace, "README.md") != analysis_key("alice", "README.md")
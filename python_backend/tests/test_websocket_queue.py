@@ -0,0 +1,59 @@
+"""
+ClientQueue overflow: deltas are dropped silently, a dropped final frame
+makes the sender tell the client to resync
+"""
+import asyncio
+import json
+
+from services.websocket_manager import WebSocketManager, stamp_seq, encode_message
+
+
+class FakeWebSocket:
+    """Records the text frames sent to it"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+
+async def _send_backlog(messages, maxsize=2):
+    """Queue messages (with seq 1, 2, ...) faster than the client reads, then let the sender drain"""
+    manager = WebSocketManager()
+    websocket = FakeWebSocket()
+    await manager.connect(websocket)
+    queue = manager.queues[websocket]
+    queue.maxsize = maxsize
+    for seq, message in enumerate(messages, start=1):
+        queue.put(message, stamp_seq(encode_message(message), seq), seq)
+    for _ in range(10):
+        await asyncio.sleep(0)
+    manager.disconnect(websocket)
+    return websocket.sent
+
+
+def test_dropped_deltas_need_no_resync():
+    messages = [
+        {"type": "analysis_delta", "session_id": "a", "text": "par"},
+        {"type": "documentation", "filepath": "a.py"},
+        {"type": "quiz", "filepath": "a.py"},
+    ]
+    sent = asyncio.run(_send_backlog(messages))
+    assert [frame["type"] for frame in sent] == ["documentation", "quiz"]
+
+
+def test_dropped_final_frame_forces_resync():
+    messages = [
+        {"type": "documentation", "filepath": "a.py"},
+        {"type": "recommendations", "filepath": "a.py"},
+        {"type": "quiz", "filepath": "a.py"},
+    ]
+    sent = asyncio.run(_send_backlog(messages))
+    assert [frame["type"] for frame in sent] == ["resync", "recommendations", "quiz"]
+    assert sent[0]["reason"] == "frames_dropped"
+    assert sent[0]["last_seq"] == 1
+    assert [frame["seq"] for frame in sent[1:]] == [2, 3]
@@ -0,0 +1,317 @@
+"""
+Code Fingerprint Utilities
+Normalized token streams and winnowing fingerprints for telling "the same
+code" apart from merely the same bytes, without embeddings
+
+Comments, whitespace and literal values are dropped and identifiers are
+canonicalized, so reformatting, re-commenting or renaming variables leaves
+the token stream unchanged. Python is tokenized with the tokenize module;
+the other languages of ai_agent's topic_map (and anything else) use a
+regex tokenizer that knows their comment syntax.
+
+- normalized_digest(): one hash per file for dedup and cache keys, equal
+  for code that differs only in formatting, comments and names
+- fingerprint(): winnowing (Schleimer, Wilkerson & Aiken, 2003) of the
+  token k-grams, a small set of hashes in which any shared run of at least
+  WINDOW + K_GRAM - 1 tokens is guaranteed to show up
+- similarity() / containment(): near-duplicate scores from two fingerprints
+"""
+import io
+import re
+import keyword
+import builtins
+import hashlib
+import tokenize
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Tokens per hashed k-gram, and k-grams per winnowing window
+K_GRAM = 5
+WINDOW = 4
+
+# Placeholder tokens
+IDENTIFIER = "V"
+STRING = "S"
+NUMBER = "N"
+
+# Python names kept as-is: keywords and builtins carry meaning, other names don't
+_PYTHON_KEPT = set(keyword.kwlist) | set(getattr(keyword, "softkwlist", [])) | set(dir(builtins))
+
+# Statement structure survives in Python token streams as these
+_PYTHON_STRUCTURE = {tokenize.NEWLINE: ";", tokenize.INDENT: "{", tokenize.DEDENT: "}"}
+_PYTHON_SKIPPED = {tokenize.COMMENT, tokenize.NL, tokenize.ENCODING, tokenize.ENDMARKER}
+
+# Keywords of the other topic_map languages, kept by the generic tokenizer
+_KEYWORDS = {
+    # C family: JavaScript/TypeScript, Java, C++, Go, Rust
+    "abstract", "as", "async", "await", "break", "case", "catch", "chan", "class", "const",
+    "continue", "default", "defer", "delete", "do", "else", "enum", "export", "extends",
+    "extern", "false", "final", "finally", "fn", "for", "func", "function", "go", "if",
+    "impl", "implements", "import", "in", "instanceof", "interface", "let", "loop", "map",
+    "match", "mod", "mut", "namespace", "new", "nil", "null", "of", "package", "private",
+    "protected", "pub", "public", "range", "return", "select", "self", "static", "struct",
+    "super", "switch", "template", "this", "throw", "throws", "trait", "true", "try",
+    "type", "typeof", "undefined", "use", "var", "virtual", "void", "where", "while", "yield",
+    "bool", "boolean", "char", "double", "float", "int", "long", "short", "string", "unsigned",
+}
+# SQL keywords are matched case-insensitively
+_SQL_KEYWORDS = {
+    "select", "from", "where", "join", "inner", "left", "right", "outer", "full", "on", "group",
+    "by", "order", "having", "limit", "offset", "insert", "into", "values", "update", "set",
+    "delete", "create", "table", "index", "view", "drop", "alter", "add", "primary", "key",
+    "foreign", "references", "not", "null", "and", "or", "in", "is", "like", "between",
+    "exists", "distinct", "as", "union", "all", "case", "when", "then", "else", "end",
+    "count", "sum", "avg", "min", "max", "asc", "desc", "with", "default", "unique",
+}
+
+# Comment syntax per extension for the generic tokenizer (C style for the rest)
+_C_COMMENTS = (r"//[^\n]*", r"/\*[\s\S]*?\*/")
+_COMMENTS = {
+    "py": (r"#[^\n]*",),
+    "rb": (r"#[^\n]*",),
+    "yaml": (r"#[^\n]*",),
+    "yml": (r"#[^\n]*",),
+    "toml": (r"#[^\n]*",),
+    "sql": (r"--[^\n]*", r"/\*[\s\S]*?\*/"),
+    "css": (r"/\*[\s\S]*?\*/",),
+    "scss": _C_COMMENTS,
+    "html": (r"<!--[\s\S]*?-->",),
+}
+
+_STRINGS = (
+    r'"""[\s\S]*?"""', r"'''[\s\S]*?'''",  # Python triple-quoted (on the fallback path)
+    r'"(?:[^"\\\n]|\\.)*"', r"'(?:[^'\\\n]|\\.)*'", r"`(?:[^`\\]|\\.)*`",
+)
+_NUMBER = r"\d[\w.]*"
+_WORD = r"[A-Za-z_$][\w$]*"
+_OPERATOR = r"===|!==|\*\*=|\.\.\.|>>>|<<=|>>=|[=!<>+\-*/%&|^]=|=>|->|::|&&|\|\||<<|>>|\+\+|--|\*\*|\?\?|\?\.|[^\s\w]"
+
+# Group numbers in every generic pattern: 1 comment, 2 string, 3 number, 4 word, 5 operator
+_generic_patterns: Dict[Tuple[str, ...], "re.Pattern"] = {}
+
+# 61-bit Mersenne prime modulus and base of the rolling k-gram hash
+_MODULUS = (1 << 61) - 1
+_BASE = 1_000_003
+
+# Stable per-token hashes (Python's str hash changes between processes)
+_token_hashes: Dict[str, int] = {}
+
+
+def _extension(filename: str) -> str:
+    return filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+
+
+def _generic_pattern(comments: Tuple[str, ...]) -> "re.Pattern":
+    pattern = _generic_patterns.get(comments)
+    if pattern is None:
+        pattern = re.compile(
+            f"({'|'.join(comments)})|({'|'.join(_STRINGS)})|({_NUMBER})|({_WORD})|({_OPERATOR})"
+        )
+        _generic_patterns[comments] = pattern
+    return pattern
+
+
+def _generic_tokens(code: str, ext: str, keywords: Optional[Set[str]] = None) -> List[str]:
+    """
+    Tokenize any language with a regex, dropping comments and canonicalizing names and literals
+
+    Args:
+        code: Source code
+        ext: File extension (picks the comment syntax)
+        keywords: Names kept as-is (default: the C-family _KEYWORDS, or _SQL_KEYWORDS for .sql)
+    """
+    pattern = _generic_pattern(_COMMENTS.get(ext, _C_COMMENTS))
+    sql = ext == "sql"
+    if keywords is None:
+        keywords = _KEYWORDS
+    tokens = []
+    for match in pattern.finditer(code):
+        kind = match.lastindex
+        if kind == 1:
+            continue
+        if kind == 2:
+            tokens.append(STRING)
+        elif kind == 3:
+            tokens.append(NUMBER)
+        elif kind == 4:
+            word = match.group(4)
+            if sql:
+                word = word.lower()
+                tokens.append(word if word in _SQL_KEYWORDS else IDENTIFIER)
+            else:
+                tokens.append(word if word in keywords else IDENTIFIER)
+        else:
+            tokens.append(match.group(5))
+    return tokens
+
+
+def _python_tokens(code: str) -> List[str]:
+    """
+    Tokenize Python with the tokenize module
+
+    Docstrings and other bare string statements are dropped like comments.
+
+    Raises:
+        tokenize.TokenError, SyntaxError: If the code doesn't tokenize (e.g. mid-edit)
+    """
+    fstring_start = getattr(tokenize, "FSTRING_START", None)  # Python 3.12+
+    fstring_end = getattr(tokenize, "FSTRING_END", None)
+    tokens: List[str] = []
+    bare_string = -1  # index in tokens of a string that started a statement
+    fstring_depth = 0
+    for tok in tokenize.generate_tokens(io.StringIO(code).readline):
+        kind = tok.type
+        if fstring_depth:
+            # Everything inside an f-string is part of one string literal
+            if kind == fstring_start:
+                fstring_depth += 1
+            elif kind == fstring_end:
+                fstring_depth -= 1
+            continue
+        if kind in _PYTHON_SKIPPED:
+            continue
+        if kind == tokenize.STRING or kind == fstring_start:
+            if kind == fstring_start:
+                fstring_depth = 1
+            if tokens and tokens[-1] == STRING:
+                continue  # implicitly concatenated with the previous literal
+            if not tokens or tokens[-1] in (";", "{", "}"):
+                bare_string = len(tokens)
+            tokens.append(STRING)
+            continue
+        if kind == tokenize.NEWLINE and bare_string >= 0 and bare_string == len(tokens) - 1:
+            tokens.pop()  # a docstring or bare string statement
+            bare_string = -1
+            continue
+        bare_string = -1
+        if kind in _PYTHON_STRUCTURE:
+            tokens.append(_PYTHON_STRUCTURE[kind])
+        elif kind == tokenize.NAME:
+            tokens.append(tok.string if tok.string in _PYTHON_KEPT else IDENTIFIER)
+        elif kind == tokenize.NUMBER:
+            tokens.append(NUMBER)
+        else:
+            tokens.append(tok.string)
+    return tokens
+
+
+def normalize_tokens(code: str, filename: str = "") -> List[str]:
+    """
+    Produce the normalized token stream of a file
+
+    Args:
+        code: Source code
+        filename: Name or path; its extension picks the tokenizer
+
+    Returns:
+        Tokens without comments or whitespace; identifiers, strings and
+        numbers replaced by IDENTIFIER, STRING and NUMBER
+    """
+    ext = _extension(filename)
+    if ext == "py":
+        try:
+            return _python_tokens(code)
+        except (tokenize.TokenError, SyntaxError):
+            # Unfinished code - the generic tokenizer still gets close, keeping
+            # the same names _python_tokens would
+            return _generic_tokens(code, ext, _PYTHON_KEPT)
+    return _generic_tokens(code, ext)
+
+
+def normalized_digest(code: str, filename: str = "") -> str:
+    """
+    Hash code modulo formatting, comments and naming
+
+    Suitable as a dedup or cache key: reformatted, re-commented or renamed
+    versions of the same code get the same digest.
+
+    Returns:
+        SHA-256 hex digest of the normalized token stream
+    """
+    return hashlib.sha256(" ".join(normalize_tokens(code, filename)).encode("utf-8")).hexdigest()
+
+
+def _token_hash(token: str) -> int:
+    value = _token_hashes.get(token)
+    if value is None:
+        value = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big") % _MODULUS
+        _token_hashes[token] = value
+    return value
+
+
+def winnow(tokens: List[str], k: int = K_GRAM, window: int = WINDOW) -> List[Tuple[int, int]]:
+    """
+    Select winnowing fingerprints from a token stream
+
+    Every k-gram of tokens is hashed with a rolling hash; from each window of
+    consecutive k-gram hashes the minimum (rightmost on ties) is kept, and
+    recorded once per position.
+
+    Args:
+        tokens: Normalized token stream
+        k: Tokens per k-gram (noise threshold: shorter matches are ignored)
+        window: k-grams per window
+
+    Returns:
+        (hash, token position) pairs in order
+    """
+    if not tokens:
+        return []
+    if len(tokens) < k:
+        k = len(tokens)  # a short file still gets one fingerprint
+    top = pow(_BASE, k - 1, _MODULUS)
+    hashes = []
+    value = 0
+    for i, token in enumerate(tokens):
+        if i >= k:
+            value = (value - _token_hash(tokens[i - k]) * top) % _MODULUS
+        value = (value * _BASE + _token_hash(token)) % _MODULUS
+        if i >= k - 1:
+            hashes.append(value)
+
+    window = max(1, min(window, len(hashes)))
+    selected: List[Tuple[int, int]] = []
+    candidates: deque = deque()  # positions with increasing hashes; the front is the window minimum
+    for i, value in enumerate(hashes):
+        while candidates and hashes[candidates[-1]] >= value:
+            candidates.pop()
+        candidates.append(i)
+        if candidates[0] <= i - window:
+            candidates.popleft()
+        if i >= window - 1:
+            position = candidates[0]
+            if not selected or selected[-1][1] != position:
+                selected.append((hashes[position], position))
+    return selected
+
+
+def fingerprint(code: str, filename: str = "", k: int = K_GRAM, window: int = WINDOW) -> Set[int]:
+    """
+    Winnowing fingerprint of a file
+
+    Args:
+        code: Source code
+        filename: Name or path; its extension picks the tokenizer
+        k: Tokens per k-gram
+        window: k-grams per window
+
+    Returns:
+        Set of selected k-gram hashes (empty for code without tokens)
+    """
+    return {value for value, _ in winnow(normalize_tokens(code, filename), k, window)}
+
+
+def similarity(a: Iterable[int], b: Iterable[int]) -> float:
+    """Jaccard similarity of two fingerprints (1.0 = same code, 0.0 = nothing shared)"""
+    a, b = set(a), set(b)
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def containment(a: Iterable[int], b: Iterable[int]) -> float:
+    """Share of fingerprint a that also occurs in b (how much of a was copied from b)"""
+    a = set(a)
+    if not a:
+        return 0.0
+    return len(a & set(b)) / len(a)
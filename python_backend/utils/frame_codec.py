@@ -0,0 +1,87 @@
+"""
+Binary Frame Codec
+Length-prefixed header + raw body framing for file uploads on /api/ws/stream
+
+Sending source files as JSON text escapes every quote and newline and forces
+a full JSON decode of the content. A binary frame carries the small metadata
+header as JSON and the file content as raw UTF-8 after it:
+
+    magic "PF" (2 bytes) | version (1 byte) | header length (uint32, big-endian)
+    | header JSON (UTF-8) | content (raw UTF-8)
+"""
+import json
+import struct
+from typing import Dict, Union
+
+MAGIC = b"PF"
+VERSION = 1
+
+# Name advertised in the connected frame's capabilities
+ENCODING_NAME = "binary-v1"
+
+_PREFIX = struct.Struct(">2sBI")
+
+
+class FrameError(ValueError):
+    """Raised when a binary frame is malformed"""
+
+
+def is_file_frame(data: Union[bytes, bytearray, memoryview]) -> bool:
+    """Check whether a binary WebSocket message uses this framing"""
+    return len(data) >= _PREFIX.size and bytes(data[:2]) == MAGIC
+
+
+def encode_file_frame(header: Dict, content: str) -> bytes:
+    """
+    Encode file metadata and content into one binary frame
+
+    Args:
+        header: Metadata (filename, filepath, workspace, ...) without the content
+        content: File content
+
+    Returns:
+        Frame bytes
+    """
+    header_bytes = json.dumps(header, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return b"".join((
+        _PREFIX.pack(MAGIC, VERSION, len(header_bytes)),
+        header_bytes,
+        content.encode("utf-8")
+    ))
+
+
+def decode_file_frame(data: Union[bytes, bytearray, memoryview]) -> Dict:
+    """
+    Decode a binary frame into the same dict a JSON upload would produce
+
+    Args:
+        data: Frame bytes
+
+    Returns:
+        Header dict with the content under "content"
+
+    Raises:
+        FrameError: If the frame is truncated, has an unknown version or a bad header
+    """
+    view = memoryview(data)
+    if len(view) < _PREFIX.size:
+        raise FrameError("frame shorter than its prefix")
+    magic, version, header_length = _PREFIX.unpack_from(view)
+    if magic != MAGIC:
+        raise FrameError("not a file frame")
+    if version != VERSION:
+        raise FrameError(f"unsupported frame version {version}")
+
+    body_start = _PREFIX.size + header_length
+    if body_start > len(view):
+        raise FrameError("header length exceeds frame size")
+    try:
+        header = json.loads(bytes(view[_PREFIX.size:body_start]))
+    except ValueError as e:
+        raise FrameError(f"bad frame header: {e}")
+    if not isinstance(header, dict):
+        raise FrameError("frame header must be a JSON object")
+
+    # Decoded straight from the frame buffer - no JSON unescaping of the content
+    header["content"] = str(view[body_start:], "utf-8", "replace")
+    return header
@@ -0,0 +1,201 @@
+"""
+JSON Extraction Utilities
+Recover JSON objects from free-form LLM output in linear time
+"""
+import json
+from typing import Any, List, Optional, Tuple
+
+_OPENERS = {'{': '}', '[': ']'}
+_WHITESPACE = ' \t\r\n'
+
+# Characters a JSON array element can start with
+_VALUE_START = set('"{[]-0123456789tfn')
+
+# Still-open brackets of truncated output retried as the start of the value
+MAX_TRUNCATED_STARTS = 32
+
+
+def _plausible(text: str, i: int) -> bool:
+    """
+    Whether the opener at text[i] can start JSON
+
+    Prose and code samples are full of braces ("use {name}", "{{ var }}",
+    "if (x) {"); an object must continue with a key or "}", an array with a
+    value or "]".
+    """
+    j = i + 1
+    while j < len(text) and text[j] in _WHITESPACE:
+        j += 1
+    if j == len(text):
+        return True  # cut off right after the opener
+    if text[i] == '{':
+        return text[j] in '"}'
+    return text[j] in _VALUE_START
+
+
+def _next_opener(text: str, opener: str, position: int) -> int:
+    """Index of the next plausible opener at or after position (-1 if none)"""
+    i = text.find(opener, position)
+    while i >= 0 and not _plausible(text, i):
+        i = text.find(opener, i + 1)
+    return i
+
+
+def _loads(candidate: str) -> Optional[Any]:
+    try:
+        return json.loads(candidate)
+    except (json.JSONDecodeError, RecursionError):  # RecursionError: absurdly deep nesting
+        return None
+
+
+def extract_json(text: str, opener: str = '{') -> Optional[Any]:
+    """
+    Extract the first parseable JSON value starting with `opener` from LLM output
+
+    Scans the text once, tracking string/escape state and bracket depth, so
+    markdown fences, prose before/after the JSON and braces inside strings
+    are handled without regex backtracking. Common model mistakes are
+    repaired on the way: trailing commas are dropped, and output cut off
+    mid-value has its open string and brackets closed (or is cut back to
+    the last complete element).
+
+    Stray openers before the JSON ("use {name} here") are skipped: if the
+    value from one opener doesn't parse, the values nested in it are tried,
+    and scanning resumes where that attempt stopped, so no part of the text
+    is scanned twice.
+
+    Args:
+        text: Raw model output
+        opener: '{' to extract an object, '[' to extract an array
+
+    Returns:
+        Parsed JSON value, or None if nothing parseable was found
+    """
+    if not text:
+        return None
+
+    start = _next_opener(text, opener, 0)
+    while start >= 0:
+        value, stop = _parse_from(text, start, opener)
+        if value is not None:
+            return value
+        start = _next_opener(text, opener, stop)
+    return None
+
+
+def _parse_from(text: str, start: int, opener: str) -> Tuple[Optional[Any], int]:
+    """
+    Parse (and repair) the JSON value whose opener is at text[start]
+
+    Returns:
+        (value or None, index in text where the scan stopped)
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    # Output index of each open bracket, and whether it is a plausible start
+    # of its own (an `opener` that could begin the wanted value)
+    starts: List[Tuple[int, bool]] = []
+    nested: List[Tuple[int, int]] = []  # output slices of complete plausible inner values
+    in_string = False
+    escaped = False
+    pending_comma = False  # comma seen outside a string, not yet emitted
+    last_boundary = None  # (output length, open brackets) at the last element boundary
+
+    stop = len(text)
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+
+        if ch in _WHITESPACE:
+            out.append(ch)
+            continue
+
+        if ch == ',':
+            if pending_comma:
+                continue  # collapse ",," into one
+            pending_comma = True
+            continue
+
+        if ch in '}]':
+            pending_comma = False  # trailing comma before a closer is dropped
+            if not stack or ch != stack[-1]:
+                stop = i
+                break  # unbalanced closer - stop at what we have
+            stack.pop()
+            out.append(ch)
+            begin, plausible = starts.pop()
+            if not stack:
+                stop = i + 1
+                break
+            if plausible:
+                nested.append((begin, len(out)))
+            continue
+
+        if pending_comma:
+            last_boundary = (len(out), list(stack))
+            out.append(',')
+            pending_comma = False
+
+        if ch in _OPENERS:
+            stack.append(_OPENERS[ch])
+            starts.append((len(out), ch == opener and (i == start or _plausible(text, i))))
+        elif ch == '"':
+            in_string = True
+        out.append(ch)
+
+    if not stack:
+        value = _loads(''.join(out))
+    else:
+        value = _repair(out, stack, in_string, escaped, last_boundary)
+        if value is None:
+            # Truncated after a stray opener: retry from the inner openers still open
+            inner = [depth for depth, (_, plausible) in enumerate(starts) if plausible and depth > 0]
+            for depth in inner[:MAX_TRUNCATED_STARTS]:
+                value = _repair(out[starts[depth][0]:], stack[depth:], in_string, escaped,
+                                _shift(last_boundary, starts[depth][0], depth))
+                if value is not None:
+                    break
+    if value is None:
+        # Complete values nested in the failed one, e.g. the JSON in "{see: {...}}"
+        for begin, end in nested:
+            value = _loads(''.join(out[begin:end]))
+            if value is not None:
+                break
+    return value, stop
+
+
+def _shift(boundary, offset: int, depth: int):
+    """Rebase an element boundary onto the output starting at offset (None if before it)"""
+    if boundary is None:
+        return None
+    length, open_stack = boundary
+    if length <= offset or len(open_stack) <= depth:
+        return None
+    return length - offset, open_stack[depth:]
+
+
+def _repair(out: List[str], stack: List[str], in_string: bool, escaped: bool, last_boundary) -> Optional[Any]:
+    """Close whatever truncated output left open, or cut back to the last complete element"""
+    closed = list(out)
+    if in_string:
+        if escaped:
+            closed.pop()
+        closed.append('"')
+    closed.extend(reversed(stack))
+    value = _loads(''.join(closed))
+    if value is not None:
+        return value
+
+    # Cut mid key/value - fall back to the last complete element
+    if last_boundary is None:
+        return None
+    length, open_stack = last_boundary
+    return _loads(''.join(out[:length]) + ''.join(reversed(open_stack)))
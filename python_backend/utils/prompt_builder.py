@@ -0,0 +1,245 @@
+"""
+Prompt Builder Utilities
+Trims code to a token budget before it is embedded in an LLM prompt
+"""
+import os
+import re
+from typing import Dict, Iterable, List, Optional
+
+# Per-call token budgets for code embedded in prompts
+ANALYSIS_CODE_BUDGET = int(os.getenv("PROMPT_BUDGET_ANALYSIS", "6000"))
+DOCS_CODE_BUDGET = int(os.getenv("PROMPT_BUDGET_DOCS", "800"))
+
+# Rough chars-per-token ratio for Gemini on source code
+CHARS_PER_TOKEN = 4
+
+# Lines of context kept around each focus line (error site / changed line)
+FOCUS_CONTEXT = 3
+
+# Noise thresholds
+LONG_LITERAL_CHARS = 200
+MINIFIED_LINE_CHARS = 500
+LICENSE_SCAN_LINES = 40
+
+_COMMENT_LINE = re.compile(r'^\s*(#|//|/\*|\*|--|<!--|"""|\'\'\')')
+_LICENSE_WORDS = re.compile(r'licen[cs]e|copyright|spdx-license-identifier', re.IGNORECASE)
+# Generated-region markers only count as whole comments ("# BEGIN GENERATED",
+# "<!-- END AUTO-GENERATED -->"), never identifiers like start_generated_job(
+_MARKER_COMMENT = r'^\s*(?:#|//|/\*|<!--)\s*'
+_GENERATED_BEGIN = re.compile(
+    _MARKER_COMMENT + r'(?:(?:begin|start)[ _-]*(?:auto[ _-]*)?generated\b|<auto-generated>)', re.IGNORECASE
+)
+_GENERATED_END = re.compile(
+    _MARKER_COMMENT + r'(?:end[ _-]*(?:auto[ _-]*)?generated\b|</auto-generated>)', re.IGNORECASE
+)
+_LONG_LITERAL = re.compile(
+    r'("(?:[^"\\\n]|\\.){%d,}"|\'(?:[^\'\\\n]|\\.){%d,}\')' % (LONG_LITERAL_CHARS, LONG_LITERAL_CHARS)
+)
+_SIGNATURE = re.compile(
+    r'^\s*(?:@\w|(?:export\s+)?(?:default\s+)?(?:async\s+)?(?:def|class|function|interface|struct|enum|impl|trait|func|fn|type)\b'
+    r'|(?:pub(?:\(crate\))?\s+)(?:fn|struct|enum|trait)\b'
+    r'|(?:public|private|protected|static)\s'
+    r'|import\s|from\s+\S+\s+import\s|#include\s|package\s|use\s'
+    r'|(?:export\s+)?(?:const|let)\s+\w+\s*=\s*(?:async\s*)?\(.*\)\s*=>)'
+)
+_LINE_NUMBER = re.compile(r'\d+')
+
+# Running pre/post token counts per prompt purpose, for tuning budgets
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the token count of a text
+
+    Uses a character heuristic; good enough for budgeting without a tokenizer.
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def error_lines(errors: Iterable[Dict]) -> List[int]:
+    """
+    Extract line numbers from analysis errors
+
+    Args:
+        errors: Error dicts as produced by analyze_code (line/line_number/location)
+
+    Returns:
+        Sorted list of 1-based line numbers
+    """
+    lines = set()
+    for error in errors or []:
+        if not isinstance(error, dict):
+            continue
+        for key in ("line", "line_number", "location"):
+            value = error.get(key)
+            if isinstance(value, int):
+                lines.add(value)
+            elif isinstance(value, str):
+                match = _LINE_NUMBER.search(value)
+                if match:
+                    lines.add(int(match.group(0)))
+    return sorted(n for n in lines if n > 0)
+
+
+def valid_line_numbers(value) -> Optional[List[int]]:
+    """
+    Validate client-supplied line numbers (e.g. the watcher's changed_lines)
+
+    Returns:
+        The list if it holds only positive ints, else None
+    """
+    if not isinstance(value, list):
+        return None
+    if not all(isinstance(n, int) and not isinstance(n, bool) and n > 0 for n in value):
+        return None
+    return value
+
+
+def _strip_noise(lines: List[str]) -> List[Optional[str]]:
+    """
+    Replace noisy lines with short placeholders or drop them (None)
+
+    The result has one entry per input line. Placeholders name the original
+    line range they stand for (like the "[lines a-b omitted]" markers of the
+    budget path), so line numbers in the model's answer can still be read
+    against the source file.
+    """
+    result: List[Optional[str]] = list(lines)
+
+    # License header: leading comment block mentioning a license/copyright
+    header_end = 0
+    while header_end < min(len(lines), LICENSE_SCAN_LINES):
+        line = lines[header_end]
+        if line.strip() and not _COMMENT_LINE.match(line):
+            break
+        header_end += 1
+    if header_end and any(_LICENSE_WORDS.search(line) for line in lines[:header_end]):
+        result[0] = f"[license header, lines 1-{header_end} omitted]"
+        for i in range(1, header_end):
+            result[i] = None
+
+    generated_start = None  # index of the BEGIN marker of an open generated region
+    for i, line in enumerate(lines):
+        if result[i] is None:
+            continue
+
+        # Generated regions between BEGIN/END GENERATED style markers
+        if generated_start is not None:
+            result[i] = None
+            if _GENERATED_END.match(line):
+                result[generated_start] = f"[generated code, lines {generated_start + 1}-{i + 1} omitted]"
+                generated_start = None
+            continue
+        if _GENERATED_BEGIN.match(line):
+            generated_start = i
+            continue
+
+        # Minified lines: very long with almost no whitespace
+        if len(line) > MINIFIED_LINE_CHARS and line.count(' ') < len(line) // 20:
+            result[i] = f"[minified line {i + 1}, {len(line)} chars omitted]"
+            continue
+
+        if len(line) > LONG_LITERAL_CHARS:
+            result[i] = _LONG_LITERAL.sub(
+                lambda m: f'{m.group(0)[0]}<{len(m.group(0)) - 2} chars>{m.group(0)[0]}', line
+            )
+    if generated_start is not None:
+        # Unterminated region runs to the end of the file
+        result[generated_start] = f"[generated code, lines {generated_start + 1}-{len(lines)} omitted]"
+    return result
+
+
+def _record(purpose: str, tokens_before: int, tokens_after: int):
+    """Accumulate token counts for a prompt purpose"""
+    stats = _stats.setdefault(purpose, {"calls": 0, "trimmed": 0, "tokens_before": 0, "tokens_after": 0})
+    stats["calls"] += 1
+    stats["tokens_before"] += tokens_before
+    stats["tokens_after"] += tokens_after
+    if tokens_after < tokens_before:
+        stats["trimmed"] += 1
+
+
+def build_code_excerpt(
+    code: str,
+    budget_tokens: int,
+    focus_lines: Optional[Iterable[int]] = None,
+    purpose: str = "code"
+) -> Dict:
+    """
+    Trim code to fit a token budget, keeping the most informative regions
+
+    Noise (license headers, generated blocks, minified lines, long literals)
+    is stripped first. If the code is still over budget, lines around focus
+    lines (error sites, changed hunks) are kept first, then signatures and
+    imports, then remaining lines from the top of the file. Omitted runs are
+    replaced with markers giving the original line range.
+
+    Args:
+        code: Source code
+        budget_tokens: Maximum estimated tokens for the excerpt
+        focus_lines: 1-based line numbers that must be kept if possible
+        purpose: Name under which pre/post token counts are recorded
+
+    Returns:
+        Dictionary with text, tokens_before, tokens_after and truncated flag
+    """
+    tokens_before = estimate_tokens(code)
+    lines = code.split('\n')
+    cleaned = _strip_noise(lines)
+    costs = [estimate_tokens(line) + 1 if line is not None else 0 for line in cleaned]
+
+    if sum(costs) <= budget_tokens:
+        text = '\n'.join(line for line in cleaned if line is not None)
+        tokens_after = estimate_tokens(text)
+        _record(purpose, tokens_before, tokens_after)
+        return {"text": text, "tokens_before": tokens_before, "tokens_after": tokens_after, "truncated": False}
+
+    # Priority tiers: focus windows, then signatures/imports, then file order
+    focus = set()
+    for number in focus_lines or []:
+        for i in range(number - 1 - FOCUS_CONTEXT, number + FOCUS_CONTEXT):
+            if 0 <= i < len(cleaned):
+                focus.add(i)
+    signatures = [i for i, line in enumerate(cleaned) if line is not None and _SIGNATURE.match(line)]
+    ordered = sorted(focus) + signatures + list(range(len(cleaned)))
+    priority = focus.union(signatures)
+
+    # Reserve room for omission markers (roughly one per kept run)
+    budget = budget_tokens - budget_tokens // 20
+    keep = set()
+    used = 0
+    for i in ordered:
+        if i in keep or cleaned[i] is None:
+            continue
+        if used + costs[i] > budget:
+            if i in priority:
+                continue  # a later, shorter line of the same tier may still fit
+            break
+        keep.add(i)
+        used += costs[i]
+
+    out = []
+    gap_start = None
+    for i, line in enumerate(cleaned):
+        if line is None:
+            continue  # already accounted for by a noise placeholder
+        if i in keep:
+            if gap_start is not None:
+                out.append(f"... [lines {gap_start + 1}-{i} omitted] ...")
+                gap_start = None
+            out.append(line)
+        elif gap_start is None:
+            gap_start = i
+    if gap_start is not None:
+        out.append(f"... [lines {gap_start + 1}-{len(cleaned)} omitted] ...")
+
+    text = '\n'.join(out)
+    tokens_after = estimate_tokens(text)
+    _record(purpose, tokens_before, tokens_after)
+    return {"text": text, "tokens_before": tokens_before, "tokens_after": tokens_after, "truncated": True}
+
+
+def get_prompt_stats() -> Dict[str, Dict[str, int]]:
+    """Get accumulated pre/post token counts per prompt purpose"""
+    return {purpose: dict(stats) for purpose, stats in _stats.items()}
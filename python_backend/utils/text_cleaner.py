@@ -2,6 +2,40 @@
 Text Cleaning Utilities
 """
 import re
+from typing import Callable, Iterable, Iterator
+
+# Lines longer than this are cut and marked with '...'
+TEXT_MAX_LINE = 500
+CODE_MAX_LINE = 200
+
+# Patterns are compiled once. Each cleaning step is a single C-level pass
+# that starts with a literal '\n' or is a table lookup, so the regex engine
+# can skip ahead between matches; no per-line Python loop or list of lines
+
+# Three or more line breaks (with only whitespace between) become one blank line
+_BLANK_RUN = re.compile(r'\n\s*\n\s*\n')
+
+# Characters that might cause issues downstream (tab, LF and CR are kept)
+_CONTROL_CODES = [*range(0x00, 0x09), 0x0b, 0x0c, *range(0x0e, 0x20), *range(0x7f, 0xa0)]
+_CONTROL = re.compile('[' + ''.join(re.escape(chr(c)) for c in _CONTROL_CODES) + ']')
+_CONTROL_TABLE = dict.fromkeys(_CONTROL_CODES)
+
+# A line (after its '\n') longer than the limit
+_LONG_TEXT_LINE = re.compile(r'\n([^\n]{%d})[^\n]+' % TEXT_MAX_LINE)
+_LONG_CODE_LINE = re.compile(r'\n([^\n]{%d})[^\n]+' % CODE_MAX_LINE)
+
+def _remove_control(text: str) -> str:
+    # str.translate is fastest on ASCII text but far slower than the regex otherwise
+    return text.translate(_CONTROL_TABLE) if text.isascii() else _CONTROL.sub('', text)
+
+def _truncate_lines(text: str, pattern: re.Pattern, max_line: int) -> str:
+    # The first line has no '\n' before it for the pattern to anchor on
+    end = text.find('\n')
+    if end == -1:
+        end = len(text)
+    if end > max_line:
+        text = text[:max_line] + '...' + text[end:]
+    return pattern.sub(r'\n\1...', text)
 
 def clean_text(text: str) -> str:
     """
@@ -14,21 +48,13 @@ def clean_text(text: str) -> str:
         Cleaned text string
     """
     # Remove excessive whitespace
-    text = re.sub(r'\n\s*\n\s*\n', '\n\n', text)
+    text = _BLANK_RUN.sub('\n\n', text)
     
     # Remove special characters that might cause issues
-    text = re.sub(r'[\x00-\x08\x0b-\x0c\x0e-\x1f\x7f-\x9f]', '', text)
+    text = _remove_control(text)
     
     # Limit line length for very long lines
-    lines = text.split('\n')
-    cleaned_lines = []
-    for line in lines:
-        if len(line) > 500:
-            cleaned_lines.append(line[:500] + '...')
-        else:
-            cleaned_lines.append(line)
-    
-    return '\n'.join(cleaned_lines)
+    return _truncate_lines(text, _LONG_TEXT_LINE, TEXT_MAX_LINE)
 
 def clean_code(code: str) -> str:
     """
@@ -41,18 +67,72 @@ def clean_code(code: str) -> str:
         Cleaned code string
     """
     # Remove excessive whitespace
-    code = re.sub(r'\n\s*\n\s*\n', '\n\n', code)
+    code = _BLANK_RUN.sub('\n\n', code)
     
     # Limit line length for very long lines
-    lines = code.split('\n')
-    cleaned_lines = []
-    for line in lines:
-        if len(line) > 200:
-            cleaned_lines.append(line[:200] + '...')
-        else:
-            cleaned_lines.append(line)
+    return _truncate_lines(code, _LONG_CODE_LINE, CODE_MAX_LINE)
+
+def _safe_cut(text: str, start: int) -> int:
+    """
+    Find the last position (at or after start) where text can be split and
+    each part cleaned on its own: a line start whose first character isn't
+    whitespace, so no blank-line run or line crosses it. 0 if there is none.
+    """
+    i = text.rfind('\n', start)
+    while i != -1:
+        if i + 1 < len(text) and not text[i + 1].isspace():
+            return i + 1
+        i = text.rfind('\n', start, i)
+    return 0
+
+def _iter_clean(chunks: Iterable[str], separator: str, clean: Callable[[str], str]) -> Iterator[str]:
+    pending = ""
+    first = True
+    for chunk in chunks:
+        if not first:
+            chunk = separator + chunk
+        first = False
+        text = pending + chunk
+        cut = _safe_cut(text, max(len(pending) - 1, 0))
+        if cut:
+            cleaned = clean(text[:cut])
+            if cleaned:
+                yield cleaned
+            text = text[cut:]
+        pending = text
+    if pending:
+        cleaned = clean(pending)
+        if cleaned:
+            yield cleaned
+
+def iter_clean_text(chunks: Iterable[str], separator: str = "") -> Iterator[str]:
+    """
+    Clean text piece by piece, e.g. PDF pages as they are extracted
+    
+    The joined output equals clean_text() of the joined input, but only the
+    current piece (plus any unfinished line) is held in memory.
+    
+    Args:
+        chunks: Raw text pieces, in order
+        separator: Inserted between pieces (e.g. "\n\n" between pages)
+        
+    Yields:
+        Cleaned text pieces
+    """
+    return _iter_clean(chunks, separator, clean_text)
+
+def iter_clean_code(chunks: Iterable[str], separator: str = "") -> Iterator[str]:
+    """
+    Clean code piece by piece (see iter_clean_text)
     
-    return '\n'.join(cleaned_lines)
+    Args:
+        chunks: Raw code pieces, in order
+        separator: Inserted between pieces
+        
+    Yields:
+        Cleaned code pieces
+    """
+    return _iter_clean(chunks, separator, clean_code)
 
 def extract_filename_info(filepath: str) -> dict:
     """
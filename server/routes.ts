@@ -43,7 +43,9 @@ export async function registerRoutes(app: Express): Promise<Server> {
   // This allows WebSocket connections on the same port as the Node.js server
   const wss = new WebSocketServer({ 
     server: httpServer,
-    path: '/api/ws/stream'
+    path: '/api/ws/stream',
+    // Compress only frames large enough to benefit (analysis, quiz, recommendations)
+    perMessageDeflate: { threshold: 1024 }
   });
 
   const PYTHON_BACKEND_WS = process.env.PYTHON_BACKEND_WS || 'ws://localhost:8000/api/ws/stream';
@@ -51,8 +53,13 @@ export async function registerRoutes(app: Express): Promise<Server> {
   wss.on('connection', (clientWs: WebSocket, req) => {
     console.log('🔌 WebSocket client connected to Node.js server');
     
-    // Create connection to Python backend
-    const backendWs = new WebSocket(PYTHON_BACKEND_WS);
+    // Create connection to Python backend, passing the query string on
+    // (?resume_from=N&stream_id=... replays missed events before live ones)
+    const query = req.url && req.url.includes('?') ? req.url.slice(req.url.indexOf('?') + 1) : '';
+    const backendUrl = query
+      ? `${PYTHON_BACKEND_WS}${PYTHON_BACKEND_WS.includes('?') ? '&' : '?'}${query}`
+      : PYTHON_BACKEND_WS;
+    const backendWs = new WebSocket(backendUrl);
     let backendConnected = false;
     
     // Wait for backend connection before forwarding messages
@@ -62,9 +69,10 @@ export async function registerRoutes(app: Express): Promise<Server> {
     });
     
     // Forward messages from client to Python backend
-    clientWs.on('message', (data) => {
+    // Preserve the frame type: ws hands over Buffers, which would otherwise go out as binary
+    clientWs.on('message', (data, isBinary) => {
       if (backendConnected && backendWs.readyState === WebSocket.OPEN) {
-        backendWs.send(data);
+        backendWs.send(data, { binary: isBinary });
       } else {
         console.warn('⚠️ Backend not connected, dropping client message');
       }